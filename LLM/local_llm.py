@@ -1,24 +1,409 @@
 from langchain_ollama import ChatOllama, OllamaEmbeddings
-from langchain.chat_models.base import BaseChatModel
+from langchain_core.language_models import BaseChatModel
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from typing import Optional
+import asyncio
+import httpx
 import os
+import threading
+import time
 
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434")
+OLLAMA_MAX_CONEXOES = int(os.getenv("OLLAMA_MAX_CONEXOES", "20"))
+OLLAMA_MAX_KEEPALIVE = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "10"))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "60"))
+# Tempo que o Ollama mantém os modelos carregados após cada requisição (ex.: "30m", "1h", "-1" para sempre)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Carrega os modelos em segundo plano na inicialização (main.py)
+OLLAMA_AQUECIMENTO = os.getenv("OLLAMA_AQUECIMENTO", "1") == "1"
+
+# Requisições simultâneas ao Ollama por modelo, somando todo o processo (chat, ingestão, resumos, aquecimento)
+OLLAMA_LIMITE_CHAT = int(
+    os.getenv("OLLAMA_LIMITE_CHAT", os.getenv("API_LIMITE_CHAT", "4"))
+)
+OLLAMA_LIMITE_EMBEDDING = int(
+    os.getenv("OLLAMA_LIMITE_EMBEDDING", os.getenv("API_LIMITE_EMBEDDING", "8"))
+)
+
+MODELO_CHAT = "llama3.2"
+MODELO_EMBEDDING = "mxbai-embed-large"
+
+# Registro de clientes do processo, indexado por classe, modelo e parâmetros
+_clientes = {}
+_clientes_lock = threading.Lock()
+
+
+class LimiteModelo:
+    def __init__(self, limite: int):
+        """
+        Semáforo de requisições simultâneas a um modelo, compartilhado por threads e event loops:
+        chamadas síncronas (ingestão, resumos, Streamlit) aguardam bloqueando a thread e as assíncronas
+        (API) aguardam sem ocupar o event loop. As vagas são entregues na ordem de chegada.
+
+        limite: quantidade máxima de requisições simultâneas.
+
+        return: None
+        """
+        self.limite = limite
+        self.em_uso = 0
+        # Fila de espera: threading.Event (síncronas) ou tuplas (loop, future) (assíncronas)
+        self._fila = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def aguardando(self) -> int:
+        return len(self._fila)
+
+    def _ocupar_ou_enfileirar(self, espera) -> bool:
+        # Chamado com o lock: ocupa uma vaga se houver e ninguém estiver na fila
+        if self.em_uso < self.limite and not self._fila:
+            self.em_uso += 1
+            return True
+        self._fila.append(espera)
+        return False
+
+    def adquirir(self):
+        evento = threading.Event()
+        with self._lock:
+            if self._ocupar_ou_enfileirar(evento):
+                return
+        evento.wait()
+
+    async def aadquirir(self):
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        with self._lock:
+            if self._ocupar_ou_enfileirar((loop, futuro)):
+                return
+        try:
+            await futuro
+        except asyncio.CancelledError:
+            with self._lock:
+                if (loop, futuro) in self._fila:
+                    self._fila.remove((loop, futuro))
+                    raise
+            # A vaga já foi entregue a esta espera: ela é repassada adiante
+            if futuro.done() and not futuro.cancelled():
+                self.liberar()
+            raise
+
+    def liberar(self):
+        """
+        Devolve a vaga, entregando-a diretamente à próxima espera da fila, se houver.
+
+        return: None
+        """
+        with self._lock:
+            while self._fila:
+                espera = self._fila.popleft()
+                if isinstance(espera, threading.Event):
+                    espera.set()
+                    return
+                loop, futuro = espera
+                try:
+                    loop.call_soon_threadsafe(self._entregar, futuro)
+                    return
+                except RuntimeError:
+                    # Event loop já encerrado: a vaga segue para a próxima espera
+                    continue
+            self.em_uso -= 1
+
+    def _entregar(self, futuro: asyncio.Future):
+        # Executa no event loop da espera; se ela foi cancelada, a vaga é devolvida
+        if futuro.cancelled():
+            self.liberar()
+        else:
+            futuro.set_result(None)
+
+    @contextmanager
+    def reservar(self):
+        self.adquirir()
+        try:
+            yield
+        finally:
+            self.liberar()
+
+    @asynccontextmanager
+    async def areservar(self):
+        await self.aadquirir()
+        try:
+            yield
+        finally:
+            self.liberar()
+
+    def estatisticas(self) -> dict:
+        return {
+            "limite": self.limite,
+            "em_uso": self.em_uso,
+            "aguardando": self.aguardando,
+        }
+
+
+_limites = {
+    MODELO_CHAT: LimiteModelo(OLLAMA_LIMITE_CHAT),
+    MODELO_EMBEDDING: LimiteModelo(OLLAMA_LIMITE_EMBEDDING),
+}
+
+
+def obter_limite(modelo: str) -> Optional[LimiteModelo]:
+    """
+    Retorna o limite de requisições simultâneas do modelo (None se o modelo não tiver limite).
+
+    modelo: nome do modelo no Ollama.
+
+    return: LimiteModelo ou None.
+    """
+    return _limites.get(modelo)
+
+
+def estatisticas_limites() -> dict:
+    """
+    Retorna, por modelo, o limite de requisições simultâneas e as vagas em uso e em espera.
+
+    return: dict {modelo: {limite, em_uso, aguardando}}.
+    """
+    return {modelo: limite.estatisticas() for modelo, limite in _limites.items()}
+
+
+class _RespostaLimitada(httpx.SyncByteStream, httpx.AsyncByteStream):
+    # Corpo da resposta que devolve a vaga do modelo quando é fechado (inclusive respostas em streaming)
+    def __init__(self, corpo, limite: LimiteModelo):
+        self._corpo = corpo
+        self._limite = limite
+        self._liberada = False
+
+    def _liberar(self):
+        if not self._liberada:
+            self._liberada = True
+            self._limite.liberar()
+
+    def __iter__(self):
+        yield from self._corpo
+
+    def close(self):
+        try:
+            self._corpo.close()
+        finally:
+            self._liberar()
+
+    async def __aiter__(self):
+        async for parte in self._corpo:
+            yield parte
+
+    async def aclose(self):
+        try:
+            await self._corpo.aclose()
+        finally:
+            self._liberar()
+
+
+class _TransporteLimitado(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    def __init__(self, limite: LimiteModelo, limits: httpx.Limits):
+        """
+        Transporte HTTP dos clientes do Ollama que ocupa uma vaga do modelo do envio da requisição até o
+        fechamento da resposta. Serve tanto ao cliente síncrono quanto ao assíncrono do langchain_ollama,
+        que recebem os mesmos parâmetros.
+
+        limite: limite de requisições simultâneas do modelo.
+        limits: pool de conexões dos transportes.
+
+        return: None
+        """
+        self.limite = limite
+        self.sincrono = httpx.HTTPTransport(limits=limits)
+        self.assincrono = httpx.AsyncHTTPTransport(limits=limits)
+
+    @staticmethod
+    def _resposta(resposta: httpx.Response, limite: LimiteModelo) -> httpx.Response:
+        return httpx.Response(
+            status_code=resposta.status_code,
+            headers=resposta.headers,
+            stream=_RespostaLimitada(resposta.stream, limite),
+            extensions=resposta.extensions,
+        )
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.limite.adquirir()
+        try:
+            resposta = self.sincrono.handle_request(request)
+        except BaseException:
+            self.limite.liberar()
+            raise
+        return self._resposta(resposta, self.limite)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await self.limite.aadquirir()
+        try:
+            resposta = await self.assincrono.handle_async_request(request)
+        except BaseException:
+            self.limite.liberar()
+            raise
+        return self._resposta(resposta, self.limite)
+
+    def close(self):
+        self.sincrono.close()
+
+    async def aclose(self):
+        await self.assincrono.aclose()
+
+
+def _parametros_http(modelo: str = None) -> dict:
+    """
+    Parâmetros repassados ao cliente HTTP (httpx) do Ollama: pool de conexões com keep-alive e,
+    para modelos com limite, o transporte que limita as requisições simultâneas.
+
+    modelo: nome do modelo atendido pelo cliente.
+
+    return: dict com os parâmetros do cliente.
+    """
+    limits = httpx.Limits(
+        max_connections=OLLAMA_MAX_CONEXOES,
+        max_keepalive_connections=OLLAMA_MAX_KEEPALIVE,
+        keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY,
+    )
+    limite = obter_limite(modelo)
+    if limite is None:
+        return {"limits": limits}
+    return {"transport": _TransporteLimitado(limite, limits)}
+
+
+def obter_cliente(classe, **parametros):
+    """
+    Retorna o cliente compartilhado para a classe e os parâmetros informados, criando-o na primeira chamada.
+    Clientes com a mesma chave reaproveitam o mesmo pool de conexões HTTP entre sessões e chamadas, e todas
+    as requisições ao modelo respeitam o seu limite de requisições simultâneas (`obter_limite`).
+
+    classe: classe do cliente (ChatOllama ou OllamaEmbeddings).
+    parametros: parâmetros do modelo (model, temperature, etc.).
+
+    return: instância compartilhada do cliente.
+    """
+    chave = (classe.__name__, tuple(sorted(parametros.items())))
+    with _clientes_lock:
+        cliente = _clientes.get(chave)
+        if cliente is None:
+            cliente = classe(
+                base_url=OLLAMA_URL,
+                client_kwargs=_parametros_http(parametros.get("model")),
+                **parametros,
+            )
+            _clientes[chave] = cliente
+        return cliente
+
+
+def _conexoes_ativas(cliente_ollama) -> int:
+    # O cliente do pacote ollama guarda o httpx.Client em `_client`
+    transporte = getattr(getattr(cliente_ollama, "_client", None), "_transport", None)
+    if isinstance(transporte, _TransporteLimitado):
+        # O mesmo transporte atende os dois clientes: cada um conta só o seu pool
+        if isinstance(cliente_ollama._client, httpx.AsyncClient):
+            transporte = transporte.assincrono
+        else:
+            transporte = transporte.sincrono
+    pool = getattr(transporte, "_pool", None)
+    return len(getattr(pool, "connections", []))
+
+
+def estatisticas_clientes() -> dict:
+    """
+    Retorna quantos clientes estão registrados e quantas conexões HTTP estão abertas em seus pools.
+
+    return: dict com o total de clientes, de conexões e o detalhamento por cliente.
+    """
+    with _clientes_lock:
+        detalhes = []
+        for (classe, parametros), cliente in _clientes.items():
+            conexoes = _conexoes_ativas(
+                getattr(cliente, "_client", None)
+            ) + _conexoes_ativas(getattr(cliente, "_async_client", None))
+            detalhes.append(
+                {"classe": classe, "parametros": dict(parametros), "conexoes": conexoes}
+            )
+    return {
+        "clientes": len(detalhes),
+        "conexoes": sum(item["conexoes"] for item in detalhes),
+        "detalhes": detalhes,
+    }
+
+
+def _keep_alive(valor: str) -> int:
+    # Converte durações no formato do Ollama ("30s", "30m", "1h") para segundos, aceitos por todos os clientes
+    unidades = {"s": 1, "m": 60, "h": 3600}
+    if valor[-1:] in unidades:
+        return int(float(valor[:-1]) * unidades[valor[-1]])
+    return int(valor)
+
+
+def aquecer_modelos(
+    modelos_chat=(MODELO_CHAT,),
+    modelos_embedding=(MODELO_EMBEDDING,),
+    keep_alive: str = OLLAMA_KEEP_ALIVE,
+    timeout: float = 600.0,
+) -> dict:
+    """
+    Carrega os modelos no Ollama antes da primeira pergunta, para que ela não pague o tempo de carga.
+    Usa um `/api/generate` sem prompt (só carrega o modelo de chat) e um `/api/embed` com texto vazio,
+    ambos com `keep_alive` para que os modelos continuem na memória.
+
+    modelos_chat: modelos de chat a serem carregados.
+    modelos_embedding: modelos de embedding a serem carregados.
+    keep_alive: tempo que o Ollama mantém os modelos carregados.
+    timeout: tempo máximo de espera por modelo, em segundos.
+
+    return: dict com o tempo de carga (em segundos) de cada modelo, ou None se falhou.
+    """
+    tempos = {}
+    requisicoes = [("/api/generate", {"model": modelo}) for modelo in modelos_chat] + [
+        ("/api/embed", {"model": modelo, "input": ""}) for modelo in modelos_embedding
+    ]
+    with httpx.Client(base_url=OLLAMA_URL, timeout=timeout) as cliente:
+        for rota, corpo in requisicoes:
+            limite = obter_limite(corpo["model"])
+            inicio = time.perf_counter()
+            try:
+                with limite.reservar() if limite else nullcontext():
+                    cliente.post(
+                        rota, json={**corpo, "keep_alive": _keep_alive(keep_alive)}
+                    ).raise_for_status()
+                tempos[corpo["model"]] = time.perf_counter() - inicio
+            except httpx.HTTPError as e:
+                print(f"Não foi possível aquecer o modelo {corpo['model']}: {e}")
+                tempos[corpo["model"]] = None
+    print(f"Modelos aquecidos: {tempos}")
+    return tempos
+
+
+def aquecer_em_segundo_plano(**parametros) -> threading.Thread:
+    """
+    Executa `aquecer_modelos` em uma thread daemon, sem bloquear a inicialização.
+
+    parametros: parâmetros repassados a `aquecer_modelos`.
+
+    return: thread iniciada.
+    """
+    thread = threading.Thread(
+        target=aquecer_modelos, kwargs=parametros, name="aquecimento", daemon=True
+    )
+    thread.start()
+    return thread
 
 
 class LocalLLM:
     # This class is used to load a local LLM model using the chat_models library (Ollama).
-    def __init__(self, model_name="llama3.2", temperature=0.75):
+    def __init__(self, model_name=MODELO_CHAT, temperature=0.75):
         self.model_name = model_name
         self.temperature = temperature
         self.llm = self.get_model()
 
     def get_model(self) -> BaseChatModel:
         try:
-            return ChatOllama(
+            return obter_cliente(
+                ChatOllama,
                 model=self.model_name,
                 temperature=self.temperature,
                 stream=True,
-                base_url=OLLAMA_URL,
+                keep_alive=_keep_alive(OLLAMA_KEEP_ALIVE),
             )
         except Exception as e:
             print(
@@ -29,15 +414,16 @@ class LocalLLM:
 
 class EmbeddingLLM:
     # This class is used to load a local LLM embedding model using the langchain library (Ollama).
-    def __init__(self, model_name="mxbai-embed-large"):
+    def __init__(self, model_name=MODELO_EMBEDDING):
         self.model_name = model_name
         self.embedding_llm = self.get_model()
 
     def get_model(self):
         try:
-            return OllamaEmbeddings(
+            return obter_cliente(
+                OllamaEmbeddings,
                 model=self.model_name,
-                base_url=OLLAMA_URL,
+                keep_alive=_keep_alive(OLLAMA_KEEP_ALIVE),
             )
         except Exception as e:
             print(
@@ -0,0 +1,165 @@
+from collections import OrderedDict
+from typing import List, Optional
+import os
+import threading
+import time
+
+import numpy as np
+
+RESPOSTA_CACHE_LIMIAR = float(os.getenv("RESPOSTA_CACHE_LIMIAR", "0.95"))
+RESPOSTA_CACHE_TTL_SEGUNDOS = float(os.getenv("RESPOSTA_CACHE_TTL_SEGUNDOS", "86400"))
+RESPOSTA_CACHE_MAX_ITENS = int(os.getenv("RESPOSTA_CACHE_MAX_ITENS", "1000"))
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        limiar: float = RESPOSTA_CACHE_LIMIAR,
+        ttl_segundos: float = RESPOSTA_CACHE_TTL_SEGUNDOS,
+        max_itens: int = RESPOSTA_CACHE_MAX_ITENS,
+    ):
+        """
+        Inicializa o cache semântico de respostas do modo RAG.
+        Cada resposta é guardada com o embedding da pergunta autossuficiente (já reformulada) e
+        separada por namespace (a coleção de documentos da sessão). Uma nova pergunta reaproveita a
+        resposta cuja pergunta tenha similaridade de cosseno acima de `limiar` no mesmo namespace.
+
+        limiar: similaridade de cosseno mínima para considerar duas perguntas equivalentes.
+        ttl_segundos: tempo de vida de uma resposta no cache (0 desativa a expiração).
+        max_itens: quantidade máxima de respostas mantidas; acima disso as menos usadas recentemente são removidas (LRU).
+
+        return: None
+        """
+        self.limiar = limiar
+        self.ttl_segundos = ttl_segundos
+        self.max_itens = max_itens
+        self.hits = 0
+        self.misses = 0
+        self._itens = OrderedDict()
+        self._proximo_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalizar(vetor: List[float]) -> np.ndarray:
+        vetor = np.asarray(vetor, dtype=np.float32)
+        norma = np.linalg.norm(vetor)
+        return vetor / norma if norma > 0 else vetor
+
+    def _remover_expirados(self, agora: float):
+        if not self.ttl_segundos:
+            return
+        expirados = [
+            chave
+            for chave, item in self._itens.items()
+            if agora - item["criado_em"] > self.ttl_segundos
+        ]
+        for chave in expirados:
+            del self._itens[chave]
+
+    def obter(self, namespace: str, vetor: List[float]) -> Optional[str]:
+        """
+        Busca a resposta de uma pergunta semanticamente equivalente no mesmo namespace.
+
+        namespace: identificador do conjunto de documentos (ex.: nome da coleção da sessão).
+        vetor: embedding da pergunta autossuficiente.
+
+        return: resposta armazenada, ou None se nenhuma pergunta atingir o limiar.
+        """
+        consulta = self._normalizar(vetor)
+        with self._lock:
+            self._remover_expirados(time.time())
+            candidatos = [
+                (chave, item)
+                for chave, item in self._itens.items()
+                if item["namespace"] == namespace
+                and item["vetor"].shape == consulta.shape
+            ]
+            if candidatos:
+                matriz = np.stack([item["vetor"] for _, item in candidatos])
+                similaridades = matriz @ consulta
+                melhor = int(np.argmax(similaridades))
+                if similaridades[melhor] >= self.limiar:
+                    chave, item = candidatos[melhor]
+                    self._itens.move_to_end(chave)
+                    self.hits += 1
+                    return item["resposta"]
+            self.misses += 1
+            return None
+
+    def salvar(self, namespace: str, vetor: List[float], resposta: str):
+        """
+        Guarda a resposta gerada para uma pergunta.
+
+        namespace: identificador do conjunto de documentos.
+        vetor: embedding da pergunta autossuficiente.
+        resposta: texto completo da resposta.
+
+        return: None
+        """
+        if not resposta:
+            return
+        with self._lock:
+            self._itens[self._proximo_id] = {
+                "namespace": namespace,
+                "vetor": self._normalizar(vetor),
+                "resposta": resposta,
+                "criado_em": time.time(),
+            }
+            self._proximo_id += 1
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def invalidar(self, namespace: str):
+        """
+        Remove todas as respostas de um namespace, por exemplo quando novos arquivos são indexados na coleção.
+
+        namespace: identificador do conjunto de documentos.
+
+        return: None
+        """
+        with self._lock:
+            chaves = [
+                chave
+                for chave, item in self._itens.items()
+                if item["namespace"] == namespace
+            ]
+            for chave in chaves:
+                del self._itens[chave]
+        if chaves:
+            print(
+                f"Cache de respostas: {len(chaves)} respostas de '{namespace}' invalidadas."
+            )
+
+    def estatisticas(self) -> dict:
+        """
+        Retorna as métricas de uso do cache.
+
+        return: dict com hits, misses, taxa de acerto e quantidade de respostas armazenadas.
+        """
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "taxa_acerto": self.hits / consultas if consultas else 0.0,
+                "itens": len(self._itens),
+                "max_itens": self.max_itens,
+                "limiar": self.limiar,
+            }
+
+
+_cache_padrao = None
+_cache_lock = threading.Lock()
+
+
+def obter_cache_respostas() -> AnswerCache:
+    """
+    Retorna o cache de respostas compartilhado pelo processo, criando-o na primeira chamada.
+
+    return: AnswerCache
+    """
+    global _cache_padrao
+    with _cache_lock:
+        if _cache_padrao is None:
+            _cache_padrao = AnswerCache()
+        return _cache_padrao
@@ -0,0 +1,174 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from agents_ia.ingestion import identificar_chunks
+from agents_ia.loader import CustomLoader
+from agents_ia.tracing import trace_atual
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+import time
+
+# Quantidade de processos usados para ler e dividir arquivos em lote (padrão: um por núcleo)
+INGESTAO_PROCESSOS = int(os.getenv("INGESTAO_PROCESSOS", str(os.cpu_count() or 1)))
+
+
+def processar_pdf(
+    nome: str,
+    dados: bytes,
+    por_paginas: bool = True,
+    chunk_size: int = 1400,
+    chunk_overlap: int = 200,
+) -> Tuple[List[Document], float]:
+    """
+    Lê e divide um PDF. Executada nos processos do pool, por isso recebe apenas dados serializáveis
+    e devolve os chunks prontos para vetorização.
+
+    nome: nome do arquivo (usado nos metadados).
+    dados: conteúdo do arquivo.
+    por_paginas: lê página a página com o pypdf (True) ou de uma vez com o unstructured (False).
+    chunk_size: tamanho de cada chunk, em caracteres.
+    chunk_overlap: caracteres sobrepostos entre chunks consecutivos.
+
+    return: tupla (chunks, segundos gastos no processo).
+    """
+    inicio = time.perf_counter()
+    arquivo = io.BytesIO(dados)
+    loader = CustomLoader(file=arquivo, filename=nome)
+    docs = list(loader.lazy_load()) if por_paginas else loader._load()
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    )
+    splits = splitter.split_documents(docs)
+    return splits, time.perf_counter() - inicio
+
+
+_pool = None
+_pool_processos = None
+_pool_lock = threading.Lock()
+
+
+def obter_pool_processos(max_processos: int = INGESTAO_PROCESSOS) -> Executor:
+    """
+    Retorna o pool de processos compartilhado, recriando-o se o tamanho pedido mudar.
+    Os processos são criados com "spawn", já que o processo principal mantém threads (Streamlit,
+    Chroma, filas de ingestão) que não sobrevivem a um fork.
+
+    max_processos: quantidade de processos do pool.
+
+    return: ProcessPoolExecutor
+    """
+    global _pool, _pool_processos
+    with _pool_lock:
+        if _pool is None or _pool_processos != max_processos:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(
+                max_workers=max_processos,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _pool_processos = max_processos
+        return _pool
+
+
+def dividir_em_lote(
+    arquivos: List[Tuple[str, bytes]],
+    max_processos: int = INGESTAO_PROCESSOS,
+    por_paginas: bool = True,
+    chunk_size: int = 1400,
+    chunk_overlap: int = 200,
+    on_arquivo: Callable[[int, Optional[Exception]], None] = None,
+    executor: Executor = None,
+) -> Iterator[Document]:
+    """
+    Lê e divide vários PDFs em paralelo, um por processo, e gera os chunks de cada arquivo
+    assim que ele termina (em ordem de conclusão). Um arquivo com erro não interrompe os demais.
+
+    arquivos: lista de tuplas (nome, conteúdo).
+    max_processos: quantidade de processos, se `executor` não for informado.
+    por_paginas: lê página a página com o pypdf (True) ou com o unstructured (False).
+    chunk_size: tamanho de cada chunk, em caracteres.
+    chunk_overlap: caracteres sobrepostos entre chunks consecutivos.
+    on_arquivo: função chamada com (posição do arquivo em `arquivos`, erro ou None) quando cada arquivo termina;
+        a posição distingue arquivos diferentes enviados com o mesmo nome.
+    executor: pool de processos a ser usado no lugar do compartilhado.
+
+    return: iterador de Document (chunks de todos os arquivos).
+    """
+    executor = executor or obter_pool_processos(max_processos)
+    futuros = {
+        executor.submit(
+            processar_pdf, nome, dados, por_paginas, chunk_size, chunk_overlap
+        ): (indice, nome)
+        for indice, (nome, dados) in enumerate(arquivos)
+    }
+    for futuro in as_completed(futuros):
+        indice, nome = futuros[futuro]
+        try:
+            splits, segundos = futuro.result()
+        except Exception as e:
+            print(f"Falha ao processar '{nome}' no lote: {e}")
+            if on_arquivo:
+                on_arquivo(indice, e)
+            continue
+        # O tempo gasto no processo filho é registrado no trace do processo principal
+        trace = trace_atual()
+        if trace is not None:
+            trace.registrar("lote.processo", segundos, itens=1, chunks=len(splits))
+        print(f"'{nome}' dividido em {len(splits)} chunks em {segundos:.2f}s.")
+        if on_arquivo:
+            on_arquivo(indice, None)
+        # Ids determinísticos por arquivo: uma nova tentativa do lote não duplica os chunks já gravados
+        yield from identificar_chunks(
+            splits, hashlib.sha256(arquivos[indice][1]).hexdigest()
+        )
+
+
+def ingerir_em_lote(
+    arquivos: List[Tuple[str, bytes]],
+    session_id: str,
+    max_processos: int = INGESTAO_PROCESSOS,
+    por_paginas: bool = True,
+    on_progress=None,
+    on_arquivo: Callable[[int, Optional[Exception]], None] = None,
+) -> Tuple[object, Dict[int, Exception]]:
+    """
+    Ingere vários PDFs de uma sessão de uma só vez: leitura e divisão em paralelo no pool de processos
+    e uma única passagem de vetorização e gravação no vetorstore da sessão, que começa enquanto os
+    arquivos restantes ainda estão sendo lidos.
+
+    arquivos: lista de tuplas (nome, conteúdo).
+    session_id: identificador da sessão.
+    max_processos: quantidade de processos usados na leitura.
+    por_paginas: lê página a página com o pypdf (True) ou com o unstructured (False).
+    on_progress: função opcional chamada com um ProgressoIngestao a cada lote gravado.
+    on_arquivo: função chamada com (posição do arquivo em `arquivos`, erro ou None) quando cada arquivo termina
+        de ser lido.
+
+    return: tupla (retriever da sessão, dict {posição em `arquivos`: erro} dos arquivos que falharam).
+    """
+    # Importado aqui para que os processos do pool não carreguem o Chroma ao importar este módulo
+    from agents_ia.embedding import EmbeddingProcessor
+
+    erros = {}
+
+    def registrar_arquivo(indice: int, erro: Optional[Exception]):
+        if erro is not None:
+            erros[indice] = erro
+        if on_arquivo:
+            on_arquivo(indice, erro)
+
+    processor = EmbeddingProcessor(data=None, session_id=session_id)
+    processor.data = dividir_em_lote(
+        arquivos,
+        max_processos=max_processos,
+        por_paginas=por_paginas,
+        chunk_size=processor.chunk_size,
+        chunk_overlap=processor.chunk_overlap,
+        on_arquivo=registrar_arquivo,
+    )
+    retriever = processor.create_retriever(on_progress=on_progress, dividir=False)
+    return retriever, erros
@@ -0,0 +1,310 @@
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from agents_ia.flat_index import Filtro, corresponde_filtro
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+import gzip
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+
+# Modo de busca do RAG: "hibrida" (BM25 + vetorial), "vetorial" ou "lexica" (sem embedding na consulta)
+RAG_MODO_BUSCA = os.getenv("RAG_MODO_BUSCA", "hibrida")
+# Constante da fusão por posição recíproca (RRF)
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Palavras (\w+) e identificadores compostos como "ERR-404", "tabela.coluna" ou "v1.2.3"
+_PADRAO_TOKEN = re.compile(r"\w+(?:[-.:/]\w+)+|\w+")
+
+
+def tokenizar(texto: str) -> List[str]:
+    """
+    Divide o texto em termos normalizados (minúsculas e sem acentos) para o índice lexical.
+    Identificadores compostos são mantidos inteiros e também quebrados em suas partes.
+
+    texto: texto a ser dividido.
+
+    return: lista de termos.
+    """
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    termos = []
+    for termo in _PADRAO_TOKEN.findall(texto):
+        termos.append(termo)
+        if any(separador in termo for separador in "-.:/"):
+            termos.extend(re.findall(r"\w+", termo))
+    return termos
+
+
+class IndiceBM25:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Índice invertido em memória com pontuação BM25.
+        Cada termo aponta para a lista de (documento, frequência); a busca só percorre as listas dos termos da consulta.
+
+        k1: saturação da frequência do termo.
+        b: peso da normalização pelo tamanho do documento.
+
+        return: None
+        """
+        self.k1 = k1
+        self.b = b
+        self.documentos: List[Dict[str, Any]] = []
+        self.tamanhos: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._total_termos = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.documentos)
+
+    def adicionar(self, docs: Iterable[Document]):
+        """
+        Indexa novos documentos.
+
+        docs: iterável de Document (chunks).
+
+        return: None
+        """
+        with self._lock:
+            for doc in docs:
+                self._acrescentar(doc.page_content, doc.metadata)
+
+    def _acrescentar(self, texto: str, metadata: dict):
+        indice = len(self.documentos)
+        termos = tokenizar(texto)
+        frequencias = {}
+        for termo in termos:
+            frequencias[termo] = frequencias.get(termo, 0) + 1
+        for termo, frequencia in frequencias.items():
+            self.postings.setdefault(termo, []).append((indice, frequencia))
+        self.documentos.append({"page_content": texto, "metadata": metadata})
+        self.tamanhos.append(len(termos))
+        self._total_termos += len(termos)
+
+    def remover(self, filtro: Filtro) -> int:
+        """
+        Remove os documentos cujos metadados correspondem ao filtro, reconstruindo as listas invertidas.
+
+        filtro: filtro de metadados no formato do Chroma (ex.: {"Arquivo": "relatorio.pdf"}).
+
+        return: quantidade de documentos removidos.
+        """
+        with self._lock:
+            mantidos = [
+                documento
+                for documento in self.documentos
+                if not corresponde_filtro(documento["metadata"], filtro)
+            ]
+            removidos = len(self.documentos) - len(mantidos)
+            if not removidos:
+                return 0
+            # As listas novas são montadas à parte e trocadas de uma vez: buscas e inclusões concorrentes
+            # nunca encontram o índice pela metade
+            novo = IndiceBM25(self.k1, self.b)
+            for item in mantidos:
+                novo._acrescentar(item["page_content"], item["metadata"])
+            self.documentos = novo.documentos
+            self.tamanhos = novo.tamanhos
+            self.postings = novo.postings
+            self._total_termos = novo._total_termos
+        return removidos
+
+    def buscar(
+        self, consulta: str, k: int = 4, filtro: Filtro = None
+    ) -> List[Tuple[Document, float]]:
+        """
+        Retorna os k documentos com maior pontuação BM25 para a consulta.
+
+        consulta: texto da consulta.
+        k: quantidade de documentos retornados.
+        filtro: filtro de metadados no formato do Chroma (ex.: {"Arquivo": {"$in": [...]}}).
+
+        return: lista de tuplas (Document, pontuação), da maior para a menor pontuação.
+        """
+        with self._lock:
+            total = len(self.documentos)
+            if not total:
+                return []
+            media = self._total_termos / total
+            pontuacoes = {}
+            for termo in set(tokenizar(consulta)):
+                lista = self.postings.get(termo)
+                if not lista:
+                    continue
+                idf = math.log(1 + (total - len(lista) + 0.5) / (len(lista) + 0.5))
+                for indice, frequencia in lista:
+                    normalizacao = self.k1 * (
+                        1 - self.b + self.b * self.tamanhos[indice] / media
+                    )
+                    pontuacoes[indice] = pontuacoes.get(indice, 0.0) + idf * (
+                        frequencia * (self.k1 + 1) / (frequencia + normalizacao)
+                    )
+            if filtro is not None:
+                pontuacoes = {
+                    indice: pontuacao
+                    for indice, pontuacao in pontuacoes.items()
+                    if corresponde_filtro(self.documentos[indice]["metadata"], filtro)
+                }
+            melhores = heapq.nlargest(k, pontuacoes.items(), key=lambda item: item[1])
+            return [
+                (
+                    Document(
+                        page_content=self.documentos[indice]["page_content"],
+                        metadata=dict(self.documentos[indice]["metadata"]),
+                    ),
+                    pontuacao,
+                )
+                for indice, pontuacao in melhores
+            ]
+
+    def salvar(self, caminho: str):
+        """
+        Grava o índice em JSON compactado (gzip), ao lado da coleção do Chroma.
+
+        caminho: caminho do arquivo .json.gz.
+
+        return: None
+        """
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        with self._lock:
+            dados = {
+                "k1": self.k1,
+                "b": self.b,
+                "documentos": self.documentos,
+                "tamanhos": self.tamanhos,
+                "postings": self.postings,
+            }
+            temporario = f"{caminho}.tmp"
+            with gzip.open(temporario, "wt", encoding="utf-8") as arquivo:
+                json.dump(dados, arquivo, ensure_ascii=False)
+            os.replace(temporario, caminho)
+
+    @classmethod
+    def carregar(cls, caminho: str) -> "IndiceBM25":
+        """
+        Lê um índice gravado por `salvar`; se o arquivo não existir, retorna um índice vazio.
+
+        caminho: caminho do arquivo .json.gz.
+
+        return: IndiceBM25
+        """
+        indice = cls()
+        if not os.path.exists(caminho):
+            return indice
+        with gzip.open(caminho, "rt", encoding="utf-8") as arquivo:
+            dados = json.load(arquivo)
+        indice.k1 = dados["k1"]
+        indice.b = dados["b"]
+        indice.documentos = dados["documentos"]
+        indice.tamanhos = dados["tamanhos"]
+        indice.postings = {
+            termo: [tuple(item) for item in lista]
+            for termo, lista in dados["postings"].items()
+        }
+        indice._total_termos = sum(indice.tamanhos)
+        return indice
+
+    def indexar_conforme_passam(self, docs: Iterable[Document]) -> Iterator[Document]:
+        """
+        Repassa os documentos recebidos indexando cada um à medida que passa, para acompanhar
+        a ingestão incremental do vetorstore.
+
+        docs: iterável de Document.
+
+        return: iterador com os mesmos documentos de `docs`.
+        """
+        for doc in docs:
+            self.adicionar([doc])
+            yield doc
+
+
+class BM25Retriever(BaseRetriever):
+    """Retriever lexical sobre um IndiceBM25; não faz chamadas ao modelo de embedding."""
+
+    indice: IndiceBM25
+    k: int = 4
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+        filter: Filtro = None,
+    ) -> List[Document]:
+        return [doc for doc, _ in self.indice.buscar(query, k=self.k, filtro=filter)]
+
+
+def _chave_documento(doc: Document) -> tuple:
+    metadata = doc.metadata or {}
+    return (doc.page_content, metadata.get("Arquivo"), metadata.get("page"))
+
+
+def fundir_rrf(
+    listas: List[List[Document]], k: int, rrf_k: int = RRF_K
+) -> List[Document]:
+    """
+    Combina listas ordenadas de documentos pela fusão por posição recíproca (RRF):
+    cada documento soma 1 / (rrf_k + posição) em cada lista em que aparece.
+
+    listas: listas de Document, cada uma ordenada da mais para a menos relevante.
+    k: quantidade de documentos retornados.
+    rrf_k: constante que suaviza o peso das primeiras posições.
+
+    return: lista com os k documentos de maior pontuação combinada.
+    """
+    pontuacoes = {}
+    documentos = {}
+    for lista in listas:
+        for posicao, doc in enumerate(lista, start=1):
+            chave = _chave_documento(doc)
+            documentos.setdefault(chave, doc)
+            pontuacoes[chave] = pontuacoes.get(chave, 0.0) + 1.0 / (rrf_k + posicao)
+    ordenadas = sorted(pontuacoes, key=pontuacoes.get, reverse=True)
+    return [documentos[chave] for chave in ordenadas[:k]]
+
+
+_executor_busca = ThreadPoolExecutor(max_workers=4, thread_name_prefix="busca-vetorial")
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Combina a busca vetorial com a busca lexical BM25 por RRF.
+    A busca vetorial roda em paralelo com a lexical; cada uma traz `k_candidatos` documentos para a fusão.
+    Um `filter` de metadados passado no invoke é aplicado nas duas buscas.
+    """
+
+    vetorial: BaseRetriever
+    lexical: BM25Retriever
+    vectorstore: Any = None
+    k: int = 4
+    k_candidatos: int = 10
+    rrf_k: int = RRF_K
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+        filter: Filtro = None,
+    ) -> List[Document]:
+        futuro = _executor_busca.submit(
+            self.vetorial.invoke,
+            query,
+            {"callbacks": run_manager.get_child()},
+            **({"filter": filter} if filter is not None else {}),
+        )
+        lexicos = [
+            doc
+            for doc, _ in self.lexical.indice.buscar(
+                query, k=self.k_candidatos, filtro=filter
+            )
+        ]
+        return fundir_rrf([futuro.result(), lexicos], k=self.k, rrf_k=self.rrf_k)
@@ -1,5 +1,9 @@
-from langchain_core.runnables import RunnableLambda, Runnable
-from typing import List, Iterator
+from langchain_core.runnables import (
+    RunnableLambda,
+    Runnable,
+)
+from langchain_core.runnables.utils import AddableDict
+from typing import List, Iterator, AsyncIterator
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.chat_history import (
     BaseChatMessageHistory,
@@ -13,17 +17,61 @@ from langchain_core.messages import (
     ToolMessage,
 )
 from LLM.local_llm import LocalLLM
-from agents_ia.embedding import EmbeddingProcessor
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.prompts import MessagesPlaceholder
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
-import pandas as pd
-from langchain_experimental.tools import PythonAstREPLTool
-from langchain_experimental.agents import create_pandas_dataframe_agent
-from langchain_core.output_parsers.openai_tools import JsonOutputKeyToolsParser
 from agents_ia.memory import get_session_history
+from agents_ia.prompts import montar_prompt
+from agents_ia.answer_cache import obter_cache_respostas
+from agents_ia.dataframe_tools import CacheResultadosDataFrame, perfil_dataframe
+from agents_ia.sandbox import CSV_SANDBOX, ExecutorSandbox
+from agents_ia.tracing import (
+    aem_contexto_proprio,
+    anotar,
+    callbacks_trace,
+    em_contexto_proprio,
+    iniciar_trace,
+    no_contexto,
+    span,
+)
 from langchain_core.output_parsers import StrOutputParser
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import asyncio
+import os
+import threading
+import time
+import numpy as np
+
+# Busca com a pergunta original em paralelo com a reformulação
+RAG_BUSCA_ESPECULATIVA = os.getenv("RAG_BUSCA_ESPECULATIVA", "1") == "1"
+# Similaridade mínima entre pergunta original e reformulada para aproveitar a busca especulativa
+RAG_LIMIAR_ESPECULACAO = float(os.getenv("RAG_LIMIAR_ESPECULACAO", "0.9"))
+# Quantidade de reformulações guardadas por agente e mensagens recentes usadas na chave
+RAG_CACHE_REFORMULACOES = int(os.getenv("RAG_CACHE_REFORMULACOES", "256"))
+RAG_JANELA_REFORMULACAO = int(os.getenv("RAG_JANELA_REFORMULACAO", "6"))
+
+_executor_especulativo = ThreadPoolExecutor(
+    max_workers=4, thread_name_prefix="busca-especulativa"
+)
+
+
+@contextmanager
+def _medir_etapa(etapas: dict, nome: str):
+    # Acumula em `etapas[nome]` a duração (em segundos) do bloco e a registra no trace corrente
+    inicio = time.perf_counter()
+    try:
+        with span(f"chat.{nome}"):
+            yield
+    finally:
+        etapas[nome] = etapas.get(nome, 0.0) + time.perf_counter() - inicio
+
+
+def _tamanho_contexto(docs) -> dict:
+    # Quantidade e tamanho (em caracteres) dos chunks recuperados
+    return {
+        "chunks_recuperados": len(docs),
+        "caracteres_recuperados": sum(len(doc.page_content) for doc in docs),
+    }
 
 
 def mostrar_historico(session_id: str):
@@ -57,13 +105,16 @@ class ChatAgent:
         """
         self.local_llm = LocalLLM().llm
         self._tipo_runnable = "llm"
-
-        default_prompt = ChatPromptTemplate.from_messages(
-            [
-                MessagesPlaceholder("chat_history"),
-                ("human", "{input}"),
-            ]
-        )
+        # Protege a troca de modo: o tipo e a cadeia são sempre lidos e trocados juntos
+        self._lock = threading.RLock()
+        # Métricas da última resposta gerada em modo streaming
+        self.metricas = {}
+        # Informações coletadas pelas etapas da cadeia durante a resposta corrente
+        self._metricas_turno = {}
+        # Reformulações já feitas, indexadas pelo histórico recente e pela pergunta (LRU)
+        self._reformulacoes = OrderedDict()
+
+        default_prompt = montar_prompt()
         chain = default_prompt | self.local_llm
         self.chat_with_history = RunnableWithMessageHistory(
             runnable=chain,
@@ -81,61 +132,313 @@ class ChatAgent:
 
         return: None
         """
-        self._tipo_runnable = "rag"
-        self.rag_chain = self.build_rag_chain(retriever)
-        self.chat_with_history = RunnableWithMessageHistory(
-            self.rag_chain,
+        # A cadeia é montada antes de trocar o modo, para que perguntas em andamento não vejam um estado parcial
+        rag_chain = self.build_rag_chain(retriever)
+        chat_with_history = RunnableWithMessageHistory(
+            rag_chain,
             get_session_history=get_session_history,
             input_messages_key="input",
             history_messages_key="chat_history",
             output_messages_key="answer",
         )
+        with self._lock:
+            anterior = getattr(self, "executor_sandbox", None)
+            self._tipo_runnable = "rag"
+            self.rag_chain = rag_chain
+            self.chat_with_history = chat_with_history
+            self.executor_sandbox = None
+        # Os workers do CSV anterior não são mais usados no modo RAG
+        if anterior is not None:
+            anterior.fechar()
 
     def build_rag_chain(self, retriever):
         """
         Cria um encadeamento de RAG que contextualiza perguntas com base no histórico e documentos relevantes.
+        A reformulação é dispensada quando ainda não há perguntas no histórico e reaproveitada do cache quando o
+        histórico recente se repete; quando precisa ir ao modelo, a busca com a pergunta original corre em paralelo
+        e seus documentos são mantidos se a pergunta reformulada tiver o mesmo sentido.
+        Depois da reformulação, o embedding da pergunta autossuficiente é consultado no cache semântico de respostas;
+        em caso de acerto, a busca no vetorstore e a geração são dispensadas.
+        A duração de cada etapa é registrada em `metricas["etapas"]`.
 
         retriever: objeto para recuperação de documentos via embeddings.
 
         return: Runnable: cadeia de execução que realiza RAG.
         """
-        contextualize_q_prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    (
-                        "Você é um modelo que reformula perguntas de forma independente com base no histórico de chat. "
-                        "Receba a conversa até agora e uma nova pergunta, e devolva uma versão clara e autossuficiente da pergunta. "
-                        "Considere também o histórico anterior para manter coerência."
-                        "NÃO responda. Reformule apenas."
-                    ),
-                ),
-                MessagesPlaceholder("chat_history"),
-                ("human", "{input}"),
-            ]
+        # As instruções de cada etapa vão depois do histórico, que é o prefixo comum a todas as chamadas
+        contextualize_q_prompt = montar_prompt(
+            "Você é um modelo que reformula perguntas de forma independente com base no histórico de chat. "
+            "Receba a conversa até agora e uma nova pergunta, e devolva uma versão clara e autossuficiente da pergunta. "
+            "Considere também o histórico anterior para manter coerência."
+            "NÃO responda. Reformule apenas."
         )
 
-        history_aware_retriever = create_history_aware_retriever(
-            self.local_llm, retriever, contextualize_q_prompt
-        )
+        reformular = (
+            contextualize_q_prompt | self.local_llm | StrOutputParser()
+        ).with_config(run_name="reformular_pergunta")
 
-        qa_prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    (
-                        "Se a pergunta não estiver clara, faça perguntas adicionais para obter mais detalhes. "
-                        "Use o contexto abaixo para responder perguntas:\n\n{context}"
-                    ),
-                ),
-                MessagesPlaceholder("chat_history"),
-                ("human", "{input}"),
-            ]
+        # O contexto recuperado muda a cada turno, então fica no fim do prompt
+        qa_prompt = montar_prompt(
+            "Se a pergunta não estiver clara, faça perguntas adicionais para obter mais detalhes. "
+            "Use o contexto abaixo para responder perguntas:\n\n{context}"
         )
 
         question_answer_chain = create_stuff_documents_chain(self.local_llm, qa_prompt)
 
-        return create_retrieval_chain(history_aware_retriever, question_answer_chain)
+        # O cache semântico de respostas é separado pela coleção de documentos da sessão
+        cache = obter_cache_respostas()
+        namespace = (retriever.metadata or {}).get("colecao")
+        vectorstore = getattr(retriever, "vectorstore", None)
+        embeddings = getattr(vectorstore, "embeddings", None)
+        usar_cache = namespace is not None and embeddings is not None
+
+        def buscar(pergunta: str, config, etapa: str = "busca") -> tuple:
+            inicio = time.perf_counter()
+            with span(f"chat.{etapa}") as medicao:
+                docs = retriever.invoke(pergunta, config=config)
+                medicao.definir(**_tamanho_contexto(docs))
+            return docs, time.perf_counter() - inicio
+
+        async def abuscar(pergunta: str, config, etapa: str = "busca") -> tuple:
+            inicio = time.perf_counter()
+            with span(f"chat.{etapa}") as medicao:
+                docs = await retriever.ainvoke(pergunta, config=config)
+                medicao.definir(**_tamanho_contexto(docs))
+            return docs, time.perf_counter() - inicio
+
+        # A busca especulativa também vetoriza a pergunta original, fora do caminho crítico: o vetor é
+        # comparado com o da reformulada e fica no cache de consultas para a busca vetorial reaproveitar
+        def buscar_especulativa(pergunta: str, config) -> tuple:
+            original = (
+                embeddings.embed_query(pergunta) if embeddings is not None else None
+            )
+            return (*buscar(pergunta, config, "busca_especulativa"), original)
+
+        async def abuscar_especulativa(pergunta: str, config) -> tuple:
+            original = (
+                await embeddings.aembed_query(pergunta)
+                if embeddings is not None
+                else None
+            )
+            return (*await abuscar(pergunta, config, "busca_especulativa"), original)
+
+        def gerar_resposta(entrada: dict, config) -> Iterator[dict]:
+            etapas = self._metricas_turno.setdefault("etapas", {})
+            pergunta, chave = self._reformulacao_disponivel(entrada)
+            especulativa = None
+            if pergunta is None:
+                # A busca com a pergunta original corre em paralelo com a reformulação
+                if RAG_BUSCA_ESPECULATIVA:
+                    especulativa = _executor_especulativo.submit(
+                        no_contexto(buscar_especulativa), entrada["input"], config
+                    )
+                with _medir_etapa(etapas, "reformulacao"):
+                    pergunta = reformular.invoke(entrada, config=config)
+                self._guardar_reformulacao(chave, pergunta)
+
+            vetor = None
+            if embeddings is not None:
+                with _medir_etapa(etapas, "embedding_pergunta"):
+                    vetor = embeddings.embed_query(pergunta)
+            if usar_cache:
+                resposta = cache.obter(namespace, vetor)
+                self._metricas_turno["cache_resposta"] = resposta is not None
+                if resposta is not None:
+                    if especulativa is not None:
+                        especulativa.cancel()
+                    yield AddableDict(answer=resposta)
+                    return
+
+            docs = None
+            if especulativa is not None:
+                docs_especulativos, etapas["busca_especulativa"], original = (
+                    especulativa.result()
+                )
+                if self._usar_busca_especulativa(
+                    entrada["input"], pergunta, original, vetor
+                ):
+                    docs = docs_especulativos
+            if docs is None:
+                docs, etapas["busca"] = buscar(pergunta, config)
+
+            anotar(**_tamanho_contexto(docs))
+            yield AddableDict(context=docs)
+            partes = []
+            with _medir_etapa(etapas, "geracao"):
+                for trecho in question_answer_chain.stream(
+                    {**entrada, "pergunta": pergunta, "context": docs}, config=config
+                ):
+                    partes.append(trecho)
+                    yield AddableDict(answer=trecho)
+            if usar_cache:
+                cache.salvar(namespace, vetor, "".join(partes))
+
+        async def agerar_resposta(entrada: dict, config) -> AsyncIterator[dict]:
+            etapas = self._metricas_turno.setdefault("etapas", {})
+            pergunta, chave = self._reformulacao_disponivel(entrada)
+            especulativa = None
+            if pergunta is None:
+                if RAG_BUSCA_ESPECULATIVA:
+                    especulativa = asyncio.ensure_future(
+                        abuscar_especulativa(entrada["input"], config)
+                    )
+                with _medir_etapa(etapas, "reformulacao"):
+                    pergunta = await reformular.ainvoke(entrada, config=config)
+                self._guardar_reformulacao(chave, pergunta)
+
+            vetor = None
+            if embeddings is not None:
+                with _medir_etapa(etapas, "embedding_pergunta"):
+                    vetor = await embeddings.aembed_query(pergunta)
+            if usar_cache:
+                resposta = cache.obter(namespace, vetor)
+                self._metricas_turno["cache_resposta"] = resposta is not None
+                if resposta is not None:
+                    if especulativa is not None:
+                        especulativa.cancel()
+                    yield AddableDict(answer=resposta)
+                    return
+
+            docs = None
+            if especulativa is not None:
+                docs_especulativos, etapas["busca_especulativa"], original = (
+                    await especulativa
+                )
+                if self._usar_busca_especulativa(
+                    entrada["input"], pergunta, original, vetor
+                ):
+                    docs = docs_especulativos
+            if docs is None:
+                docs, etapas["busca"] = await abuscar(pergunta, config)
+
+            anotar(**_tamanho_contexto(docs))
+            yield AddableDict(context=docs)
+            partes = []
+            with _medir_etapa(etapas, "geracao"):
+                async for trecho in question_answer_chain.astream(
+                    {**entrada, "pergunta": pergunta, "context": docs}, config=config
+                ):
+                    partes.append(trecho)
+                    yield AddableDict(answer=trecho)
+            if usar_cache:
+                cache.salvar(namespace, vetor, "".join(partes))
+
+        return RunnableLambda(gerar_resposta, afunc=agerar_resposta).with_config(
+            run_name="responder_rag"
+        )
+
+    def _reformulacao_disponivel(self, entrada: dict) -> tuple:
+        """
+        Verifica se a pergunta pode seguir sem uma nova chamada de reformulação ao modelo:
+        quando o histórico ainda não tem perguntas do usuário (apenas mensagens de sistema) a pergunta
+        já é autossuficiente, e quando o mesmo histórico recente já foi reformulado o resultado vem do cache.
+
+        entrada: dict com `input` e `chat_history`.
+
+        return: tupla (pergunta ou None, chave do cache de reformulações).
+        """
+        historico = entrada.get("chat_history") or []
+        if not any(isinstance(mensagem, HumanMessage) for mensagem in historico):
+            self._metricas_turno["reformulacao"] = "dispensada"
+            return entrada["input"], None
+
+        recentes = [
+            mensagem
+            for mensagem in historico
+            if not isinstance(mensagem, SystemMessage)
+        ][-RAG_JANELA_REFORMULACAO:]
+        chave = (
+            tuple((mensagem.type, str(mensagem.content)) for mensagem in recentes),
+            entrada["input"],
+        )
+        pergunta = self._reformulacoes.get(chave)
+        if pergunta is not None:
+            self._reformulacoes.move_to_end(chave)
+            self._metricas_turno["reformulacao"] = "cache"
+            return pergunta, chave
+        self._metricas_turno["reformulacao"] = "llm"
+        return None, chave
+
+    def _guardar_reformulacao(self, chave: tuple, pergunta: str):
+        self._reformulacoes[chave] = pergunta
+        while len(self._reformulacoes) > RAG_CACHE_REFORMULACOES:
+            self._reformulacoes.popitem(last=False)
+
+    def _usar_busca_especulativa(
+        self, original: str, pergunta: str, vetor_original, vetor_pergunta
+    ) -> bool:
+        """
+        Decide se os documentos buscados com a pergunta original servem para a pergunta reformulada:
+        servem quando a reformulação não mudou o texto ou manteve o mesmo sentido (similaridade de cosseno
+        entre os embeddings acima de RAG_LIMIAR_ESPECULACAO).
+
+        original: pergunta enviada pelo usuário.
+        pergunta: pergunta reformulada.
+        vetor_original: embedding da pergunta original (ou None).
+        vetor_pergunta: embedding da pergunta reformulada (ou None).
+
+        return: bool
+        """
+        usar = original.strip().lower() == pergunta.strip().lower()
+        if not usar and vetor_original is not None and vetor_pergunta is not None:
+            a = np.asarray(vetor_original, dtype=np.float32)
+            b = np.asarray(vetor_pergunta, dtype=np.float32)
+            normas = float(np.linalg.norm(a) * np.linalg.norm(b))
+            usar = normas > 0 and float(a @ b) / normas >= RAG_LIMIAR_ESPECULACAO
+        self._metricas_turno["busca_especulativa_usada"] = usar
+        return usar
+
+    def _executar_ferramenta(self, pergunta: str, session_id: str, resposta_inicial):
+        """
+        Executa a chamada de ferramenta solicitada pelo modelo no modo CSV e registra
+        a pergunta, a chamada e o resultado no histórico da sessão.
+
+        pergunta: string com a pergunta do usuário.
+        session_id: identificador da sessão de chat.
+        resposta_inicial: AIMessage retornada pelo modelo com a chamada de ferramenta.
+
+        return:
+            - histórico da sessão atualizado, ou None se o modelo não chamou nenhuma ferramenta.
+        """
+        tool_calls = (
+            resposta_inicial.tool_calls
+            if hasattr(resposta_inicial, "tool_calls")
+            else []
+        )
+        if not tool_calls:
+            return None
+
+        tool_call = tool_calls[0]
+        tool_name = tool_call["name"]
+        tool_args = tool_call.get("args", {})
+        tool_id = tool_call["id"]
+
+        with self._lock:
+            executar_csv, cache_csv = self.executar_csv, self.cache_csv
+        tool_result = None
+        with span("chat.ferramenta", ferramenta=tool_name) as medicao:
+            query = None
+            if tool_name == "python_repl_ast":
+                query = tool_args.get("query", "")
+            elif tool_name.startswith("df"):
+                query = tool_name
+            if query is not None:
+                # Código já executado sobre a mesma versão do DataFrame devolve o resultado memorizado
+                tool_result, do_cache = cache_csv.executar(query, executar_csv)
+                medicao.definir(cache_hits=int(do_cache))
+
+        historico = get_session_history(session_id)
+        historico.add_message(HumanMessage(content=pergunta))
+        historico.add_message(
+            AIMessage(
+                content="",
+                additional_kwargs={"tool_calls": [tool_call]},
+            )
+        )
+        historico.add_message(
+            ToolMessage(tool_call_id=tool_id, content=str(tool_result))
+        )
+        return historico
 
     def responder(self, pergunta: str, session_id: str):
         """
@@ -147,48 +450,39 @@ class ChatAgent:
         return:
             - resposta (string ou objeto AIMessage) gerada pelo modelo.
         """
-        if self._tipo_runnable == "csv":
+        self._metricas_turno = {}
+        with iniciar_trace("turno", session_id=session_id, modo=self._tipo_runnable):
+            return self._responder(pergunta, session_id)
+
+    def _estado(self) -> tuple:
+        # Modo e cadeia correntes, lidos juntos para não misturar estados durante uma troca de modo
+        with self._lock:
+            return self._tipo_runnable, self.chat_with_history
+
+    def _config(self, session_id: str) -> dict:
+        # Configuração das chamadas: sessão do histórico e contagem de tokens no trace corrente
+        return {
+            "configurable": {"session_id": session_id},
+            "callbacks": callbacks_trace(),
+        }
+
+    def _responder(self, pergunta: str, session_id: str):
+        tipo, chat_with_history = self._estado()
+        if tipo == "csv":
             entrada = {"input": pergunta}
-            resposta_inicial = self.chat_with_history.invoke(
+            resposta_inicial = chat_with_history.invoke(
                 entrada,
-                config={"configurable": {"session_id": session_id}},
+                config=self._config(session_id),
             )
 
-            tool_calls = (
-                resposta_inicial.tool_calls
-                if hasattr(resposta_inicial, "tool_calls")
-                else []
+            historico = self._executar_ferramenta(
+                pergunta, session_id, resposta_inicial
             )
-            if tool_calls:
-                tool_call = tool_calls[0]
-                tool_name = tool_call["name"]
-                tool_args = tool_call.get("args", {})
-                tool_id = tool_call["id"]
-
-                tool_result = None
-                if tool_name == "python_repl_ast":
-                    query = tool_args.get("query", "")
-                    tool_result = self.tool_csv.run(query)
-                elif tool_name.startswith("df"):
-                    query = tool_name
-                    tool_result = self.tool_csv.run(query)
-
-                historico = get_session_history(session_id)
-                historico.add_message(HumanMessage(content=pergunta))
-                historico.add_message(
-                    AIMessage(
-                        content="",
-                        additional_kwargs={"tool_calls": [tool_call]},
-                    )
-                )
-                historico.add_message(
-                    ToolMessage(tool_call_id=tool_id, content=str(tool_result))
-                )
-
+            if historico is not None:
                 local_llm_csv = LocalLLM(temperature=0.3).llm
                 resposta_final = local_llm_csv.invoke(
                     historico.messages,
-                    config={"configurable": {"session_id": session_id}},
+                    config=self._config(session_id),
                 )
 
                 return resposta_final
@@ -197,49 +491,242 @@ class ChatAgent:
 
         entrada = {"input": pergunta}
 
-        resposta = self.chat_with_history.invoke(
+        resposta = chat_with_history.invoke(
             entrada,
-            config={"configurable": {"session_id": session_id}},
+            config=self._config(session_id),
         )
         return resposta
 
-    def load_dataframe_tools(self, df):
+    def _gerar_tokens(self, pergunta: str, session_id: str) -> Iterator[str]:
+        """
+        Gera os trechos de texto da resposta conforme o modelo os produz.
+
+        pergunta: string com a pergunta do usuário.
+        session_id: identificador da sessão de chat.
+
+        return:
+            - Iterator[str]: trechos de texto da resposta.
+        """
+        entrada = {"input": pergunta}
+        config = self._config(session_id)
+        tipo, chat_with_history = self._estado()
+
+        if tipo == "csv":
+            # A chamada da ferramenta precisa do tool call completo, então só a resposta final é transmitida
+            resposta_inicial = chat_with_history.invoke(entrada, config=config)
+            historico = self._executar_ferramenta(
+                pergunta, session_id, resposta_inicial
+            )
+            if historico is None:
+                yield resposta_inicial.content
+                return
+
+            local_llm_csv = LocalLLM(temperature=0.3).llm
+            partes = []
+            for chunk in local_llm_csv.stream(historico.messages, config=config):
+                partes.append(chunk.content)
+                yield chunk.content
+            historico.add_message(AIMessage(content="".join(partes)))
+            return
+
+        # O histórico é gravado pelo RunnableWithMessageHistory quando o stream termina
+        for chunk in chat_with_history.stream(entrada, config=config):
+            if tipo == "rag":
+                if "answer" in chunk:
+                    yield chunk["answer"]
+            else:
+                yield chunk.content
+
+    async def _agerar_tokens(
+        self, pergunta: str, session_id: str
+    ) -> AsyncIterator[str]:
+        """
+        Versão assíncrona de `_gerar_tokens`.
+
+        pergunta: string com a pergunta do usuário.
+        session_id: identificador da sessão de chat.
+
+        return:
+            - AsyncIterator[str]: trechos de texto da resposta.
+        """
+        entrada = {"input": pergunta}
+        config = self._config(session_id)
+        tipo, chat_with_history = self._estado()
+
+        if tipo == "csv":
+            resposta_inicial = await chat_with_history.ainvoke(entrada, config=config)
+            # A execução da ferramenta é síncrona e roda fora do event loop
+            historico = await asyncio.to_thread(
+                self._executar_ferramenta, pergunta, session_id, resposta_inicial
+            )
+            if historico is None:
+                yield resposta_inicial.content
+                return
+
+            local_llm_csv = LocalLLM(temperature=0.3).llm
+            partes = []
+            async for chunk in local_llm_csv.astream(historico.messages, config=config):
+                partes.append(chunk.content)
+                yield chunk.content
+            historico.add_message(AIMessage(content="".join(partes)))
+            return
+
+        async for chunk in chat_with_history.astream(entrada, config=config):
+            if tipo == "rag":
+                if "answer" in chunk:
+                    yield chunk["answer"]
+            else:
+                yield chunk.content
+
+    def _registrar_metricas(self, inicio: float, primeiro_token: float, trechos: int):
+        """
+        Registra em `self.metricas` o tempo até o primeiro token e o tempo total da resposta.
+
+        inicio: instante (perf_counter) em que a pergunta foi enviada.
+        primeiro_token: instante em que o primeiro trecho não vazio chegou, ou None.
+        trechos: quantidade de trechos recebidos.
+
+        return: None
+        """
+        self.metricas = {
+            "modo": self._tipo_runnable,
+            "tempo_primeiro_token": (
+                primeiro_token - inicio if primeiro_token is not None else None
+            ),
+            "tempo_total": time.perf_counter() - inicio,
+            "trechos": trechos,
+            **self._metricas_turno,
+        }
+        anotar(
+            tempo_primeiro_token=self.metricas["tempo_primeiro_token"],
+            trechos=trechos,
+        )
+        print(f"Métricas da resposta: {self.metricas}")
+
+    def responder_stream(self, pergunta: str, session_id: str) -> Iterator[str]:
+        """
+        Envia uma pergunta ao modelo e devolve a resposta em trechos, conforme são gerados.
+        Funciona nos modos simples, RAG (apenas a chave `answer`) e CSV.
+        Ao final, registra o tempo até o primeiro token em `self.metricas`.
+        O trace do turno fica em um contexto próprio, que não vaza para quem consome os trechos.
+
+        pergunta: string com a pergunta do usuário.
+        session_id: identificador da sessão de chat.
+
+        return:
+            - Iterator[str]: trechos de texto da resposta.
+        """
+        return em_contexto_proprio(self._responder_stream(pergunta, session_id))
+
+    def _responder_stream(self, pergunta: str, session_id: str) -> Iterator[str]:
+        inicio = time.perf_counter()
+        primeiro_token = None
+        trechos = 0
+        self._metricas_turno = {}
+        with iniciar_trace("turno", session_id=session_id, modo=self._tipo_runnable):
+            for trecho in self._gerar_tokens(pergunta, session_id):
+                if not trecho:
+                    continue
+                if primeiro_token is None:
+                    primeiro_token = time.perf_counter()
+                trechos += 1
+                yield trecho
+            self._registrar_metricas(inicio, primeiro_token, trechos)
+
+    def aresponder_stream(self, pergunta: str, session_id: str) -> AsyncIterator[str]:
+        """
+        Versão assíncrona de `responder_stream`.
+
+        pergunta: string com a pergunta do usuário.
+        session_id: identificador da sessão de chat.
+
+        return:
+            - AsyncIterator[str]: trechos de texto da resposta.
+        """
+        return aem_contexto_proprio(self._aresponder_stream(pergunta, session_id))
+
+    async def _aresponder_stream(
+        self, pergunta: str, session_id: str
+    ) -> AsyncIterator[str]:
+        inicio = time.perf_counter()
+        primeiro_token = None
+        trechos = 0
+        self._metricas_turno = {}
+        with iniciar_trace("turno", session_id=session_id, modo=self._tipo_runnable):
+            async for trecho in self._agerar_tokens(pergunta, session_id):
+                if not trecho:
+                    continue
+                if primeiro_token is None:
+                    primeiro_token = time.perf_counter()
+                trechos += 1
+                yield trecho
+            self._registrar_metricas(inicio, primeiro_token, trechos)
+
+    def load_dataframe_tools(self, df, sidecar: str = None):
         """
         Configura ferramentas de análise de dados para interação com um DataFrame.
         Ativa o modo CSV com suporte a execução de código Python para análise de dados.
+        Com `sidecar` (e CSV_SANDBOX ativo), o código é executado em um pool de processos isolados
+        que abrem o DataFrame mapeado em memória; sem ele, no próprio processo.
 
         df: pandas.DataFrame contendo os dados a serem analisados pelo agente.
+        sidecar: caminho do arquivo Arrow com o mesmo conteúdo de `df` (opcional).
 
         return: None
         """
-        self._tipo_runnable = "csv"
-        self.tool_csv = PythonAstREPLTool(locals={"df": df})
-        llm_tool = self.local_llm.bind_tools(
-            [self.tool_csv], tool_choice="python_repl_ast"
-        )
+        # As ferramentas do langchain_experimental só são carregadas quando um CSV é enviado
+        from langchain_experimental.tools import PythonAstREPLTool
+
+        tool_csv = PythonAstREPLTool(locals={"df": df})
+        llm_tool = self.local_llm.bind_tools([tool_csv], tool_choice="python_repl_ast")
+        # O esquema e as estatísticas vão no prompt para o modelo não gastar chamadas descobrindo as colunas
+        with span("csv.perfil"):
+            perfil = perfil_dataframe(df)
         system = """
             Você tem acesso ao DataFrame `df` para responder perguntas sobre os dados.
             - Utilize apenas o DataFrame `df` para responder às perguntas.
             - Use SOMENTE Python com pandas.
             - Sempre chame a ferramenta apenas com o código necessário.
             - Depois de obter a resposta da ferramenta, retorne-a ao usuário."
+
+            Perfil do DataFrame `df` (colunas, dtypes, nulos e estatísticas):
+            {perfil_df}
             """
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    system,
-                ),
-                MessagesPlaceholder("chat_history"),
-                ("human", "{input}"),
-            ]
-        )
+        # Com o prefixo estável, a segunda chamada (com o resultado da ferramenta) reaproveita o histórico
+        prompt = montar_prompt(system).partial(perfil_df=perfil)
 
         chain = prompt | llm_tool
-        self.chat_with_history = RunnableWithMessageHistory(
+        chat_with_history = RunnableWithMessageHistory(
             runnable=chain,
             get_session_history=get_session_history,
             input_messages_key="input",
             history_messages_key="chat_history",
             output_messages_key="answer",
         )
+        # Os workers do sandbox começam a importar o pandas e abrir o DataFrame desde já
+        executor = ExecutorSandbox(sidecar) if CSV_SANDBOX and sidecar else None
+        with self._lock:
+            anterior = getattr(self, "executor_sandbox", None)
+            self._tipo_runnable = "csv"
+            self.tool_csv = tool_csv
+            self.executor_sandbox = executor
+            self.executar_csv = executor.executar if executor else tool_csv.run
+            self.cache_csv = CacheResultadosDataFrame()
+            self.chat_with_history = chat_with_history
+        if anterior is not None:
+            anterior.fechar()
+
+    def fechar(self):
+        """
+        Libera os recursos do agente que vivem fora do processo (workers do sandbox do CSV).
+        Chamado quando a sessão é descartada; o agente continua utilizável nos modos simples e RAG.
+
+        return: None
+        """
+        with self._lock:
+            executor = getattr(self, "executor_sandbox", None)
+            self.executor_sandbox = None
+            if executor is not None:
+                self.executar_csv = self.tool_csv.run
+        if executor is not None:
+            executor.fechar()
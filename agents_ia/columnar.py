@@ -0,0 +1,367 @@
+from collections import Counter
+import json
+import os
+import threading
+import time
+
+CSV_LIMIAR_COLUNAR_MB = float(os.getenv("CSV_LIMIAR_COLUNAR_MB", "100"))
+CSV_LINHAS_POR_BLOCO = int(os.getenv("CSV_LINHAS_POR_BLOCO", "200000"))
+CSV_MAX_CATEGORIAS = int(os.getenv("CSV_MAX_CATEGORIAS", "5000"))
+COLUNAR_DIR = os.getenv("COLUNAR_DIR", "./cache_storage/colunar")
+# Espaço máximo dos sidecars; acima dele os acessados há mais tempo são removidos (0 desativa)
+COLUNAR_MAX_MB = float(os.getenv("COLUNAR_MAX_MB", "2048"))
+
+_sidecars_lock = threading.Lock()
+# Sidecars reabertos pelo caminho enquanto estão em uso (ex.: workers do sandbox), que não são removidos
+_sidecars_reservados = Counter()
+
+# Tipos inteiros do menor para o maior, usados no downcast
+_INTEIROS = ["int8", "int16", "int32", "int64"]
+_INTEIROS_SEM_SINAL = ["uint8", "uint16", "uint32", "uint64"]
+
+
+def _menor_inteiro(minimo, maximo, anulavel: bool) -> str:
+    """
+    Escolhe o menor tipo inteiro capaz de representar o intervalo [minimo, maximo].
+
+    minimo: menor valor observado na coluna.
+    maximo: maior valor observado na coluna.
+    anulavel: se a coluna possui valores nulos (usa os tipos inteiros anuláveis do pandas).
+
+    return: string com o nome do dtype.
+    """
+    import numpy as np
+
+    candidatos = _INTEIROS_SEM_SINAL if minimo >= 0 else _INTEIROS
+    for nome in candidatos:
+        info = np.iinfo(nome)
+        if info.min <= minimo and maximo <= info.max:
+            return nome.capitalize().replace("Uint", "UInt") if anulavel else nome
+    return "Int64" if anulavel else "int64"
+
+
+def _perfilar(fonte, linhas_por_bloco: int) -> dict:
+    """
+    Lê o CSV em blocos e coleta, por coluna, o tipo, intervalo numérico, presença de nulos e valores distintos.
+    Também mede a memória que o DataFrame ocuparia com os dtypes padrão do pandas.
+
+    fonte: buffer ou caminho do CSV.
+    linhas_por_bloco: quantidade de linhas lidas por bloco.
+
+    return: dict com "colunas", "linhas" e "memoria_padrao".
+    """
+    import pandas as pd
+
+    colunas = {}
+    linhas = 0
+    memoria_padrao = 0
+    for bloco in pd.read_csv(fonte, chunksize=linhas_por_bloco):
+        linhas += len(bloco)
+        memoria_padrao += int(bloco.memory_usage(deep=True, index=False).sum())
+        for nome in bloco.columns:
+            serie = bloco[nome]
+            perfil = colunas.setdefault(
+                nome,
+                {
+                    "tipo": None,
+                    "nulos": False,
+                    "min": None,
+                    "max": None,
+                    "inteiro": True,
+                    "valores": set(),
+                },
+            )
+            perfil["nulos"] = perfil["nulos"] or bool(serie.isna().any())
+            validos = serie.dropna()
+
+            if pd.api.types.is_bool_dtype(serie):
+                tipo = "bool"
+            elif pd.api.types.is_integer_dtype(serie):
+                tipo = "int"
+            elif pd.api.types.is_float_dtype(serie):
+                tipo = "float"
+                if perfil["inteiro"] and len(validos):
+                    perfil["inteiro"] = bool((validos % 1 == 0).all())
+            else:
+                tipo = "texto"
+
+            # Tipos diferentes entre blocos são promovidos para o mais genérico
+            anterior = perfil["tipo"]
+            if anterior is None or anterior == tipo:
+                perfil["tipo"] = tipo
+            elif {anterior, tipo} == {"int", "float"}:
+                perfil["tipo"] = "float"
+            else:
+                perfil["tipo"] = "texto"
+
+            if tipo in ("int", "float") and len(validos):
+                minimo, maximo = validos.min(), validos.max()
+                perfil["min"] = (
+                    minimo if perfil["min"] is None else min(perfil["min"], minimo)
+                )
+                perfil["max"] = (
+                    maximo if perfil["max"] is None else max(perfil["max"], maximo)
+                )
+            # Valores distintos só interessam a colunas de texto (candidatas a categóricas)
+            if perfil["valores"] is not None and perfil["tipo"] == "texto":
+                if tipo != "texto" or anterior not in (None, "texto"):
+                    # Coluna promovida a texto: os valores dos blocos não textuais não foram coletados
+                    perfil["valores"] = None
+                else:
+                    perfil["valores"].update(validos.astype(str).unique())
+                    if len(perfil["valores"]) > CSV_MAX_CATEGORIAS:
+                        perfil["valores"] = None
+    return {"colunas": colunas, "linhas": linhas, "memoria_padrao": memoria_padrao}
+
+
+def inferir_dtypes(perfil: dict) -> dict:
+    """
+    Define dtypes compactos a partir do perfil do CSV: inteiros e floats reduzidos ao menor tipo
+    que comporta os valores e colunas de texto com poucos valores distintos como categóricas.
+
+    perfil: resultado de `_perfilar`.
+
+    return: dict {coluna: dtype}.
+    """
+    import pandas as pd
+
+    dtypes = {}
+    limite_categorias = 0.5 * max(perfil["linhas"], 1)
+    for nome, coluna in perfil["colunas"].items():
+        tipo = coluna["tipo"]
+        valores = coluna["valores"]
+        if tipo == "bool":
+            dtypes[nome] = "boolean" if coluna["nulos"] else "bool"
+        elif tipo in ("int", "float") and coluna["min"] is None:
+            dtypes[nome] = "float32"
+        elif tipo == "int" or (tipo == "float" and coluna["inteiro"]):
+            dtypes[nome] = _menor_inteiro(
+                coluna["min"], coluna["max"], anulavel=coluna["nulos"]
+            )
+        elif tipo == "float":
+            dtypes[nome] = "float32"
+        elif valores is not None and len(valores) <= limite_categorias:
+            dtypes[nome] = pd.CategoricalDtype(categories=sorted(valores))
+        else:
+            dtypes[nome] = "string"
+    return dtypes
+
+
+def _converter_bloco(bloco, dtypes: dict):
+    """
+    Aplica os dtypes compactos a um bloco lido com os dtypes padrão.
+
+    bloco: pandas.DataFrame com um bloco do CSV.
+    dtypes: dict {coluna: dtype} retornado por `inferir_dtypes`.
+
+    return: o bloco convertido.
+    """
+    for nome, dtype in dtypes.items():
+        if isinstance(dtype, str) and dtype == "string":
+            bloco[nome] = bloco[nome].astype("string")
+        elif not isinstance(dtype, str):
+            # Categorias foram coletadas como texto
+            bloco[nome] = bloco[nome].astype("string").astype(dtype)
+        else:
+            bloco[nome] = bloco[nome].astype(dtype)
+    return bloco
+
+
+def converter_csv(
+    fonte, destino: str, linhas_por_bloco: int = CSV_LINHAS_POR_BLOCO
+) -> dict:
+    """
+    Converte um CSV em um arquivo Arrow IPC (sidecar) com dtypes compactos, lendo em blocos.
+    Faz duas passagens: a primeira perfila as colunas e a segunda converte e grava os blocos.
+
+    fonte: buffer (com seek) ou caminho do CSV.
+    destino: caminho do arquivo .arrow a ser gerado.
+    linhas_por_bloco: quantidade de linhas lidas por bloco.
+
+    return: dict com o relatório da conversão (linhas, memória padrão, tamanho do sidecar, tempo).
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    inicio = time.perf_counter()
+    if hasattr(fonte, "seek"):
+        fonte.seek(0)
+    perfil = _perfilar(fonte, linhas_por_bloco)
+    dtypes = inferir_dtypes(perfil)
+
+    if hasattr(fonte, "seek"):
+        fonte.seek(0)
+    os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+    temporario = f"{destino}.tmp"
+    escritor = None
+    try:
+        for bloco in pd.read_csv(fonte, chunksize=linhas_por_bloco):
+            bloco = _converter_bloco(bloco, dtypes)
+            if escritor is None:
+                schema = pa.Schema.from_pandas(bloco, preserve_index=False)
+                escritor = pa.ipc.new_file(temporario, schema)
+            escritor.write_table(
+                pa.Table.from_pandas(bloco, schema=schema, preserve_index=False)
+            )
+    finally:
+        if escritor is not None:
+            escritor.close()
+    if escritor is None:
+        raise ValueError("CSV vazio: nenhuma linha para converter.")
+    os.replace(temporario, destino)
+
+    return {
+        "linhas": perfil["linhas"],
+        "colunas": len(dtypes),
+        "dtypes": {nome: str(dtype) for nome, dtype in dtypes.items()},
+        "memoria_padrao_bytes": perfil["memoria_padrao"],
+        "sidecar_bytes": os.path.getsize(destino),
+        "segundos_conversao": time.perf_counter() - inicio,
+    }
+
+
+def tocar_sidecar(caminho: str):
+    """
+    Atualiza a data de acesso de um sidecar reaproveitado, usada pela remoção LRU.
+
+    caminho: caminho do arquivo .arrow.
+
+    return: None
+    """
+    try:
+        os.utime(caminho)
+    except OSError:
+        pass
+
+
+def reservar_sidecar(caminho: str):
+    """
+    Impede que um sidecar seja removido pela remoção LRU enquanto ele pode ser reaberto pelo caminho.
+    Cada reserva deve ser desfeita com `liberar_sidecar`.
+
+    caminho: caminho do arquivo .arrow.
+
+    return: None
+    """
+    with _sidecars_lock:
+        _sidecars_reservados[os.path.abspath(caminho)] += 1
+
+
+def liberar_sidecar(caminho: str):
+    with _sidecars_lock:
+        chave = os.path.abspath(caminho)
+        _sidecars_reservados[chave] -= 1
+        if _sidecars_reservados[chave] <= 0:
+            del _sidecars_reservados[chave]
+
+
+def limitar_sidecars(
+    pasta: str = COLUNAR_DIR,
+    max_bytes: int = int(COLUNAR_MAX_MB * 1024 * 1024),
+    manter: str = None,
+) -> int:
+    """
+    Remove os sidecars acessados há mais tempo (com o relatório de conversão correspondente) até a pasta
+    voltar a caber em `max_bytes`. DataFrames já abertos continuam válidos, pois o mapeamento em memória
+    mantém o arquivo removido; sidecars reservados ou que não possam ser apagados são mantidos.
+
+    pasta: diretório dos sidecars.
+    max_bytes: espaço máximo ocupado pelos sidecars (0 desativa).
+    manter: sidecar que nunca é removido (ex.: o que acabou de ser gravado).
+
+    return: bytes liberados.
+    """
+    if max_bytes <= 0 or not os.path.isdir(pasta):
+        return 0
+    with _sidecars_lock:
+        sidecars = sorted(
+            (
+                entrada
+                for entrada in os.scandir(pasta)
+                if entrada.is_file() and entrada.name.endswith(".arrow")
+            ),
+            key=lambda e: e.stat().st_mtime,
+        )
+        total = sum(entrada.stat().st_size for entrada in sidecars)
+        liberados = 0
+        for entrada in sidecars:
+            if total <= max_bytes:
+                break
+            caminho = os.path.abspath(entrada.path)
+            if caminho in _sidecars_reservados or (
+                manter and caminho == os.path.abspath(manter)
+            ):
+                continue
+            tamanho = entrada.stat().st_size
+            try:
+                os.remove(entrada.path)
+            except OSError as e:
+                print(f"Sidecar '{entrada.name}' em uso, mantido: {e}")
+                continue
+            relatorio = f"{entrada.path[: -len('.arrow')]}.json"
+            if os.path.exists(relatorio):
+                os.remove(relatorio)
+            total -= tamanho
+            liberados += tamanho
+            print(f"Sidecar colunar '{entrada.name}' removido (LRU).")
+    return liberados
+
+
+def abrir_sidecar(caminho: str):
+    """
+    Abre o sidecar Arrow mapeado em memória e o expõe como DataFrame.
+    Colunas numéricas sem nulos são lidas sem cópia e colunas de texto continuam apoiadas nos buffers Arrow,
+    de modo que o sistema operacional carrega do disco apenas as páginas efetivamente acessadas.
+
+    caminho: caminho do arquivo .arrow.
+
+    return: pandas.DataFrame apoiado no arquivo mapeado.
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    tabela = pa.ipc.open_file(pa.memory_map(caminho, "r")).read_all()
+    return tabela.to_pandas(
+        split_blocks=True,
+        types_mapper=lambda tipo: (
+            pd.ArrowDtype(tipo)
+            if pa.types.is_string(tipo) or pa.types.is_large_string(tipo)
+            else None
+        ),
+    )
+
+
+def carregar_csv_colunar(fonte, chave: str, pasta: str = COLUNAR_DIR):
+    """
+    Carrega um CSV grande no modo colunar: converte uma única vez para o sidecar Arrow
+    (identificado pelo hash do conteúdo) e devolve um DataFrame apoiado nele.
+
+    fonte: buffer ou caminho do CSV.
+    chave: SHA-256 do conteúdo do arquivo, usado para nomear o sidecar.
+    pasta: diretório onde os sidecars são gravados.
+
+    return: tupla (DataFrame, relatório) com a memória antes e depois da conversão.
+    """
+    destino = os.path.join(pasta, f"{chave}.arrow")
+    caminho_relatorio = os.path.join(pasta, f"{chave}.json")
+    if os.path.exists(destino) and os.path.exists(caminho_relatorio):
+        with open(caminho_relatorio, encoding="utf-8") as arquivo:
+            relatorio = json.load(arquivo)
+        tocar_sidecar(destino)
+    else:
+        relatorio = converter_csv(fonte, destino)
+        with open(caminho_relatorio, "w", encoding="utf-8") as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False)
+        limitar_sidecars(pasta, manter=destino)
+
+    df = abrir_sidecar(destino)
+    relatorio = dict(relatorio)
+    relatorio["sidecar"] = destino
+    relatorio["memoria_compacta_bytes"] = int(
+        df.memory_usage(deep=True, index=False).sum()
+    )
+    print(
+        f"CSV colunar: {relatorio['linhas']} linhas, memória "
+        f"{relatorio['memoria_padrao_bytes'] / 1e6:.1f} MB -> {relatorio['memoria_compacta_bytes'] / 1e6:.1f} MB"
+    )
+    return df, relatorio
@@ -0,0 +1,263 @@
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+import ast
+import os
+import threading
+
+# Limites do perfil do DataFrame injetado no prompt do modo CSV
+DF_PERFIL_MAX_COLUNAS = int(os.getenv("DF_PERFIL_MAX_COLUNAS", "60"))
+DF_PERFIL_MAX_VALORES = int(os.getenv("DF_PERFIL_MAX_VALORES", "3"))
+# Resultados de ferramenta memorizados: quantidade e total de caracteres mantidos (LRU)
+DF_CACHE_MAX_ITENS = int(os.getenv("DF_CACHE_MAX_ITENS", "256"))
+DF_CACHE_MAX_CARACTERES = int(os.getenv("DF_CACHE_MAX_CARACTERES", "2000000"))
+
+# Métodos que alteram o objeto em que são chamados (DataFrame, Series, listas ou dicts do REPL)
+_METODOS_MUTANTES = {
+    "append",
+    "clear",
+    "extend",
+    "insert",
+    "pop",
+    "popitem",
+    "remove",
+    "setdefault",
+    "update",
+    "sort",
+    "reverse",
+    "add",
+    "discard",
+    "to_csv",
+    "to_parquet",
+    "to_excel",
+    "to_json",
+    "to_pickle",
+}
+# Funções cujo efeito não depende só do código e do DataFrame
+_FUNCOES_IMPURAS = {"exec", "eval", "open", "input", "setattr", "delattr", "globals"}
+
+
+def _encurtar(valor: Any, tamanho: int = 40) -> str:
+    texto = str(valor).replace("\n", " ")
+    return texto if len(texto) <= tamanho else texto[: tamanho - 3] + "..."
+
+
+def perfil_dataframe(
+    df,
+    max_colunas: int = DF_PERFIL_MAX_COLUNAS,
+    max_valores: int = DF_PERFIL_MAX_VALORES,
+) -> str:
+    """
+    Resume o DataFrame em um texto compacto para o prompt do modo CSV: dimensões, e por coluna o dtype,
+    a quantidade de nulos e estatísticas básicas (intervalo e média das numéricas, valores mais frequentes
+    das demais). Assim o modelo já conhece o esquema e não gasta chamadas de ferramenta descobrindo-o.
+
+    df: pandas.DataFrame a ser resumido.
+    max_colunas: quantidade máxima de colunas descritas.
+    max_valores: quantidade de valores mais frequentes listados por coluna não numérica.
+
+    return: string com o perfil.
+    """
+    import pandas as pd
+
+    linhas = [f"{len(df)} linhas x {len(df.columns)} colunas."]
+    for coluna in list(df.columns)[:max_colunas]:
+        serie = df[coluna]
+        descricao = f"- {coluna!r} ({serie.dtype}, {int(serie.isna().sum())} nulos)"
+        try:
+            if pd.api.types.is_bool_dtype(serie):
+                contagens = serie.value_counts().to_dict()
+                descricao += f": {contagens}"
+            elif pd.api.types.is_numeric_dtype(serie):
+                descricao += (
+                    f": min={_encurtar(serie.min())}, max={_encurtar(serie.max())}, "
+                    f"média={serie.mean():.4g}"
+                )
+            elif pd.api.types.is_datetime64_any_dtype(serie):
+                descricao += f": de {serie.min()} a {serie.max()}"
+            else:
+                frequentes = serie.value_counts().head(max_valores)
+                valores = ", ".join(
+                    f"{_encurtar(valor)!r} ({quantidade})"
+                    for valor, quantidade in frequentes.items()
+                )
+                descricao += (
+                    f": {serie.nunique()} distintos; mais frequentes: {valores}"
+                )
+        except (TypeError, ValueError):
+            pass
+        linhas.append(descricao)
+    if len(df.columns) > max_colunas:
+        linhas.append(f"- ... e mais {len(df.columns) - max_colunas} colunas.")
+    return "\n".join(linhas)
+
+
+def normalizar_codigo(codigo: str) -> Optional[Tuple[str, bool]]:
+    """
+    Normaliza o código enviado à ferramenta pela árvore sintática (ignora formatação, comentários e
+    blocos de markdown) e verifica se ele pode alterar o estado do REPL.
+    São considerados mutantes: nomes definidos no nível do módulo (atribuições, `import`, `def`, `class`,
+    `del`, variáveis de laços), que continuam nos locals do REPL entre as chamadas, atribuições a atributos
+    ou a itens, `inplace=True`, chamadas de métodos que alteram o objeto (ex.: `insert`, `update`) e
+    funções como `exec` e `open`.
+
+    codigo: código Python enviado pelo modelo.
+
+    return: tupla (código normalizado, mutante), ou None se o código não for válido.
+    """
+    from langchain_experimental.tools.python.tool import sanitize_input
+
+    try:
+        arvore = ast.parse(sanitize_input(codigo))
+    except SyntaxError:
+        return None
+    return ast.unparse(arvore), _altera_estado(arvore)
+
+
+def _define_nomes(arvore: ast.AST) -> bool:
+    # Percorre o escopo do módulo: o corpo de funções e lambdas e as variáveis das comprehensions são locais
+    pilha = [arvore]
+    while pilha:
+        no = pilha.pop()
+        if isinstance(
+            no,
+            (
+                ast.Import,
+                ast.ImportFrom,
+                ast.FunctionDef,
+                ast.AsyncFunctionDef,
+                ast.ClassDef,
+            ),
+        ):
+            return True
+        if isinstance(no, ast.Name) and isinstance(no.ctx, (ast.Store, ast.Del)):
+            return True
+        if isinstance(no, ast.Lambda):
+            continue
+        for filho in ast.iter_child_nodes(no):
+            if isinstance(filho, ast.comprehension):
+                pilha.extend([filho.iter, *filho.ifs])
+            else:
+                pilha.append(filho)
+    return False
+
+
+def _altera_estado(arvore: ast.AST) -> bool:
+    if _define_nomes(arvore):
+        return True
+    for no in ast.walk(arvore):
+        if isinstance(no, (ast.Delete, ast.Global, ast.Nonlocal)):
+            return True
+        if isinstance(no, (ast.Assign, ast.AugAssign, ast.AnnAssign, ast.NamedExpr)):
+            alvos = no.targets if isinstance(no, ast.Assign) else [no.target]
+            for alvo in alvos:
+                for parte in ast.walk(alvo):
+                    if isinstance(parte, (ast.Attribute, ast.Subscript)):
+                        return True
+        if isinstance(no, ast.Call):
+            funcao = no.func
+            if isinstance(funcao, ast.Attribute) and funcao.attr in _METODOS_MUTANTES:
+                return True
+            if isinstance(funcao, ast.Name) and funcao.id in _FUNCOES_IMPURAS:
+                return True
+            for argumento in no.keywords:
+                if (
+                    argumento.arg == "inplace"
+                    and isinstance(argumento.value, ast.Constant)
+                    and argumento.value.value is True
+                ):
+                    return True
+    return False
+
+
+class CacheResultadosDataFrame:
+    def __init__(
+        self,
+        max_itens: int = DF_CACHE_MAX_ITENS,
+        max_caracteres: int = DF_CACHE_MAX_CARACTERES,
+    ):
+        """
+        Memoriza os resultados das execuções da ferramenta do modo CSV, indexados pela versão do estado
+        do REPL (DataFrame e variáveis) e pelo código normalizado. Código que altera o estado não é
+        memorizado e avança a versão, invalidando os resultados anteriores. A memória é limitada pela
+        quantidade de itens e pelo total de caracteres guardados (LRU).
+
+        max_itens: quantidade máxima de resultados mantidos.
+        max_caracteres: soma máxima do tamanho dos resultados mantidos.
+
+        return: None
+        """
+        self.max_itens = max_itens
+        self.max_caracteres = max_caracteres
+        self.versao = 0
+        self.hits = 0
+        self.misses = 0
+        self._itens = OrderedDict()
+        self._caracteres = 0
+        self._lock = threading.Lock()
+
+    def executar(self, codigo: str, funcao: Callable[[str], Any]) -> Tuple[str, bool]:
+        """
+        Retorna o resultado memorizado para o código ou o executa com `funcao` e guarda o resultado.
+
+        codigo: código Python enviado pelo modelo.
+        funcao: executa o código e devolve o resultado (ex.: `PythonAstREPLTool.run`).
+
+        return: tupla (resultado como string, True se veio do cache).
+        """
+        normalizado = normalizar_codigo(codigo)
+        if normalizado is None:
+            return str(funcao(codigo)), False
+        texto, mutante = normalizado
+        chave = (self.versao, texto)
+        if not mutante:
+            with self._lock:
+                resultado = self._itens.get(chave)
+                if resultado is not None:
+                    self._itens.move_to_end(chave)
+                    self.hits += 1
+                    return resultado, True
+                self.misses += 1
+
+        resultado = str(funcao(codigo))
+        with self._lock:
+            if mutante:
+                self._invalidar()
+            elif len(resultado) <= self.max_caracteres:
+                self._guardar(chave, resultado)
+        return resultado, False
+
+    def _guardar(self, chave: tuple, resultado: str):
+        anterior = self._itens.pop(chave, None)
+        if anterior is not None:
+            self._caracteres -= len(anterior)
+        self._itens[chave] = resultado
+        self._caracteres += len(resultado)
+        while self._itens and (
+            len(self._itens) > self.max_itens or self._caracteres > self.max_caracteres
+        ):
+            _, removido = self._itens.popitem(last=False)
+            self._caracteres -= len(removido)
+
+    def invalidar(self):
+        """
+        Avança a versão do DataFrame e descarta os resultados memorizados.
+
+        return: None
+        """
+        with self._lock:
+            self._invalidar()
+
+    def _invalidar(self):
+        self.versao += 1
+        self._itens.clear()
+        self._caracteres = 0
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                "versao": self.versao,
+                "itens": len(self._itens),
+                "caracteres": self._caracteres,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,265 @@
+from langchain_core.documents import Document
+from typing import Iterable, Iterator, List, Optional
+import gzip
+import hashlib
+import itertools
+import json
+import os
+import threading
+
+DOCUMENT_CACHE_DIR = os.getenv("DOCUMENT_CACHE_DIR", "./cache_storage/documentos")
+DOCUMENT_CACHE_MAX_MB = int(os.getenv("DOCUMENT_CACHE_MAX_MB", "512"))
+
+
+class DocumentCache:
+    def __init__(
+        self,
+        pasta: str = DOCUMENT_CACHE_DIR,
+        max_bytes: int = DOCUMENT_CACHE_MAX_MB * 1024 * 1024,
+    ):
+        """
+        Inicializa o cache em disco de arquivos já processados, endereçado pelo SHA-256 do conteúdo.
+        Documentos são gravados em JSON Lines compactado (gzip), um por linha, e DataFrames em Parquet.
+
+        pasta: diretório onde os arquivos do cache são gravados.
+        max_bytes: tamanho máximo do cache; acima disso os arquivos acessados há mais tempo são removidos.
+
+        return: None
+        """
+        self.pasta = pasta
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(pasta, exist_ok=True)
+
+    @staticmethod
+    def hash_conteudo(dados: bytes) -> str:
+        """
+        Calcula o SHA-256 do conteúdo de um arquivo.
+
+        dados: bytes do arquivo.
+
+        return: string hexadecimal com o hash.
+        """
+        return hashlib.sha256(dados).hexdigest()
+
+    def _caminho(self, chave: str, sufixo: str) -> str:
+        return os.path.join(self.pasta, f"{chave}.{sufixo}")
+
+    @staticmethod
+    def _temporario(caminho: str) -> str:
+        return f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def _acerto(self, caminho: str):
+        """
+        Contabiliza uma consulta respondida pelo cache e atualiza a data de acesso usada pela remoção LRU.
+
+        caminho: arquivo do cache lido.
+
+        return: None
+        """
+        try:
+            os.utime(caminho)
+        except OSError:
+            # Removido pela LRU depois da leitura: o conteúdo já lido continua válido
+            pass
+        with self._lock:
+            self.hits += 1
+
+    def _falha(self, caminho: str, erro: Exception):
+        """
+        Contabiliza uma consulta que o cache não conseguiu responder: arquivo ausente (inclusive removido
+        pela LRU durante a consulta) ou ilegível. Entradas ilegíveis são regravadas pelo próximo processamento.
+
+        caminho: arquivo do cache consultado.
+        erro: exceção levantada na leitura.
+
+        return: None
+        """
+        if not isinstance(erro, FileNotFoundError):
+            print(
+                f"Cache de documentos: '{os.path.basename(caminho)}' ilegível: {erro}"
+            )
+        with self._lock:
+            self.misses += 1
+
+    def obter_documentos(self, chave: str, modo: str) -> Optional[Iterator[Document]]:
+        """
+        Busca no cache os documentos extraídos de um arquivo.
+
+        chave: SHA-256 do conteúdo do arquivo.
+        modo: forma de extração (ex.: "paginas", "unstructured"), pois cada uma gera documentos diferentes.
+
+        return: iterador de Document lido sob demanda, ou None se não estiver em cache.
+        """
+        caminho = self._caminho(chave, f"{modo}.jsonl.gz")
+        arquivo = None
+        try:
+            # O arquivo é aberto e o início lido já na consulta: uma remoção LRU posterior não afeta
+            # a leitura sob demanda, e um arquivo ilegível é tratado como miss
+            arquivo = gzip.open(caminho, "rt", encoding="utf-8")
+            primeira = arquivo.readline()
+        except Exception as e:
+            if arquivo is not None:
+                arquivo.close()
+            self._falha(caminho, e)
+            return None
+        self._acerto(caminho)
+        return self._ler_documentos(arquivo, primeira)
+
+    @staticmethod
+    def _ler_documentos(arquivo, primeira: str) -> Iterator[Document]:
+        with arquivo:
+            for linha in itertools.chain([primeira], arquivo):
+                if not linha:
+                    continue
+                item = json.loads(linha)
+                yield Document(
+                    page_content=item["page_content"], metadata=item["metadata"]
+                )
+
+    def gravar_documentos(
+        self, chave: str, modo: str, docs: Iterable[Document]
+    ) -> Iterator[Document]:
+        """
+        Repassa os documentos recebidos gravando cada um no cache à medida que passa.
+        A entrada só é publicada no cache quando o iterador é consumido até o fim.
+
+        chave: SHA-256 do conteúdo do arquivo.
+        modo: forma de extração usada.
+        docs: iterável de documentos extraídos.
+
+        return: iterador com os mesmos documentos de `docs`.
+        """
+        caminho = self._caminho(chave, f"{modo}.jsonl.gz")
+        temporario = self._temporario(caminho)
+        concluido = False
+        try:
+            with gzip.open(temporario, "wt", encoding="utf-8") as arquivo:
+                for doc in docs:
+                    item = {"page_content": doc.page_content, "metadata": doc.metadata}
+                    arquivo.write(json.dumps(item, ensure_ascii=False) + "\n")
+                    yield doc
+            os.replace(temporario, caminho)
+            concluido = True
+        finally:
+            if not concluido and os.path.exists(temporario):
+                os.remove(temporario)
+        self._remover_excedentes()
+
+    def salvar_documentos(self, chave: str, modo: str, docs: Iterable[Document]):
+        """
+        Grava no cache os documentos extraídos de um arquivo.
+
+        chave: SHA-256 do conteúdo do arquivo.
+        modo: forma de extração usada.
+        docs: documentos a serem gravados.
+
+        return: None
+        """
+        for _ in self.gravar_documentos(chave, modo, docs):
+            pass
+
+    def obter_dataframe(self, chave: str):
+        """
+        Busca no cache o DataFrame lido de um arquivo CSV.
+
+        chave: SHA-256 do conteúdo do arquivo.
+
+        return: pandas.DataFrame, ou None se não estiver em cache.
+        """
+        import pandas as pd
+
+        caminho = self._caminho(chave, "csv.parquet")
+        try:
+            df = pd.read_parquet(caminho)
+        except Exception as e:
+            self._falha(caminho, e)
+            return None
+        self._acerto(caminho)
+        return df
+
+    def salvar_dataframe(self, chave: str, df):
+        """
+        Grava no cache o DataFrame lido de um arquivo CSV, em formato Parquet. O arquivo é escrito em um
+        temporário e só então publicado, para que leituras concorrentes nunca vejam um Parquet incompleto.
+        DataFrames que o Parquet não consegue representar (ex.: colunas com tipos mistos) não são gravados.
+
+        chave: SHA-256 do conteúdo do arquivo.
+        df: pandas.DataFrame a ser gravado.
+
+        return: None
+        """
+        caminho = self._caminho(chave, "csv.parquet")
+        temporario = self._temporario(caminho)
+        try:
+            df.to_parquet(temporario, index=False)
+            os.replace(temporario, caminho)
+        except Exception as e:
+            print(f"DataFrame não gravado no cache de documentos: {e}")
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            return
+        self._remover_excedentes()
+
+    def _arquivos(self) -> List[os.DirEntry]:
+        return [
+            entrada
+            for entrada in os.scandir(self.pasta)
+            if entrada.is_file() and not entrada.name.endswith(".tmp")
+        ]
+
+    def _remover_excedentes(self):
+        """
+        Remove os arquivos acessados há mais tempo até o cache voltar a caber em `max_bytes`.
+
+        return: None
+        """
+        with self._lock:
+            arquivos = sorted(self._arquivos(), key=lambda e: e.stat().st_mtime)
+            total = sum(entrada.stat().st_size for entrada in arquivos)
+            for entrada in arquivos:
+                if total <= self.max_bytes:
+                    break
+                total -= entrada.stat().st_size
+                try:
+                    os.remove(entrada.path)
+                except FileNotFoundError:
+                    continue
+                print(f"Cache de documentos: '{entrada.name}' removido (LRU).")
+
+    def estatisticas(self) -> dict:
+        """
+        Retorna as métricas de uso do cache.
+
+        return: dict com hits, misses, taxa de acerto, quantidade de arquivos e tamanho em bytes.
+        """
+        with self._lock:
+            arquivos = self._arquivos()
+            consultas = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "taxa_acerto": self.hits / consultas if consultas else 0.0,
+                "itens": len(arquivos),
+                "bytes": sum(entrada.stat().st_size for entrada in arquivos),
+                "max_bytes": self.max_bytes,
+            }
+
+
+_cache_padrao = None
+_cache_lock = threading.Lock()
+
+
+def obter_cache_documentos() -> DocumentCache:
+    """
+    Retorna o cache de documentos compartilhado pelo processo, criando-o na primeira chamada.
+
+    return: DocumentCache
+    """
+    global _cache_padrao
+    with _cache_lock:
+        if _cache_padrao is None:
+            _cache_padrao = DocumentCache()
+        return _cache_padrao
@@ -1,7 +1,24 @@
-from langchain_community.vectorstores import Chroma
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from LLM.local_llm import EmbeddingLLM
-import os
+from agents_ia.embedding_cache import CachedEmbeddings, obter_cache_embeddings
+from agents_ia.embedding_batcher import EMBEDDING_LOTE, obter_batcher_embeddings
+from agents_ia.answer_cache import obter_cache_respostas
+from agents_ia.tracing import anotar, span
+from agents_ia.flat_index import VECTORSTORE_BACKEND, FlatVectorStore
+from agents_ia.bm25 import (
+    RAG_MODO_BUSCA,
+    BM25Retriever,
+    HybridRetriever,
+    IndiceBM25,
+)
+from agents_ia.partition import RAG_ROTEAMENTO, CentroidesArquivos, RoteadorArquivos
+from agents_ia.storage import obter_armazenamento, pasta_sessao
+from agents_ia.ingestion import (
+    INGESTAO_MAX_CONCORRENCIA,
+    INGESTAO_TAMANHO_LOTE,
+    PipelineIngestao,
+    identificar_chunks,
+)
 
 
 class EmbeddingProcessor:
@@ -11,56 +28,201 @@ class EmbeddingProcessor:
         session_id: str,
         chunk_size: int = 1400,
         chunk_overlap: int = 200,
+        tamanho_lote: int = INGESTAO_TAMANHO_LOTE,
+        max_concorrencia: int = INGESTAO_MAX_CONCORRENCIA,
+        modo_busca: str = RAG_MODO_BUSCA,
+        backend: str = None,
     ):
         """
         Inicializa o processador de embeddings para uma sessão específica.
 
-        data: lista de documentos (Document) a serem processados.
+        data: lista ou iterador de documentos (Document) a serem processados.
         session_id: identificador único da sessão, usado para nomear diretórios e coleções.
         chunk_size: tamanho de cada chunk (em caracteres) após a divisão dos documentos.
         chunk_overlap: número de caracteres sobrepostos entre chunks consecutivos.
+        tamanho_lote: quantidade de chunks vetorizados por requisição ao modelo de embedding.
+        max_concorrencia: quantidade máxima de requisições de embedding simultâneas.
+        modo_busca: "hibrida" (BM25 + vetorial por RRF), "vetorial" ou "lexica" (BM25, sem embedding na consulta).
+        backend: vetorstore da sessão, "chroma" ou "flat" (FlatVectorStore: matriz float32 mapeada em memória);
+            None usa o registrado no manifesto para a coleção existente, ou VECTORSTORE_BACKEND.
 
         return: None
         """
         self.data = data
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.tamanho_lote = tamanho_lote
+        self.max_concorrencia = max_concorrencia
+        self.modo_busca = modo_busca
         self.session_id = str(session_id)
-        self.embeddings = EmbeddingLLM().embedding_llm
-        self.persist_path = f"./chroma_storage/session_{self.session_id}"
+        if backend is None:
+            registro = obter_armazenamento().sessao(self.session_id)
+            backend = registro["backend"] if registro else VECTORSTORE_BACKEND
+        self.backend = backend
+        embedding_llm = EmbeddingLLM()
+        embeddings = embedding_llm.embedding_llm
+        if EMBEDDING_LOTE:
+            # Chamadas simultâneas de todas as sessões são agrupadas em uma única requisição ao Ollama
+            embeddings = obter_batcher_embeddings(embeddings, embedding_llm.model_name)
+        # Vetores já calculados para o mesmo modelo e texto são reaproveitados do cache em disco
+        self.embeddings = CachedEmbeddings(embeddings, modelo=embedding_llm.model_name)
+        self.persist_path = pasta_sessao(self.session_id)
         self.collection_name = f"session_{self.session_id}"
+        # Índice lexical BM25 gravado junto da coleção do Chroma
+        self.bm25_path = f"{self.persist_path}/bm25.json.gz"
+        # Centroide dos embeddings de cada arquivo, usado para rotear as consultas
+        self.centroides_path = f"{self.persist_path}/centroides.json"
 
-    def create_retriever(self):
+    def _abrir_vectorstore(self):
+        """
+        Abre o vetorstore persistido da sessão (Chroma ou FlatVectorStore, conforme `backend`),
+        criando-o se ainda não existir.
+
+        return:
+            - Chroma ou FlatVectorStore: vetorstore da sessão.
+        """
+        if self.backend == "flat":
+            return FlatVectorStore(
+                embedding_function=self.embeddings,
+                persist_directory=self.persist_path,
+            )
+        # O Chroma só é importado quando a primeira coleção é aberta
+        from langchain_community.vectorstores import Chroma
+
+        return Chroma(
+            embedding_function=self.embeddings,
+            persist_directory=self.persist_path,
+            collection_name=self.collection_name,
+        )
+
+    def obter_retriever(
+        self,
+        vectorstore=None,
+        indice: IndiceBM25 = None,
+        centroides: CentroidesArquivos = None,
+    ):
+        """
+        Retorna um retriever sobre a coleção da sessão, sem indexar novos documentos.
+        Como os lotes são gravados conforme ficam prontos, os chunks já indexados podem
+        ser consultados enquanto uma ingestão ainda está em andamento.
+        O tipo de retriever depende de `modo_busca`: vetorial (Chroma), lexical (BM25) ou híbrido (RRF dos dois).
+        Com mais de um arquivo na sessão, a busca é roteada por arquivo (RoteadorArquivos).
+
+        vectorstore: vetorstore já aberto (opcional).
+        indice: índice BM25 já carregado (opcional).
+        centroides: centroides por arquivo já carregados (opcional).
+
+        return:
+            - retriever (BaseRetriever): objeto de busca de documentos relevantes.
+        """
+        # A coleção identifica o conjunto de documentos no cache semântico de respostas
+        metadata = {"colecao": self.collection_name}
+        if self.modo_busca != "vetorial":
+            indice = indice or IndiceBM25.carregar(self.bm25_path)
+            lexical = BM25Retriever(indice=indice, k=4, metadata=metadata)
+            if self.modo_busca == "lexica":
+                return self._rotear(lexical, None, centroides)
+
+        vectorstore = vectorstore or self._abrir_vectorstore()
+        if self.modo_busca == "vetorial":
+            retriever = vectorstore.as_retriever(
+                search_kwargs={"k": 4}, metadata=metadata
+            )
+        else:
+            vetorial = vectorstore.as_retriever(search_kwargs={"k": 10})
+            retriever = HybridRetriever(
+                vetorial=vetorial,
+                lexical=lexical,
+                vectorstore=vectorstore,
+                k=4,
+                k_candidatos=10,
+                metadata=metadata,
+            )
+        return self._rotear(retriever, vectorstore, centroides)
+
+    def _rotear(self, retriever, vectorstore, centroides: CentroidesArquivos = None):
+        # Com um único arquivo o filtro não restringe nada; o retriever é usado diretamente
+        if not RAG_ROTEAMENTO:
+            return retriever
+        centroides = centroides or CentroidesArquivos.carregar(self.centroides_path)
+        if len(centroides.arquivos) < 2:
+            return retriever
+        return RoteadorArquivos(
+            retriever=retriever,
+            centroides=centroides,
+            # No modo lexical a consulta não é vetorizada; o roteamento é só pelo nome
+            embeddings=self.embeddings if vectorstore is not None else None,
+            vectorstore=vectorstore,
+            metadata=retriever.metadata,
+        )
+
+    @staticmethod
+    def _dividir(docs, splitter):
+        # Divide cada documento assim que ele chega, medindo apenas o tempo da divisão
+        for doc in docs:
+            with span("embedding.split", documentos=1):
+                splits = splitter.split_documents([doc])
+            yield from splits
+
+    def create_retriever(
+        self, on_progress=None, dividir: bool = True, prefixo_ids: str = None
+    ):
         """
         Cria um retriever baseado em embeddings usando Chroma como vetorstore.
-        Os documentos são divididos em chunks antes da indexação.
+        Os documentos são divididos em chunks e vetorizados em lotes concorrentes antes da indexação.
         Se já existir uma base persistida, ela é carregada e atualizada com os novos documentos.
+        `data` pode ser uma lista ou um iterador de documentos (ex.: páginas de um PDF lidas sob demanda);
+        no segundo caso cada documento é dividido e vetorizado assim que chega.
+
+        on_progress: função opcional chamada com um ProgressoIngestao a cada lote gravado.
+        dividir: False quando `data` já contém chunks divididos (ex.: ingestão em lote, dividida nos workers).
+        prefixo_ids: SHA-256 do arquivo quando `data` vem de um único arquivo; os chunks recebem ids
+            determinísticos e uma nova tentativa após uma falha não os duplica na coleção.
 
         return:
-            - retriever (VectorStoreRetriever): objeto capaz de recuperar documentos relevantes com base em similaridade vetorial.
+            - retriever (BaseRetriever): objeto capaz de recuperar documentos relevantes (vetorial, lexical ou híbrido).
         """
         docs = self.data
         splitter = RecursiveCharacterTextSplitter(
             chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap
         )
-        splits = splitter.split_documents(docs)
-        print(f"Total de splits: {len(splits)}")
+        if not dividir:
+            splits = docs
+        elif isinstance(docs, list):
+            with span("embedding.split", documentos=len(docs)):
+                splits = splitter.split_documents(docs)
+            print(f"Total de splits: {len(splits)}")
+        else:
+            splits = self._dividir(docs, splitter)
+        if prefixo_ids:
+            ids = identificar_chunks(splits, prefixo_ids)
+            splits = list(ids) if isinstance(splits, list) else ids
 
-        if os.path.exists(self.persist_path):
-            # Carrega vetorstore existente e adiciona os novos documentos
-            vectorstore = Chroma(
-                embedding_function=self.embeddings,
-                persist_directory=self.persist_path,
-                collection_name=self.collection_name,
-            )
-            vectorstore.add_documents(splits)
+        # Os chunks também alimentam o índice BM25 da sessão conforme passam pela ingestão
+        indice = IndiceBM25.carregar(self.bm25_path)
+        if isinstance(splits, list):
+            indice.adicionar(splits)
         else:
-            # Cria novo vetorstore a partir dos documentos
-            vectorstore = Chroma.from_documents(
-                documents=splits,
-                embedding=self.embeddings,
-                collection_name=self.collection_name,
-                persist_directory=self.persist_path,
-            )
+            splits = indice.indexar_conforme_passam(splits)
+
+        # Carrega o vetorstore persistido (ou cria um novo) e adiciona os documentos em lotes
+        vectorstore = self._abrir_vectorstore()
+        centroides = CentroidesArquivos.carregar(self.centroides_path)
+        pipeline = PipelineIngestao(
+            self.embeddings,
+            vectorstore,
+            tamanho_lote=self.tamanho_lote,
+            max_concorrencia=self.max_concorrencia,
+            on_progress=on_progress,
+            ao_gravar=centroides.adicionar,
+        )
+        progresso = pipeline.executar(splits)
+        with span("embedding.bm25_salvar"):
+            indice.salvar(self.bm25_path)
+        centroides.salvar(self.centroides_path)
+        anotar(chunks=progresso.concluidos)
+        # Respostas em cache foram geradas sem os documentos recém-indexados
+        obter_cache_respostas().invalidar(self.collection_name)
 
-        return vectorstore.as_retriever(search_kwargs={"k": 4})
+        print(f"Cache de embeddings: {obter_cache_embeddings().estatisticas()}")
+        return self.obter_retriever(vectorstore, indice, centroides)
@@ -0,0 +1,220 @@
+from langchain_core.embeddings import Embeddings
+from agents_ia.tracing import span
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List
+import os
+import threading
+import time
+
+# Agrupa as chamadas de embedding simultâneas de todas as sessões em uma única requisição ao Ollama
+EMBEDDING_LOTE = os.getenv("EMBEDDING_LOTE", "1") == "1"
+# Quantidade máxima de textos por requisição; chamadas com mais textos (ex.: ingestão) vão direto ao modelo
+EMBEDDING_LOTE_MAX_TEXTOS = int(os.getenv("EMBEDDING_LOTE_MAX_TEXTOS", "32"))
+# Tempo máximo que a primeira chamada de um lote espera por outras antes do envio
+EMBEDDING_LOTE_ESPERA_MS = float(os.getenv("EMBEDDING_LOTE_ESPERA_MS", "5"))
+# Lotes enviados ao mesmo tempo; com todos ocupados, as chamadas novas se acumulam no próximo lote
+EMBEDDING_LOTE_CONCORRENCIA = int(os.getenv("EMBEDDING_LOTE_CONCORRENCIA", "4"))
+
+
+class _Pedido:
+    __slots__ = ("textos", "futuro", "chegada", "espera", "tamanho_lote")
+
+    def __init__(self, textos: List[str]):
+        self.textos = textos
+        self.futuro = Future()
+        self.chegada = time.perf_counter()
+        self.espera = 0.0
+        self.tamanho_lote = 0
+
+
+class EmbeddingBatcher(Embeddings):
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_textos: int = EMBEDDING_LOTE_MAX_TEXTOS,
+        espera_ms: float = EMBEDDING_LOTE_ESPERA_MS,
+        concorrencia: int = EMBEDDING_LOTE_CONCORRENCIA,
+    ):
+        """
+        Agrupa as chamadas de `embed_query`/`embed_documents` que chegam de várias threads (sessões) dentro de
+        uma pequena janela de tempo em uma única chamada `embed_documents` ao modelo e devolve a cada chamada
+        os seus vetores. A janela começa na chegada da primeira chamada pendente e termina após `espera_ms`
+        ou quando o lote atinge `max_textos`. Enquanto todos os `concorrencia` lotes estão em andamento, as
+        chamadas novas continuam se acumulando, então os lotes crescem com a carga.
+        As consultas são enviadas como documentos: o modelo envolvido deve vetorizá-las da mesma forma
+        (é o caso do OllamaEmbeddings, cujo `embed_query` chama `embed_documents`).
+
+        embeddings: modelo de embeddings original (ex.: OllamaEmbeddings).
+        max_textos: quantidade máxima de textos por lote.
+        espera_ms: tempo máximo de espera por outras chamadas, em milissegundos.
+        concorrencia: quantidade máxima de lotes enviados ao mesmo tempo.
+
+        return: None
+        """
+        self.embeddings = embeddings
+        self.max_textos = max(1, max_textos)
+        self.espera = max(0.0, espera_ms) / 1000
+        self.concorrencia = max(1, concorrencia)
+        self.lotes = 0
+        self.pedidos = 0
+        self.textos = 0
+        self.diretas = 0
+        self._esperas = deque(maxlen=1000)
+        self._pendentes: deque = deque()
+        self._textos_pendentes = 0
+        self._condicao = threading.Condition()
+        self._vagas = threading.Semaphore(self.concorrencia)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.concorrencia, thread_name_prefix="embedding-lote"
+        )
+        self._despachante = None
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        if len(texts) >= self.max_textos:
+            # Já forma um lote completo: esperar por outras chamadas só atrasaria a requisição
+            with self._condicao:
+                self.diretas += 1
+            return self.embeddings.embed_documents(texts)
+        pedido = _Pedido(list(texts))
+        with span("embedding.lote", textos=len(texts)) as etapa:
+            with self._condicao:
+                self._iniciar_despachante()
+                self._pendentes.append(pedido)
+                self._textos_pendentes += len(pedido.textos)
+                self._condicao.notify()
+            vetores = pedido.futuro.result()
+            etapa.definir(
+                espera_ms=pedido.espera * 1000, tamanho_lote=pedido.tamanho_lote
+            )
+        return vetores
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def _iniciar_despachante(self):
+        if self._despachante is None:
+            self._despachante = threading.Thread(
+                target=self._despachar, name="embedding-despachante", daemon=True
+            )
+            self._despachante.start()
+
+    def _despachar(self):
+        while True:
+            # Só forma o próximo lote quando há uma requisição livre para enviá-lo
+            self._vagas.acquire()
+            with self._condicao:
+                while not self._pendentes:
+                    self._condicao.wait()
+                limite = self._pendentes[0].chegada + self.espera
+                while self._textos_pendentes < self.max_textos:
+                    restante = limite - time.perf_counter()
+                    if restante <= 0:
+                        break
+                    self._condicao.wait(restante)
+                lote = [self._pendentes.popleft()]
+                tamanho = len(lote[0].textos)
+                while (
+                    self._pendentes
+                    and tamanho + len(self._pendentes[0].textos) <= self.max_textos
+                ):
+                    pedido = self._pendentes.popleft()
+                    lote.append(pedido)
+                    tamanho += len(pedido.textos)
+                self._textos_pendentes -= tamanho
+            self._executor.submit(self._processar, lote, tamanho)
+
+    def _processar(self, lote: List[_Pedido], tamanho: int):
+        try:
+            envio = time.perf_counter()
+            # A mesma pergunta feita por sessões diferentes é vetorizada uma única vez
+            unicos = list(
+                dict.fromkeys(texto for pedido in lote for texto in pedido.textos)
+            )
+            try:
+                resposta = self.embeddings.embed_documents(unicos)
+                if len(resposta) != len(unicos):
+                    raise ValueError(
+                        f"O modelo retornou {len(resposta)} vetores para {len(unicos)} textos."
+                    )
+                vetores = dict(zip(unicos, resposta))
+                with self._condicao:
+                    self.lotes += 1
+                    self.pedidos += len(lote)
+                    self.textos += tamanho
+                    self._esperas.extend(envio - pedido.chegada for pedido in lote)
+                for pedido in lote:
+                    pedido.espera = envio - pedido.chegada
+                    pedido.tamanho_lote = tamanho
+                    pedido.futuro.set_result(
+                        [vetores[texto] for texto in pedido.textos]
+                    )
+            except Exception as e:
+                # Nenhuma chamada do lote pode ficar esperando por um resultado que não virá
+                for pedido in lote:
+                    if not pedido.futuro.done():
+                        pedido.futuro.set_exception(e)
+        finally:
+            self._vagas.release()
+
+    def estatisticas(self) -> dict:
+        """
+        Retorna as métricas do agrupamento: lotes enviados, preenchimento médio dos lotes e tempo que as
+        chamadas esperaram na fila (média e p95 das últimas 1000).
+
+        return: dict com as métricas.
+        """
+        with self._condicao:
+            esperas = sorted(self._esperas)
+            return {
+                "lotes": self.lotes,
+                "pedidos": self.pedidos,
+                "textos": self.textos,
+                "diretas": self.diretas,
+                "pendentes": len(self._pendentes),
+                "textos_por_lote": self.textos / self.lotes if self.lotes else 0.0,
+                "preenchimento_medio": (
+                    self.textos / (self.lotes * self.max_textos) if self.lotes else 0.0
+                ),
+                "espera_media_ms": (
+                    sum(esperas) / len(esperas) * 1000 if esperas else 0.0
+                ),
+                "espera_p95_ms": (
+                    esperas[int(0.95 * (len(esperas) - 1))] * 1000 if esperas else 0.0
+                ),
+            }
+
+
+# Um agrupador por modelo, compartilhado por todas as sessões do processo
+_batchers: Dict[str, EmbeddingBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def obter_batcher_embeddings(embeddings: Embeddings, modelo: str) -> EmbeddingBatcher:
+    """
+    Retorna o agrupador compartilhado do modelo informado, criando-o na primeira chamada.
+
+    embeddings: modelo de embeddings original, usado apenas na criação.
+    modelo: nome do modelo.
+
+    return: EmbeddingBatcher
+    """
+    with _batchers_lock:
+        batcher = _batchers.get(modelo)
+        if batcher is None:
+            batcher = EmbeddingBatcher(embeddings)
+            _batchers[modelo] = batcher
+        return batcher
+
+
+def estatisticas_batchers() -> dict:
+    """
+    Retorna as métricas de agrupamento de cada modelo.
+
+    return: dict {modelo: métricas}.
+    """
+    with _batchers_lock:
+        batchers = dict(_batchers)
+    return {modelo: batcher.estatisticas() for modelo, batcher in batchers.items()}
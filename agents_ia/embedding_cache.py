@@ -0,0 +1,300 @@
+from langchain_core.embeddings import Embeddings
+from array import array
+from collections import OrderedDict
+from typing import List, Optional
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH", "./cache_storage/embeddings.sqlite3"
+)
+EMBEDDING_CACHE_MAX_ITENS = int(os.getenv("EMBEDDING_CACHE_MAX_ITENS", "200000"))
+# Vetores de perguntas mantidos só em memória, separados dos vetores dos documentos
+EMBEDDING_CACHE_MAX_CONSULTAS = int(os.getenv("EMBEDDING_CACHE_MAX_CONSULTAS", "1024"))
+
+
+class EmbeddingCache:
+    def __init__(
+        self,
+        caminho: str = EMBEDDING_CACHE_PATH,
+        max_itens: int = EMBEDDING_CACHE_MAX_ITENS,
+        max_consultas: int = EMBEDDING_CACHE_MAX_CONSULTAS,
+    ):
+        """
+        Inicializa um cache persistente em disco (SQLite) de vetores de embedding.
+        Cada vetor é endereçado pelo par (nome do modelo, hash SHA-256 do texto do chunk).
+        Os vetores de perguntas (`embed_query`) ficam em um LRU pequeno em memória: são quase sempre
+        únicos e não devem ocupar o espaço nem remover os vetores dos documentos.
+
+        caminho: caminho do arquivo SQLite onde os vetores são armazenados.
+        max_itens: quantidade máxima de vetores mantidos; acima disso os menos acessados recentemente são removidos (LRU).
+        max_consultas: quantidade máxima de vetores de perguntas mantidos em memória (LRU).
+
+        return: None
+        """
+        self.caminho = caminho
+        self.max_itens = max_itens
+        self.max_consultas = max_consultas
+        self.hits = 0
+        self.misses = 0
+        self.hits_consultas = 0
+        self.misses_consultas = 0
+        self._consultas: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                modelo TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                vetor BLOB NOT NULL,
+                ultimo_acesso REAL NOT NULL,
+                PRIMARY KEY (modelo, hash)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_acesso ON embeddings (ultimo_acesso)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def hash_texto(texto: str) -> str:
+        """
+        Calcula o hash SHA-256 do texto de um chunk.
+
+        texto: conteúdo do chunk.
+
+        return: string hexadecimal com o hash.
+        """
+        return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+    def obter(self, modelo: str, textos: List[str]) -> List[Optional[List[float]]]:
+        """
+        Busca os vetores dos textos informados no cache.
+
+        modelo: nome do modelo de embedding.
+        textos: lista de textos a serem consultados.
+
+        return: lista alinhada com `textos`, contendo o vetor ou None quando não estiver em cache.
+        """
+        hashes = [self.hash_texto(texto) for texto in textos]
+        encontrados = {}
+        with self._lock:
+            # Consulta em blocos para respeitar o limite de parâmetros do SQLite
+            for inicio in range(0, len(hashes), 500):
+                bloco = list(set(hashes[inicio : inicio + 500]))
+                marcadores = ",".join("?" * len(bloco))
+                linhas = self._conn.execute(
+                    f"SELECT hash, vetor FROM embeddings WHERE modelo = ? AND hash IN ({marcadores})",
+                    [modelo, *bloco],
+                ).fetchall()
+                for hash_, vetor in linhas:
+                    encontrados[hash_] = array("f", vetor).tolist()
+
+            if encontrados:
+                agora = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET ultimo_acesso = ? WHERE modelo = ? AND hash = ?",
+                    [(agora, modelo, hash_) for hash_ in encontrados],
+                )
+                self._conn.commit()
+
+            resultado = [encontrados.get(hash_) for hash_ in hashes]
+            acertos = sum(1 for vetor in resultado if vetor is not None)
+            self.hits += acertos
+            self.misses += len(resultado) - acertos
+        return resultado
+
+    def salvar(self, modelo: str, textos: List[str], vetores: List[List[float]]):
+        """
+        Armazena os vetores calculados no cache e aplica a política de remoção por tamanho.
+
+        modelo: nome do modelo de embedding.
+        textos: lista de textos cujos vetores foram calculados.
+        vetores: lista de vetores alinhada com `textos`.
+
+        return: None
+        """
+        agora = time.time()
+        linhas = [
+            (modelo, self.hash_texto(texto), array("f", vetor).tobytes(), agora)
+            for texto, vetor in zip(textos, vetores)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (modelo, hash, vetor, ultimo_acesso) VALUES (?, ?, ?, ?)",
+                linhas,
+            )
+            self._remover_excedentes()
+            self._conn.commit()
+
+    def obter_consulta(self, modelo: str, texto: str) -> Optional[List[float]]:
+        """
+        Busca o vetor de uma pergunta no LRU em memória.
+
+        modelo: nome do modelo de embedding.
+        texto: texto da pergunta.
+
+        return: vetor, ou None quando não estiver em cache.
+        """
+        with self._lock:
+            vetor = self._consultas.get((modelo, texto))
+            if vetor is None:
+                self.misses_consultas += 1
+                return None
+            self._consultas.move_to_end((modelo, texto))
+            self.hits_consultas += 1
+            return vetor
+
+    def salvar_consulta(self, modelo: str, texto: str, vetor: List[float]):
+        """
+        Guarda o vetor de uma pergunta no LRU em memória.
+
+        modelo: nome do modelo de embedding.
+        texto: texto da pergunta.
+        vetor: vetor calculado.
+
+        return: None
+        """
+        with self._lock:
+            self._consultas[(modelo, texto)] = vetor
+            self._consultas.move_to_end((modelo, texto))
+            while len(self._consultas) > self.max_consultas:
+                self._consultas.popitem(last=False)
+
+    def _remover_excedentes(self):
+        """
+        Remove os vetores acessados há mais tempo quando o cache ultrapassa `max_itens`.
+
+        return: None
+        """
+        total = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excedente = total - self.max_itens
+        if excedente > 0:
+            self._conn.execute(
+                """
+                DELETE FROM embeddings WHERE rowid IN (
+                    SELECT rowid FROM embeddings ORDER BY ultimo_acesso ASC LIMIT ?
+                )
+                """,
+                (excedente,),
+            )
+            print(f"Cache de embeddings: {excedente} vetores removidos (LRU).")
+
+    def estatisticas(self) -> dict:
+        """
+        Retorna as métricas de uso do cache.
+
+        return: dict com hits, misses, taxa de acerto, quantidade de itens e tamanho em bytes.
+        """
+        with self._lock:
+            itens, tamanho = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(vetor)), 0) FROM embeddings"
+            ).fetchone()
+            consultas = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "taxa_acerto": self.hits / consultas if consultas else 0.0,
+                "itens": itens,
+                "max_itens": self.max_itens,
+                "bytes": tamanho,
+                "consultas": len(self._consultas),
+                "hits_consultas": self.hits_consultas,
+                "misses_consultas": self.misses_consultas,
+            }
+
+    def limpar(self):
+        """
+        Remove todos os vetores do cache e zera as métricas.
+
+        return: None
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._consultas.clear()
+            self.hits = 0
+            self.misses = 0
+            self.hits_consultas = 0
+            self.misses_consultas = 0
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(
+        self, embeddings: Embeddings, modelo: str, cache: EmbeddingCache = None
+    ):
+        """
+        Envolve um modelo de embeddings consultando o cache persistente antes de chamar o modelo.
+        Apenas os textos ausentes no cache são enviados ao modelo, em uma única chamada.
+
+        embeddings: modelo de embeddings original (ex.: OllamaEmbeddings).
+        modelo: nome do modelo, usado como parte da chave do cache.
+        cache: instância de EmbeddingCache; se omitido, usa o cache padrão do processo.
+
+        return: None
+        """
+        self.embeddings = embeddings
+        self.modelo = modelo
+        self.cache = cache or obter_cache_embeddings()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vetores = self.cache.obter(self.modelo, texts)
+
+        # Remove textos repetidos antes de chamar o modelo
+        faltantes = list(
+            dict.fromkeys(
+                texto for texto, vetor in zip(texts, vetores) if vetor is None
+            )
+        )
+        if faltantes:
+            calculados = dict(
+                zip(faltantes, self.embeddings.embed_documents(faltantes))
+            )
+            self.cache.salvar(self.modelo, faltantes, list(calculados.values()))
+            vetores = [
+                vetor if vetor is not None else calculados[texto]
+                for texto, vetor in zip(texts, vetores)
+            ]
+        return vetores
+
+    def embed_query(self, text: str) -> List[float]:
+        # Perguntas ficam no LRU em memória, separadas dos documentos (alguns modelos as vetorizam de outra forma)
+        vetor = self.cache.obter_consulta(self.modelo, text)
+        if vetor is None:
+            vetor = self.embeddings.embed_query(text)
+            self.cache.salvar_consulta(self.modelo, text, vetor)
+        return vetor
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vetor = self.cache.obter_consulta(self.modelo, text)
+        if vetor is None:
+            vetor = await self.embeddings.aembed_query(text)
+            self.cache.salvar_consulta(self.modelo, text, vetor)
+        return vetor
+
+
+_cache_padrao = None
+_cache_lock = threading.Lock()
+
+
+def obter_cache_embeddings() -> EmbeddingCache:
+    """
+    Retorna o cache de embeddings compartilhado pelo processo, criando-o na primeira chamada.
+
+    return: EmbeddingCache
+    """
+    global _cache_padrao
+    with _cache_lock:
+        if _cache_padrao is None:
+            _cache_padrao = EmbeddingCache()
+        return _cache_padrao
@@ -0,0 +1,450 @@
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Tuple, Union
+import json
+import os
+import threading
+import uuid
+
+import numpy as np
+
+# Backend do vetorstore das sessões: "chroma" ou "flat" (FlatVectorStore, em processo)
+VECTORSTORE_BACKEND = os.getenv("VECTORSTORE_BACKEND", "chroma")
+
+Filtro = Union[dict, Callable[[dict], bool], None]
+
+
+def corresponde_filtro(metadata: dict, filtro: Filtro) -> bool:
+    """
+    Verifica se os metadados atendem ao filtro.
+    O filtro pode ser uma função ou um dict no formato do Chroma: igualdade simples
+    ({"Arquivo": "a.pdf"}), operadores ({"page": {"$gte": 3}}) e "$and"/"$or" com listas de filtros.
+
+    metadata: metadados do documento.
+    filtro: filtro a ser aplicado.
+
+    return: bool
+    """
+    if filtro is None:
+        return True
+    if callable(filtro):
+        return filtro(metadata)
+    for chave, condicao in filtro.items():
+        if chave == "$and":
+            if not all(corresponde_filtro(metadata, item) for item in condicao):
+                return False
+            continue
+        if chave == "$or":
+            if not any(corresponde_filtro(metadata, item) for item in condicao):
+                return False
+            continue
+        valor = metadata.get(chave)
+        if not isinstance(condicao, dict):
+            condicao = {"$eq": condicao}
+        for operador, esperado in condicao.items():
+            if operador == "$eq" and not valor == esperado:
+                return False
+            if operador == "$ne" and not valor != esperado:
+                return False
+            if operador == "$in" and valor not in esperado:
+                return False
+            if operador == "$nin" and valor in esperado:
+                return False
+            if operador in ("$gt", "$gte", "$lt", "$lte"):
+                if valor is None:
+                    return False
+                if operador == "$gt" and not valor > esperado:
+                    return False
+                if operador == "$gte" and not valor >= esperado:
+                    return False
+                if operador == "$lt" and not valor < esperado:
+                    return False
+                if operador == "$lte" and not valor <= esperado:
+                    return False
+    return True
+
+
+class FlatVectorStore(VectorStore):
+    def __init__(self, embedding_function: Embeddings, persist_directory: str):
+        """
+        Vetorstore em processo para coleções pequenas e médias (alguns milhares de chunks).
+        Os vetores ficam normalizados em uma única matriz float32 contígua gravada em `vetores.f32` e
+        lida via memória mapeada; textos e metadados ficam em `documentos.jsonl`. Uma busca é um único
+        produto matriz-vetor seguido de `argpartition`, sem índice aproximado nem processo auxiliar.
+        O `flat.json` registra a quantidade de linhas confirmadas e a geração dos arquivos: gravações
+        interrompidas são descartadas ao reabrir a coleção, sem desalinhar documentos e vetores.
+
+        embedding_function: modelo de embeddings usado para vetorizar textos e consultas.
+        persist_directory: diretório onde a matriz e os documentos são gravados.
+
+        return: None
+        """
+        self._embeddings = embedding_function
+        self.persist_directory = persist_directory
+        self._caminho_info = os.path.join(persist_directory, "flat.json")
+        self._lock = threading.RLock()
+        self._ids: List[str] = []
+        self._textos: List[str] = []
+        self._metadados: List[dict] = []
+        self._dimensao: Optional[int] = None
+        self._geracao = 0
+        self._matriz = None
+        os.makedirs(persist_directory, exist_ok=True)
+        self._carregar()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embeddings
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _arquivos(self, geracao: int) -> Tuple[str, str]:
+        # Caminhos da matriz e dos documentos de uma geração (a 0 mantém os nomes originais)
+        sufixo = f".{geracao}" if geracao else ""
+        return (
+            os.path.join(self.persist_directory, f"vetores{sufixo}.f32"),
+            os.path.join(self.persist_directory, f"documentos{sufixo}.jsonl"),
+        )
+
+    @property
+    def _caminho_vetores(self) -> str:
+        return self._arquivos(self._geracao)[0]
+
+    @property
+    def _caminho_documentos(self) -> str:
+        return self._arquivos(self._geracao)[1]
+
+    def _confirmar(self, geracao: int, linhas: int):
+        # Grava o flat.json de uma vez: só o que ele registra é considerado gravado
+        temporario = f"{self._caminho_info}.tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            json.dump(
+                {"dimensao": self._dimensao, "geracao": geracao, "linhas": linhas},
+                arquivo,
+            )
+        os.replace(temporario, self._caminho_info)
+
+    def _carregar(self):
+        linhas = None
+        if os.path.exists(self._caminho_info):
+            with open(self._caminho_info, encoding="utf-8") as arquivo:
+                info = json.load(arquivo)
+            self._dimensao = info["dimensao"]
+            self._geracao = info.get("geracao", 0)
+            linhas = info.get("linhas")
+        # Arquivos de outras gerações são restos de uma remoção interrompida
+        validos = set(self._arquivos(self._geracao))
+        for nome in os.listdir(self.persist_directory):
+            caminho = os.path.join(self.persist_directory, nome)
+            if (
+                nome.startswith(("vetores", "documentos"))
+                and nome.endswith((".f32", ".jsonl", ".tmp"))
+                and caminho not in validos
+            ):
+                os.remove(caminho)
+
+        integro = True
+        if os.path.exists(self._caminho_documentos):
+            with open(self._caminho_documentos, encoding="utf-8") as arquivo:
+                for linha in arquivo:
+                    try:
+                        item = json.loads(linha)
+                    except ValueError:
+                        # Linha cortada por uma gravação interrompida
+                        integro = False
+                        break
+                    self._ids.append(item["id"])
+                    self._textos.append(item["page_content"])
+                    self._metadados.append(item["metadata"])
+
+        # Só valem as linhas confirmadas no flat.json; coleções gravadas antes do registro de linhas
+        # usam as que estão completas nos dois arquivos
+        tamanho_linha = 4 * (self._dimensao or 0)
+        gravadas = (
+            os.path.getsize(self._caminho_vetores) // tamanho_linha
+            if tamanho_linha and os.path.exists(self._caminho_vetores)
+            else 0
+        )
+        linhas = min(gravadas, len(self._ids), gravadas if linhas is None else linhas)
+        # O excedente é descartado também do disco, senão as gravações seguintes ficariam desalinhadas
+        if not integro or len(self._ids) > linhas:
+            del self._ids[linhas:], self._textos[linhas:], self._metadados[linhas:]
+            self._gravar_documentos(self._caminho_documentos, range(linhas))
+        if os.path.exists(self._caminho_vetores):
+            if not tamanho_linha:
+                os.remove(self._caminho_vetores)
+            elif os.path.getsize(self._caminho_vetores) != linhas * tamanho_linha:
+                os.truncate(self._caminho_vetores, linhas * tamanho_linha)
+        self._mapear()
+
+    def _gravar_documentos(self, caminho: str, indices: Iterable[int]):
+        temporario = f"{caminho}.tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            for i in indices:
+                item = {
+                    "id": self._ids[i],
+                    "page_content": self._textos[i],
+                    "metadata": self._metadados[i],
+                }
+                arquivo.write(json.dumps(item, ensure_ascii=False) + "\n")
+        os.replace(temporario, caminho)
+
+    def _mapear(self):
+        linhas = len(self._ids)
+        self._matriz = (
+            np.memmap(
+                self._caminho_vetores,
+                dtype=np.float32,
+                mode="r",
+                shape=(linhas, self._dimensao),
+            )
+            if self._dimensao and linhas
+            else None
+        )
+
+    def adicionar_vetores(
+        self,
+        docs: Sequence[Document],
+        vetores: Sequence[Sequence[float]],
+        ids: Optional[List[str]] = None,
+    ) -> List[str]:
+        """
+        Grava documentos com vetores já calculados, anexando-os ao fim da matriz em disco.
+        Documentos com ids já existentes na coleção substituem os anteriores.
+
+        docs: documentos a serem gravados.
+        vetores: vetores alinhados com `docs`.
+        ids: identificadores opcionais dos documentos.
+
+        return: lista com os ids gravados.
+        """
+        if not docs:
+            return []
+        ids = ids or [str(uuid.uuid4()) for _ in docs]
+        matriz = np.asarray(vetores, dtype=np.float32)
+        normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+        matriz = matriz / np.where(normas > 0, normas, 1.0)
+
+        with self._lock:
+            if self._dimensao is None:
+                self._dimensao = int(matriz.shape[1])
+            elif matriz.shape[1] != self._dimensao:
+                raise ValueError(
+                    f"Dimensão {matriz.shape[1]} diferente da coleção ({self._dimensao})."
+                )
+            # Ids já gravados (ex.: nova tentativa de uma ingestão interrompida) são substituídos
+            repetidos = set(ids).intersection(self._ids)
+            if repetidos and self._matriz is not None:
+                self._manter(
+                    [i for i, id_ in enumerate(self._ids) if id_ not in repetidos]
+                )
+            # Os dois arquivos recebem as linhas novas e só então o flat.json as confirma
+            with open(self._caminho_documentos, "a", encoding="utf-8") as arquivo:
+                for id_, doc in zip(ids, docs):
+                    item = {
+                        "id": id_,
+                        "page_content": doc.page_content,
+                        "metadata": doc.metadata,
+                    }
+                    arquivo.write(json.dumps(item, ensure_ascii=False) + "\n")
+            with open(self._caminho_vetores, "ab") as arquivo:
+                arquivo.write(matriz.tobytes())
+            self._confirmar(self._geracao, len(self._ids) + len(docs))
+            self._ids.extend(ids)
+            self._textos.extend(doc.page_content for doc in docs)
+            self._metadados.extend(dict(doc.metadata) for doc in docs)
+            self._mapear()
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        docs = [
+            Document(page_content=texto, metadata=metadata or {})
+            for texto, metadata in zip(texts, metadatas)
+        ]
+        return self.adicionar_vetores(
+            docs, self._embeddings.embed_documents(texts), ids=ids
+        )
+
+    def remover(self, filtro: Filtro) -> int:
+        """
+        Remove os documentos cujos metadados correspondem ao filtro. A matriz e os documentos são
+        regravados sem as linhas removidas (a coleção fica compactada, sem espaço ocioso em disco).
+
+        filtro: filtro de metadados no formato do Chroma (ex.: {"Arquivo": "relatorio.pdf"}).
+
+        return: quantidade de documentos removidos.
+        """
+        with self._lock:
+            if self._matriz is None:
+                return 0
+            mantidos = [
+                i
+                for i, metadata in enumerate(self._metadados)
+                if not corresponde_filtro(metadata, filtro)
+            ]
+            removidos = len(self._ids) - len(mantidos)
+            if removidos:
+                self._manter(mantidos)
+        return removidos
+
+    def _manter(self, mantidos: List[int]):
+        # Chamado com o lock: regrava a coleção só com as linhas informadas. A nova geração é gravada ao
+        # lado da atual e passa a valer quando o flat.json é trocado; uma interrupção em qualquer ponto
+        # mantém uma das duas gerações inteira
+        anteriores = self._arquivos(self._geracao)
+        geracao = self._geracao + 1
+        caminho_vetores, caminho_documentos = self._arquivos(geracao)
+        matriz = np.asarray(self._matriz[mantidos], dtype=np.float32)
+        with open(caminho_vetores, "wb") as arquivo:
+            arquivo.write(matriz.tobytes())
+        self._gravar_documentos(caminho_documentos, mantidos)
+        self._confirmar(geracao, len(mantidos))
+        self._matriz = None
+        self._geracao = geracao
+        for caminho in anteriores:
+            if os.path.exists(caminho):
+                os.remove(caminho)
+        self._ids = [self._ids[i] for i in mantidos]
+        self._textos = [self._textos[i] for i in mantidos]
+        self._metadados = [self._metadados[i] for i in mantidos]
+        self._mapear()
+
+    def _candidatos(self, filtro: Filtro) -> Tuple[Optional[np.ndarray], np.ndarray]:
+        # Retorna a matriz (ou o subconjunto filtrado) e os índices correspondentes
+        with self._lock:
+            matriz = self._matriz
+            if matriz is None:
+                return None, np.empty(0, dtype=np.int64)
+            if filtro is None:
+                return matriz, np.arange(matriz.shape[0])
+            indices = np.fromiter(
+                (
+                    i
+                    for i, metadata in enumerate(self._metadados[: matriz.shape[0]])
+                    if corresponde_filtro(metadata, filtro)
+                ),
+                dtype=np.int64,
+            )
+            return matriz[indices], indices
+
+    def _top_k(
+        self, vetor: Sequence[float], k: int, filtro: Filtro
+    ) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        matriz, indices = self._candidatos(filtro)
+        if matriz is None or not len(indices):
+            return indices, np.empty(0, dtype=np.float32), None
+        consulta = np.asarray(vetor, dtype=np.float32)
+        norma = np.linalg.norm(consulta)
+        if norma > 0:
+            consulta = consulta / norma
+        similaridades = matriz @ consulta
+        k = min(k, len(similaridades))
+        melhores = np.argpartition(-similaridades, k - 1)[:k]
+        melhores = melhores[np.argsort(-similaridades[melhores])]
+        return indices[melhores], similaridades[melhores], matriz[melhores]
+
+    def _documento(self, indice: int) -> Document:
+        return Document(
+            id=self._ids[indice],
+            page_content=self._textos[indice],
+            metadata=dict(self._metadados[indice]),
+        )
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Filtro = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        indices, similaridades, _ = self._top_k(embedding, k, filter)
+        return [
+            (self._documento(int(i)), float(s)) for i, s in zip(indices, similaridades)
+        ]
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Filtro = None, **kwargs: Any
+    ) -> List[Document]:
+        return [
+            doc
+            for doc, _ in self.similarity_search_with_score_by_vector(
+                embedding, k=k, filter=filter
+            )
+        ]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Filtro = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(
+            self._embeddings.embed_query(query), k=k, filter=filter
+        )
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Filtro = None, **kwargs: Any
+    ) -> List[Document]:
+        return self.similarity_search_by_vector(
+            self._embeddings.embed_query(query), k=k, filter=filter
+        )
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # As pontuações já são similaridades de cosseno
+        return lambda similaridade: similaridade
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Filtro = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        indices, _, vetores = self._top_k(embedding, fetch_k, filter)
+        if vetores is None:
+            return []
+        selecionados = maximal_marginal_relevance(
+            np.asarray(embedding, dtype=np.float32),
+            np.asarray(vetores),
+            lambda_mult=lambda_mult,
+            k=k,
+        )
+        return [self._documento(int(indices[i])) for i in selecionados]
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Filtro = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self._embeddings.embed_query(query),
+            k=k,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            filter=filter,
+        )
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        persist_directory: str = None,
+        **kwargs: Any,
+    ) -> "FlatVectorStore":
+        if persist_directory is None:
+            raise ValueError("FlatVectorStore exige `persist_directory`.")
+        store = cls(embedding, persist_directory)
+        store.add_texts(texts, metadatas=metadatas, **kwargs)
+        return store
@@ -0,0 +1,254 @@
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import (
+    BaseMessage,
+    message_to_dict,
+    messages_from_dict,
+)
+from collections import OrderedDict
+from typing import Callable, List, Sequence, Tuple
+import json
+import os
+import sqlite3
+import threading
+import time
+
+HISTORICO_DB_PATH = os.getenv("HISTORICO_DB_PATH", "./chat_storage/historico.sqlite3")
+HISTORICO_MAX_SESSOES = int(os.getenv("HISTORICO_MAX_SESSOES", "256"))
+HISTORICO_TTL_SEGUNDOS = float(os.getenv("HISTORICO_TTL_SEGUNDOS", "3600"))
+
+
+class BancoHistorico:
+    def __init__(self, caminho: str = HISTORICO_DB_PATH):
+        """
+        Inicializa o banco SQLite (modo WAL) onde as mensagens de todas as sessões são anexadas.
+
+        caminho: caminho do arquivo SQLite.
+
+        return: None
+        """
+        self.caminho = caminho
+        self._lock = threading.Lock()
+
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS mensagens (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                mensagem TEXT NOT NULL,
+                criado_em REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_mensagens_sessao ON mensagens (session_id, id)"
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS resumos (
+                session_id TEXT PRIMARY KEY,
+                resumo TEXT NOT NULL,
+                compactadas INTEGER NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def anexar(self, session_id: str, mensagens: Sequence[BaseMessage]):
+        """
+        Anexa mensagens ao final do histórico de uma sessão, em uma única transação.
+
+        session_id: identificador da sessão.
+        mensagens: mensagens a serem gravadas.
+
+        return: None
+        """
+        agora = time.time()
+        linhas = [
+            (session_id, json.dumps(message_to_dict(mensagem)), agora)
+            for mensagem in mensagens
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO mensagens (session_id, mensagem, criado_em) VALUES (?, ?, ?)",
+                linhas,
+            )
+            self._conn.commit()
+
+    def carregar(self, session_id: str) -> List[BaseMessage]:
+        """
+        Lê todas as mensagens de uma sessão, na ordem em que foram gravadas.
+
+        session_id: identificador da sessão.
+
+        return: lista de BaseMessage.
+        """
+        with self._lock:
+            linhas = self._conn.execute(
+                "SELECT mensagem FROM mensagens WHERE session_id = ? ORDER BY id",
+                (session_id,),
+            ).fetchall()
+        return messages_from_dict([json.loads(linha[0]) for linha in linhas])
+
+    def apagar(self, session_id: str):
+        """
+        Remove as mensagens e o resumo de uma sessão.
+
+        session_id: identificador da sessão.
+
+        return: None
+        """
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM mensagens WHERE session_id = ?", (session_id,)
+            )
+            self._conn.execute(
+                "DELETE FROM resumos WHERE session_id = ?", (session_id,)
+            )
+            self._conn.commit()
+
+    def salvar_resumo(self, session_id: str, resumo: str, compactadas: int):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO resumos (session_id, resumo, compactadas) VALUES (?, ?, ?)",
+                (session_id, resumo, compactadas),
+            )
+            self._conn.commit()
+
+    def carregar_resumo(self, session_id: str) -> Tuple[str, int]:
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT resumo, compactadas FROM resumos WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+        return linha if linha else ("", 0)
+
+
+_banco_padrao = None
+_banco_lock = threading.Lock()
+
+
+def obter_banco_historico() -> BancoHistorico:
+    """
+    Retorna o banco de histórico compartilhado pelo processo, criando-o na primeira chamada.
+
+    return: BancoHistorico
+    """
+    global _banco_padrao
+    with _banco_lock:
+        if _banco_padrao is None:
+            _banco_padrao = BancoHistorico()
+        return _banco_padrao
+
+
+class SQLiteChatMessageHistory(BaseChatMessageHistory):
+    def __init__(self, session_id: str, banco: BancoHistorico = None):
+        """
+        Histórico de mensagens de uma sessão persistido em SQLite, somente por anexação.
+        As mensagens são lidas do disco uma única vez e mantidas em memória enquanto a sessão estiver ativa;
+        cada nova mensagem custa apenas um INSERT.
+
+        session_id: identificador da sessão.
+        banco: BancoHistorico a ser usado; se omitido, usa o banco padrão do processo.
+
+        return: None
+        """
+        self.session_id = session_id
+        self.banco = banco or obter_banco_historico()
+        self._mensagens = self.banco.carregar(session_id)
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return self._mensagens
+
+    def add_message(self, message: BaseMessage) -> None:
+        self.add_messages([message])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        messages = list(messages)
+        self.banco.anexar(self.session_id, messages)
+        self._mensagens.extend(messages)
+
+    def clear(self) -> None:
+        self.banco.apagar(self.session_id)
+        self._mensagens = []
+
+    def salvar_resumo(self, resumo: str, compactadas: int):
+        self.banco.salvar_resumo(self.session_id, resumo, compactadas)
+
+    def carregar_resumo(self) -> Tuple[str, int]:
+        return self.banco.carregar_resumo(self.session_id)
+
+
+class SessionStore:
+    def __init__(
+        self,
+        fabrica: Callable[[str], BaseChatMessageHistory],
+        max_sessoes: int = HISTORICO_MAX_SESSOES,
+        ttl_segundos: float = HISTORICO_TTL_SEGUNDOS,
+    ):
+        """
+        Mantém em memória apenas as sessões usadas recentemente (LRU), descartando também as ociosas há mais de `ttl_segundos`.
+        Sessões descartadas são recriadas pela `fabrica` quando voltam a ser acessadas.
+
+        fabrica: função que recebe o session_id e devolve o histórico da sessão.
+        max_sessoes: quantidade máxima de sessões mantidas em memória.
+        ttl_segundos: tempo máximo de ociosidade de uma sessão em memória (0 desativa).
+
+        return: None
+        """
+        self.fabrica = fabrica
+        self.max_sessoes = max_sessoes
+        self.ttl_segundos = ttl_segundos
+        self._sessoes = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _remover_ociosas(self, agora: float):
+        if not self.ttl_segundos:
+            return
+        while self._sessoes:
+            session_id, (_, ultimo_acesso) = next(iter(self._sessoes.items()))
+            if agora - ultimo_acesso <= self.ttl_segundos:
+                break
+            self._sessoes.pop(session_id)
+
+    def obter(self, session_id: str) -> Tuple[BaseChatMessageHistory, bool]:
+        """
+        Retorna o histórico da sessão, carregando-o pela fábrica se não estiver em memória.
+
+        session_id: identificador da sessão.
+
+        return: tupla (histórico, carregado) onde `carregado` indica que a fábrica foi chamada.
+        """
+        agora = time.monotonic()
+        with self._lock:
+            self._remover_ociosas(agora)
+            if session_id in self._sessoes:
+                historico, _ = self._sessoes.pop(session_id)
+                carregado = False
+            else:
+                historico = self.fabrica(session_id)
+                carregado = True
+            self._sessoes[session_id] = (historico, agora)
+            while len(self._sessoes) > self.max_sessoes:
+                self._sessoes.popitem(last=False)
+            return historico, carregado
+
+    def remover(self, session_id: str):
+        with self._lock:
+            self._sessoes.pop(session_id, None)
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessoes
+
+    def __getitem__(self, session_id: str) -> BaseChatMessageHistory:
+        return self.obter(session_id)[0]
+
+    def __len__(self) -> int:
+        return len(self._sessoes)
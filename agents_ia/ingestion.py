@@ -0,0 +1,201 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from agents_ia.tracing import no_contexto, span
+import os
+import time
+import uuid
+
+INGESTAO_TAMANHO_LOTE = int(os.getenv("INGESTAO_TAMANHO_LOTE", "32"))
+INGESTAO_MAX_CONCORRENCIA = int(os.getenv("INGESTAO_MAX_CONCORRENCIA", "4"))
+
+
+@dataclass
+class ProgressoIngestao:
+    """Estado corrente de uma ingestão, repassado ao callback de progresso."""
+
+    total: Optional[int] = None
+    concluidos: int = 0
+    lotes_concluidos: int = 0
+    inicio: float = 0.0
+    fim: Optional[float] = None
+    # Metadados do chunk mais avançado já gravado (ex.: página atual de um PDF lido por páginas)
+    ultimo_metadata: Optional[dict] = None
+
+    @property
+    def segundos(self) -> float:
+        return (self.fim or time.perf_counter()) - self.inicio
+
+    @property
+    def chunks_por_segundo(self) -> float:
+        segundos = self.segundos
+        return self.concluidos / segundos if segundos > 0 else 0.0
+
+    @property
+    def fracao(self) -> Optional[float]:
+        if self.total:
+            return min(self.concluidos / self.total, 1.0)
+        # Sem total conhecido, estima pela página corrente quando os documentos vêm paginados
+        metadata = self.ultimo_metadata or {}
+        if metadata.get("page") and metadata.get("total_paginas"):
+            return min(metadata["page"] / metadata["total_paginas"], 1.0)
+        return None
+
+
+def identificar_chunks(docs: Iterable[Document], prefixo: str) -> Iterator[Document]:
+    """
+    Atribui aos chunks de um arquivo ids determinísticos, formados pelo prefixo (SHA-256 do conteúdo) e pela
+    posição do chunk. Uma nova tentativa de uma ingestão interrompida regrava os mesmos ids em vez de
+    duplicar os chunks já gravados.
+
+    docs: iterável de Document (chunks de um único arquivo, na ordem de divisão).
+    prefixo: identificador do conteúdo do arquivo.
+
+    return: iterador com os mesmos documentos de `docs`.
+    """
+    for indice, doc in enumerate(docs):
+        doc.id = f"{prefixo}:{indice}"
+        yield doc
+
+
+def gravar_vetores(vectorstore, docs: List[Document], vetores: List[List[float]]):
+    """
+    Grava documentos com vetores já calculados no vetorstore, sem recalcular embeddings.
+    Documentos com `id` substituem os já gravados com o mesmo id; os demais recebem um id aleatório.
+
+    vectorstore: instância de Chroma ou FlatVectorStore onde os documentos serão gravados.
+    docs: lista de Document a ser gravada.
+    vetores: lista de vetores alinhada com `docs`.
+
+    return: None
+    """
+    # Ids determinísticos (ver `identificar_chunks`) tornam a gravação idempotente entre tentativas
+    ids = [doc.id or str(uuid.uuid4()) for doc in docs]
+    if hasattr(vectorstore, "adicionar_vetores"):
+        vectorstore.adicionar_vetores(docs, vetores, ids=ids)
+        return
+
+    com_meta = [i for i, doc in enumerate(docs) if doc.metadata]
+    sem_meta = [i for i, doc in enumerate(docs) if not doc.metadata]
+
+    # O Chroma não aceita metadados vazios, por isso os dois grupos são gravados separadamente
+    for indices, metadados in ((com_meta, True), (sem_meta, False)):
+        if not indices:
+            continue
+        vectorstore._collection.upsert(
+            ids=[ids[i] for i in indices],
+            embeddings=[vetores[i] for i in indices],
+            documents=[docs[i].page_content for i in indices],
+            metadatas=[docs[i].metadata for i in indices] if metadados else None,
+        )
+
+
+class PipelineIngestao:
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        vectorstore,
+        tamanho_lote: int = INGESTAO_TAMANHO_LOTE,
+        max_concorrencia: int = INGESTAO_MAX_CONCORRENCIA,
+        on_progress: Callable[[ProgressoIngestao], None] = None,
+        ao_gravar: Callable[[List[Document], List[List[float]]], None] = None,
+    ):
+        """
+        Inicializa o pipeline que vetoriza chunks em lotes com concorrência limitada.
+        Cada lote é gravado no vetorstore assim que seus embeddings ficam prontos.
+
+        embeddings: modelo de embeddings usado para vetorizar os chunks.
+        vectorstore: vetorstore de destino dos chunks vetorizados.
+        tamanho_lote: quantidade de chunks enviados ao modelo por requisição.
+        max_concorrencia: quantidade máxima de requisições simultâneas ao Ollama.
+        on_progress: função opcional chamada com um ProgressoIngestao a cada lote concluído.
+        ao_gravar: função opcional chamada com (lote, vetores) após cada gravação (ex.: centroides por arquivo).
+
+        return: None
+        """
+        self.embeddings = embeddings
+        self.vectorstore = vectorstore
+        self.tamanho_lote = max(1, tamanho_lote)
+        self.max_concorrencia = max(1, max_concorrencia)
+        self.on_progress = on_progress
+        self.ao_gravar = ao_gravar
+
+    def _lotes(self, docs: Iterable[Document]) -> Iterable[List[Document]]:
+        iterador = iter(docs)
+        while lote := list(islice(iterador, self.tamanho_lote)):
+            yield lote
+
+    def _vetorizar(self, textos: List[str]) -> List[List[float]]:
+        with span(
+            "embedding.vetorizar",
+            chunks=len(textos),
+            caracteres=sum(len(texto) for texto in textos),
+        ):
+            return self.embeddings.embed_documents(textos)
+
+    def executar(
+        self, docs: Iterable[Document], total: int = None
+    ) -> ProgressoIngestao:
+        """
+        Vetoriza e grava os documentos informados.
+        Aceita listas ou iteradores; no segundo caso os lotes são montados conforme os documentos chegam.
+
+        docs: iterável de Document (chunks já divididos).
+        total: quantidade total de chunks, se conhecida, usada para calcular a fração concluída.
+
+        return:
+            - ProgressoIngestao: resumo final da ingestão.
+        """
+        if total is None and hasattr(docs, "__len__"):
+            total = len(docs)
+        progresso = ProgressoIngestao(total=total, inicio=time.perf_counter())
+        lotes = self._lotes(docs)
+
+        with ThreadPoolExecutor(max_workers=self.max_concorrencia) as executor:
+            pendentes = {}
+
+            def submeter_proximo() -> bool:
+                lote = next(lotes, None)
+                if lote is None:
+                    return False
+                futuro = executor.submit(
+                    no_contexto(self._vetorizar),
+                    [doc.page_content for doc in lote],
+                )
+                pendentes[futuro] = lote
+                return True
+
+            # Mantém no máximo `max_concorrencia` lotes em voo, limitando memória e carga no Ollama
+            while len(pendentes) < self.max_concorrencia and submeter_proximo():
+                pass
+
+            while pendentes:
+                concluidos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+                for futuro in concluidos:
+                    lote = pendentes.pop(futuro)
+                    # As gravações acontecem nesta thread, uma de cada vez
+                    vetores = futuro.result()
+                    with span("embedding.gravar", chunks=len(lote)):
+                        gravar_vetores(self.vectorstore, lote, vetores)
+                    if self.ao_gravar:
+                        self.ao_gravar(lote, vetores)
+                    progresso.concluidos += len(lote)
+                    progresso.lotes_concluidos += 1
+                    # Lotes podem terminar fora de ordem; mantém o mais avançado para o progresso não regredir
+                    metadata = lote[-1].metadata
+                    pagina_atual = (progresso.ultimo_metadata or {}).get("page", 0)
+                    if metadata.get("page", 0) >= pagina_atual:
+                        progresso.ultimo_metadata = metadata
+                    if self.on_progress:
+                        self.on_progress(progresso)
+                    submeter_proximo()
+
+        progresso.fim = time.perf_counter()
+        print(
+            f"Ingestão concluída: {progresso.concluidos} chunks em {progresso.segundos:.2f}s "
+            f"({progresso.chunks_por_segundo:.1f} chunks/s)"
+        )
+        return progresso
@@ -0,0 +1,488 @@
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional, Tuple
+from agents_ia.batch_ingestion import ingerir_em_lote
+from agents_ia.document_cache import DocumentCache
+from agents_ia.embedding import EmbeddingProcessor
+from agents_ia.loader import CustomLoader
+from agents_ia.memory import add_system_message
+from agents_ia.sandbox import CSV_SANDBOX, preparar_sidecar
+from agents_ia.storage import obter_armazenamento
+from agents_ia.tracing import iniciar_trace, span
+import io
+import os
+import threading
+import time
+import traceback
+
+# Quantidade de arquivos processados em paralelo (sessões diferentes; numa mesma sessão é um por vez)
+INGESTAO_WORKERS = int(os.getenv("INGESTAO_WORKERS", "2"))
+# Quantidade máxima de jobs finalizados mantidos para consulta de status
+INGESTAO_MAX_JOBS = int(os.getenv("INGESTAO_MAX_JOBS", "200"))
+# Define se os PDFs são lidos página a página (pypdf) ou de uma vez (unstructured)
+PDF_POR_PAGINAS = os.getenv("PDF_CARREGAMENTO", "paginas") == "paginas"
+
+
+@dataclass
+class JobIngestao:
+    """Estado de um arquivo enviado para processamento em segundo plano."""
+
+    id: str
+    session_id: str
+    arquivo: str
+    hash: str
+    # pendente -> processando -> concluido | erro
+    status: str = "pendente"
+    progresso: Optional[float] = None
+    mensagem: str = "Aguardando processamento..."
+    erro: Optional[str] = None
+    resultado: Any = None
+    criado_em: float = field(default_factory=time.time)
+    iniciado_em: Optional[float] = None
+    concluido_em: Optional[float] = None
+
+    @property
+    def finalizado(self) -> bool:
+        return self.status in ("concluido", "erro")
+
+    @property
+    def segundos(self) -> Optional[float]:
+        if self.iniciado_em is None:
+            return None
+        return (self.concluido_em or time.time()) - self.iniciado_em
+
+
+class FilaIngestao:
+    def __init__(
+        self, max_workers: int = INGESTAO_WORKERS, max_jobs: int = INGESTAO_MAX_JOBS
+    ):
+        """
+        Fila de processamento de arquivos em segundo plano, para que o carregamento e a vetorização
+        não bloqueiem o chat. Cada arquivo vira um job identificado pela sessão e pelo SHA-256 do conteúdo:
+        reenviar o mesmo arquivo (ou reexecutar o script do Streamlit) devolve o job existente em vez de
+        processá-lo de novo. Jobs de uma mesma sessão rodam um de cada vez, pois gravam na mesma coleção.
+
+        max_workers: quantidade de threads de processamento.
+        max_jobs: quantidade máxima de jobs finalizados mantidos; os mais antigos são descartados.
+
+        return: None
+        """
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ingestao"
+        )
+        self._jobs = OrderedDict()
+        # Reentrante: a remoção de um arquivo pode compactar a coleção sob o mesmo lock
+        self._locks_sessao = defaultdict(threading.RLock)
+        self._lock = threading.Lock()
+
+    def submeter(
+        self,
+        session_id: str,
+        arquivo: str,
+        dados: bytes,
+        tarefa: Callable[[JobIngestao, io.BytesIO], Any],
+    ) -> JobIngestao:
+        """
+        Agenda o processamento de um arquivo, a menos que o mesmo conteúdo já tenha sido enviado na sessão.
+        Jobs que terminaram com erro são reenviados.
+
+        session_id: identificador da sessão de chat.
+        arquivo: nome do arquivo enviado.
+        dados: conteúdo do arquivo (copiado, pois o buffer do upload não sobrevive à execução do script).
+        tarefa: função executada no worker; recebe o job (para reportar progresso) e o arquivo em memória.
+
+        return: JobIngestao novo ou já existente.
+        """
+        job, novo = self._registrar(session_id, arquivo, dados)
+        if novo:
+            self._executor.submit(self._executar, job, dados, tarefa)
+            print(f"Job de ingestão '{arquivo}' enviado para a fila ({job.id}).")
+        return job
+
+    def submeter_lote(
+        self,
+        session_id: str,
+        arquivos: List[Tuple[str, bytes]],
+        tarefa: Callable[[List[JobIngestao], List[Tuple[str, bytes]]], Any],
+    ) -> List[JobIngestao]:
+        """
+        Agenda vários arquivos da mesma sessão para serem processados juntos por uma única tarefa
+        (ex.: ingestão em lote, com leitura em paralelo e uma só gravação no vetorstore).
+        Cada arquivo continua tendo seu próprio job; os que já foram enviados não entram no lote.
+
+        session_id: identificador da sessão de chat.
+        arquivos: lista de tuplas (nome, conteúdo).
+        tarefa: função executada no worker; recebe os jobs novos e os arquivos correspondentes.
+
+        return: lista de JobIngestao (novos ou já existentes), na ordem de `arquivos`.
+        """
+        jobs, novos, dados_novos = [], [], []
+        for arquivo, dados in arquivos:
+            job, novo = self._registrar(session_id, arquivo, dados)
+            jobs.append(job)
+            if novo:
+                novos.append(job)
+                dados_novos.append((arquivo, dados))
+        if novos:
+            self._executor.submit(self._executar_lote, novos, dados_novos, tarefa)
+            print(f"Lote de ingestão com {len(novos)} arquivos enviado para a fila.")
+        return jobs
+
+    def _registrar(self, session_id: str, arquivo: str, dados: bytes) -> tuple:
+        # Devolve o job do conteúdo na sessão e se ele é novo (jobs com erro são recriados)
+        chave = DocumentCache.hash_conteudo(dados)
+        job_id = f"{session_id}:{chave}"
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status != "erro":
+                return job, False
+            job = JobIngestao(
+                id=job_id, session_id=session_id, arquivo=arquivo, hash=chave
+            )
+            self._jobs[job_id] = job
+            self._jobs.move_to_end(job_id)
+            self._descartar_antigos()
+            return job, True
+
+    def lock_sessao(self, session_id: str) -> threading.RLock:
+        """
+        Lock que serializa as gravações na coleção da sessão. É mantido pelos jobs durante o processamento
+        e deve ser adquirido por quem remove ou reconstrói a coleção fora da fila.
+
+        session_id: identificador da sessão de chat.
+
+        return: threading.RLock da sessão.
+        """
+        with self._lock:
+            return self._locks_sessao[str(session_id)]
+
+    def esquecer(self, session_id: str, hash_arquivo: str = None) -> int:
+        """
+        Descarta os jobs finalizados da sessão (ou só os de um conteúdo), para que reenviar um arquivo
+        removido da coleção o processe de novo. Jobs pendentes ou em andamento são mantidos.
+
+        session_id: identificador da sessão de chat.
+        hash_arquivo: SHA-256 do conteúdo; None descarta todos os jobs finalizados da sessão.
+
+        return: quantidade de jobs descartados.
+        """
+        session_id = str(session_id)
+        with self._lock:
+            descartados = [
+                job_id
+                for job_id, job in self._jobs.items()
+                if job.session_id == session_id
+                and job.finalizado
+                and (hash_arquivo is None or job.hash == hash_arquivo)
+            ]
+            for job_id in descartados:
+                del self._jobs[job_id]
+        return len(descartados)
+
+    def sessoes_ativas(self) -> List[str]:
+        """
+        Sessões com jobs pendentes ou em andamento.
+
+        return: lista de session_id.
+        """
+        with self._lock:
+            return list(
+                dict.fromkeys(
+                    job.session_id for job in self._jobs.values() if not job.finalizado
+                )
+            )
+
+    def _descartar_antigos(self):
+        excedentes = max(len(self._jobs) - self.max_jobs, 0)
+        finalizados = [job_id for job_id, job in self._jobs.items() if job.finalizado]
+        for job_id in finalizados[:excedentes]:
+            del self._jobs[job_id]
+
+    def _executar(self, job: JobIngestao, dados: bytes, tarefa: Callable):
+        with self.lock_sessao(job.session_id):
+            job.status = "processando"
+            job.mensagem = f"Processando '{job.arquivo}'..."
+            job.iniciado_em = time.time()
+            arquivo = io.BytesIO(dados)
+            arquivo.name = job.arquivo
+            try:
+                with iniciar_trace(
+                    "ingestao", session_id=job.session_id, arquivo=job.arquivo
+                ):
+                    job.resultado = tarefa(job, arquivo)
+                job.progresso = 1.0
+                job.status = "concluido"
+                job.mensagem = f"'{job.arquivo}' processado em {job.segundos:.1f}s."
+            except Exception as e:
+                traceback.print_exc()
+                job.erro = str(e)
+                job.status = "erro"
+                job.mensagem = f"Falha ao processar '{job.arquivo}': {e}"
+            finally:
+                job.concluido_em = time.time()
+                arquivo.close()
+        print(job.mensagem)
+
+    def _executar_lote(
+        self,
+        jobs: List[JobIngestao],
+        arquivos: List[Tuple[str, bytes]],
+        tarefa: Callable,
+    ):
+        with self.lock_sessao(jobs[0].session_id):
+            for job in jobs:
+                job.status = "processando"
+                job.mensagem = f"Processando '{job.arquivo}' no lote..."
+                job.iniciado_em = time.time()
+            try:
+                with iniciar_trace(
+                    "ingestao",
+                    session_id=jobs[0].session_id,
+                    arquivo=", ".join(job.arquivo for job in jobs),
+                ):
+                    tarefa(jobs, arquivos)
+                erro = None
+            except Exception as e:
+                traceback.print_exc()
+                erro = e
+            # Jobs que a tarefa já marcou com erro (ex.: PDF inválido) mantêm seu estado
+            for job in jobs:
+                if job.finalizado:
+                    continue
+                job.concluido_em = time.time()
+                if erro is None:
+                    job.progresso = 1.0
+                    job.status = "concluido"
+                    job.mensagem = f"'{job.arquivo}' processado em {job.segundos:.1f}s."
+                else:
+                    job.erro = str(erro)
+                    job.status = "erro"
+                    job.mensagem = f"Falha ao processar '{job.arquivo}': {erro}"
+                print(job.mensagem)
+
+    def jobs(self, session_id: str) -> List[JobIngestao]:
+        """
+        Lista os jobs de uma sessão, na ordem de envio.
+
+        session_id: identificador da sessão de chat.
+
+        return: lista de JobIngestao.
+        """
+        with self._lock:
+            return [job for job in self._jobs.values() if job.session_id == session_id]
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            contagem = defaultdict(int)
+            for job in self._jobs.values():
+                contagem[job.status] += 1
+            return dict(contagem)
+
+
+def _mensagem_pdf(filename: str) -> str:
+    return f"Voce agora possui conhecimento sobre o arquivo PDF (que podem ser referidos como textos, artigos, etc) de nome: '{filename}'! \nResponda perguntas sobre o conteúdo desse arquivo. \nSe não souber a resposta, seja honesto e proponha caminhos para buscar a informação. \nSe tiver mais de um arquivo, use o nome do arquivo para referenciar o conteúdo que deseja consultar."
+
+
+def processar_arquivo(job: JobIngestao, arquivo: io.BytesIO, agente) -> Optional[dict]:
+    """
+    Carrega um PDF ou CSV e atualiza o agente da sessão. Roda no worker da fila: o agente só troca de
+    modo quando o retriever (ou o DataFrame) está completo, numa única operação.
+
+    job: job corrente, usado para reportar o progresso.
+    arquivo: conteúdo do arquivo em memória, com o atributo `name`.
+    agente: ChatAgent da sessão.
+
+    return: relatório de memória do CSV em modo colunar, se houver.
+    """
+    filename = job.arquivo
+    loader = CustomLoader(file=arquivo, filename=filename)
+    ext = filename.split(".")[-1].lower()
+
+    if ext == "pdf":
+
+        def atualizar_progresso(progresso):
+            job.progresso = progresso.fracao
+            job.mensagem = (
+                f"Vetorizando '{filename}': {progresso.concluidos} chunks "
+                f"({progresso.chunks_por_segundo:.1f} chunks/s)"
+            )
+
+        armazenamento = obter_armazenamento()
+        if armazenamento.arquivo_indexado(job.session_id, job.hash):
+            # O conteúdo já está na coleção persistida da sessão: só reabre o retriever
+            processor = EmbeddingProcessor(data=None, session_id=job.session_id)
+            agente.trocar_para_rag(processor.obter_retriever())
+            add_system_message(job.session_id, _mensagem_pdf(filename))
+            return None
+
+        # As páginas são lidas sob demanda e vetorizadas conforme chegam
+        docs = loader.lazy_load() if PDF_POR_PAGINAS else loader._load()
+        processor = EmbeddingProcessor(data=docs, session_id=job.session_id)
+        retriever = processor.create_retriever(
+            on_progress=atualizar_progresso, prefixo_ids=job.hash
+        )
+        armazenamento.registrar_arquivos(
+            job.session_id,
+            [(filename, job.hash, len(arquivo.getvalue()))],
+            processor.backend,
+        )
+        agente.trocar_para_rag(retriever)
+        add_system_message(job.session_id, _mensagem_pdf(filename))
+        return None
+
+    if ext == "csv":
+        job.mensagem = f"Carregando '{filename}'..."
+        df = loader._load()
+        # CSVs grandes já têm o sidecar do modo colunar; os demais ganham um para o sandbox
+        sidecar = (loader.relatorio_memoria or {}).get("sidecar")
+        if CSV_SANDBOX and sidecar is None:
+            with span("csv.sidecar"):
+                sidecar = preparar_sidecar(df, loader.hash_arquivo())
+        agente.load_dataframe_tools(df=df, sidecar=sidecar)
+        add_system_message(
+            job.session_id,
+            f"Voce agora possui conhecimento sobre o arquivo CSV de nome: '{filename}'! \nResponda perguntas sobre o conteúdo desse arquivo utilizando apenas python e pandas. \nSe não souber a resposta, seja honesto e proponha caminhos para buscar a informação. \nSe tiver mais de um arquivo, use o nome do arquivo para referenciar o conteúdo que deseja consultar.",
+        )
+        return loader.relatorio_memoria
+
+    raise ValueError(f"Tipo de arquivo não suportado: '{filename}'.")
+
+
+def processar_lote(
+    jobs: List[JobIngestao], arquivos: List[Tuple[str, bytes]], agente
+) -> None:
+    """
+    Ingere vários PDFs de uma sessão com `ingerir_em_lote` (leitura e divisão em paralelo entre processos,
+    uma única gravação no vetorstore) e troca o agente para o modo RAG ao final.
+
+    jobs: jobs dos arquivos do lote; os que falharem na leitura são marcados com erro.
+    arquivos: lista de tuplas (nome, conteúdo), alinhada com `jobs`.
+    agente: ChatAgent da sessão.
+
+    return: None
+    """
+    session_id = jobs[0].session_id
+    armazenamento = obter_armazenamento()
+    # Arquivos cujo conteúdo já está na coleção persistida da sessão não são reprocessados.
+    # Os demais são identificados pela posição no lote: dois PDFs diferentes podem ter o mesmo nome
+    indexados, novos = [], []
+    for job, arquivo in zip(jobs, arquivos):
+        if armazenamento.arquivo_indexado(session_id, job.hash):
+            indexados.append(job)
+        else:
+            novos.append((job, arquivo))
+
+    def arquivo_lido(indice: int, erro: Optional[Exception]):
+        job = novos[indice][0]
+        if erro is None:
+            job.mensagem = f"'{job.arquivo}' lido; aguardando a vetorização do lote..."
+            return
+        job.erro = str(erro)
+        job.status = "erro"
+        job.mensagem = f"Falha ao processar '{job.arquivo}': {erro}"
+        job.concluido_em = time.time()
+
+    def atualizar_progresso(progresso):
+        for job in jobs:
+            if not job.finalizado:
+                job.mensagem = (
+                    f"Vetorizando o lote ({len(jobs)} arquivos): {progresso.concluidos} chunks "
+                    f"({progresso.chunks_por_segundo:.1f} chunks/s)"
+                )
+
+    if novos:
+        retriever, erros = ingerir_em_lote(
+            [arquivo for _, arquivo in novos],
+            session_id,
+            por_paginas=PDF_POR_PAGINAS,
+            on_progress=atualizar_progresso,
+            on_arquivo=arquivo_lido,
+        )
+        if len(erros) == len(novos) and not indexados:
+            return
+        lidos = [
+            (job, dados)
+            for indice, (job, (_, dados)) in enumerate(novos)
+            if indice not in erros
+        ]
+        armazenamento.registrar_arquivos(
+            session_id, [(job.arquivo, job.hash, len(dados)) for job, dados in lidos]
+        )
+    else:
+        lidos = []
+        retriever = EmbeddingProcessor(
+            data=None, session_id=session_id
+        ).obter_retriever()
+    agente.trocar_para_rag(retriever)
+    for job in indexados + [job for job, _ in lidos]:
+        add_system_message(session_id, _mensagem_pdf(job.arquivo))
+
+
+def enviar_arquivos(
+    session_id: str, arquivos: List[Tuple[str, bytes]], agente
+) -> List[JobIngestao]:
+    """
+    Envia arquivos de uma sessão para a fila de ingestão: CSVs e um PDF isolado viram um job cada,
+    e dois ou mais PDFs são ingeridos juntos em lote. Usada pelo app do Streamlit e pela API HTTP.
+
+    session_id: identificador da sessão de chat.
+    arquivos: lista de tuplas (nome, conteúdo).
+    agente: ChatAgent da sessão, atualizado quando cada job termina.
+
+    return: lista de JobIngestao (novos ou já existentes).
+    """
+    fila = obter_fila_ingestao()
+    jobs = []
+    pdfs = []
+    for filename, dados in arquivos:
+        if filename.split(".")[-1].lower() == "pdf":
+            pdfs.append((filename, dados))
+        else:
+            jobs.append(
+                fila.submeter(
+                    session_id,
+                    filename,
+                    dados,
+                    lambda job, arquivo: processar_arquivo(job, arquivo, agente),
+                )
+            )
+
+    # Vários PDFs são lidos em paralelo (pool de processos) e gravados juntos no vetorstore
+    if len(pdfs) > 1:
+        jobs.extend(
+            fila.submeter_lote(
+                session_id,
+                pdfs,
+                lambda novos, lote: processar_lote(novos, lote, agente),
+            )
+        )
+    elif pdfs:
+        filename, dados = pdfs[0]
+        jobs.append(
+            fila.submeter(
+                session_id,
+                filename,
+                dados,
+                lambda job, arquivo: processar_arquivo(job, arquivo, agente),
+            )
+        )
+    return jobs
+
+
+_fila_padrao = None
+_fila_lock = threading.Lock()
+
+
+def obter_fila_ingestao() -> FilaIngestao:
+    """
+    Retorna a fila de ingestão compartilhada pelo processo, criando-a na primeira chamada.
+
+    return: FilaIngestao
+    """
+    global _fila_padrao
+    with _fila_lock:
+        if _fila_padrao is None:
+            _fila_padrao = FilaIngestao()
+        return _fila_padrao
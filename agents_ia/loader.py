@@ -1,21 +1,54 @@
-from langchain_community.document_loaders import UnstructuredPDFLoader, CSVLoader
+from langchain_core.documents import Document
+from agents_ia.document_cache import DocumentCache, obter_cache_documentos
+from agents_ia.columnar import CSV_LIMIAR_COLUNAR_MB, carregar_csv_colunar
+from agents_ia.tracing import anotar, medir_iterador, span
 from pathlib import Path
+from typing import Iterator
+import os
 import tempfile
-import pandas as pd
 
 
 class CustomLoader:
-    def __init__(self, file, filename: str):
+    def __init__(self, file, filename: str, csv_colunar: bool = None):
         """
         Inicializa o carregador personalizado com um arquivo enviado via upload.
 
         file: objeto do tipo BytesIO (retornado por st.file_uploader)
         filename: string representando o nome do arquivo, necessário para saber a extensão (.pdf ou .csv)
+        csv_colunar: força (True) ou desativa (False) o modo colunar para CSVs; se None, ativa para arquivos
+            maiores que CSV_LIMIAR_COLUNAR_MB.
 
         return: None
         """
         self.file = file
         self.filename = filename
+        self.csv_colunar = csv_colunar
+        self.cache = obter_cache_documentos()
+        self._hash = None
+        # Relatório de memória do último CSV carregado no modo colunar
+        self.relatorio_memoria = None
+
+    def hash_arquivo(self) -> str:
+        """
+        Calcula (uma única vez) o SHA-256 do conteúdo do arquivo enviado.
+
+        return: string hexadecimal com o hash.
+        """
+        if self._hash is None:
+            if hasattr(self.file, "getvalue"):
+                dados = self.file.getvalue()
+            else:
+                self.file.seek(0)
+                dados = self.file.read()
+            self._hash = DocumentCache.hash_conteudo(dados)
+        return self._hash
+
+    def _do_cache(self, docs: Iterator[Document]) -> Iterator[Document]:
+        # O mesmo conteúdo pode ter sido enviado com outro nome de arquivo
+        for doc in docs:
+            doc.metadata["Arquivo"] = self.filename
+            doc.metadata["source"] = self.filename
+            yield doc
 
     def _load(self):
         """
@@ -36,6 +69,63 @@ class CustomLoader:
         else:
             raise ValueError(f"Formato de arquivo não suportado: {ext}")
 
+    def lazy_load(self) -> Iterator[Document]:
+        """
+        Carrega o PDF de forma incremental, gerando um Document por página diretamente do buffer enviado,
+        sem gravar arquivos temporários. Permite que as primeiras páginas sejam divididas e vetorizadas
+        enquanto o restante do arquivo ainda está sendo lido.
+
+        return:
+            - Iterator[Document]: documentos por página, com metadados de arquivo e número da página.
+
+        raise:
+            - ValueError se o arquivo não for PDF.
+        """
+        ext = Path(self.filename).suffix.lower()
+        if ext != ".pdf":
+            raise ValueError(f"Carregamento por páginas não suportado para: {ext}")
+
+        with span("loader.hash"):
+            chave = self.hash_arquivo()
+        docs = self.cache.obter_documentos(chave, "paginas")
+        anotar(arquivo=self.filename, cache_documentos=docs is not None)
+        if docs is not None:
+            docs = self._do_cache(docs)
+        else:
+            docs = self.cache.gravar_documentos(
+                chave, "paginas", self._load_pdf_paginas()
+            )
+        # O tempo de leitura de cada página é medido conforme ela é consumida
+        return medir_iterador(
+            "loader.parse", docs, tamanho=lambda doc: len(doc.page_content)
+        )
+
+    def _load_pdf_paginas(self) -> Iterator[Document]:
+        """
+        Extrai o texto de cada página do PDF com o pypdf e gera um Document por página.
+
+        return:
+            - Iterator[Document]: documentos por página (páginas sem texto são ignoradas).
+        """
+        from pypdf import PdfReader
+
+        self.file.seek(0)
+        reader = PdfReader(self.file)
+        total_paginas = len(reader.pages)
+        for numero, pagina in enumerate(reader.pages, start=1):
+            texto = pagina.extract_text() or ""
+            if not texto.strip():
+                continue
+            yield Document(
+                page_content=texto,
+                metadata={
+                    "source": self.filename,
+                    "page": numero,
+                    "total_paginas": total_paginas,
+                    "Arquivo": self.filename,
+                },
+            )
+
     def _load_pdf(self):
         """
         Carrega e processa um arquivo PDF utilizando o UnstructuredPDFLoader.
@@ -47,25 +137,62 @@ class CustomLoader:
         raise:
             - Exception se houver erro durante a leitura ou parsing do PDF.
         """
+        # O unstructured é pesado e só é importado quando esse modo de leitura é usado
+        from langchain_community.document_loaders import UnstructuredPDFLoader
+
+        with span("loader.hash"):
+            chave = self.hash_arquivo()
+        docs = self.cache.obter_documentos(chave, "unstructured")
+        anotar(arquivo=self.filename, cache_documentos=docs is not None)
+        if docs is not None:
+            with span("loader.parse"):
+                return list(self._do_cache(docs))
+
+        self.file.seek(0)
         with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
             tmp.write(self.file.read())
             tmp.flush()
             temp_path = tmp.name
 
-            try:
-                loader = UnstructuredPDFLoader(temp_path)
+        try:
+            loader = UnstructuredPDFLoader(temp_path)
+            with span("loader.parse") as medicao:
                 docs = loader.load()
-                for doc in docs:
-                    doc.metadata["Arquivo"] = self.filename
-                return docs
+                medicao.definir(
+                    itens=len(docs),
+                    caracteres=sum(len(doc.page_content) for doc in docs),
+                )
+            for doc in docs:
+                doc.metadata["Arquivo"] = self.filename
+            self.cache.salvar_documentos(chave, "unstructured", docs)
+            return docs
+
+        except Exception as e:
+            print(f"Erro ao carregar o PDF: {e}")
+            raise e
+
+        finally:
+            # O UnstructuredPDFLoader exige um caminho; o arquivo temporário é removido após o uso
+            os.remove(temp_path)
+
+    def _usar_csv_colunar(self) -> bool:
+        """
+        Decide se o CSV deve ser carregado no modo colunar (dtypes compactos e sidecar Arrow mapeado em memória).
 
-            except Exception as e:
-                print(f"Erro ao carregar o PDF: {e}")
-                raise e
+        return: bool
+        """
+        if self.csv_colunar is not None:
+            return self.csv_colunar
+        self.file.seek(0, os.SEEK_END)
+        tamanho = self.file.tell()
+        self.file.seek(0)
+        return tamanho > CSV_LIMIAR_COLUNAR_MB * 1024 * 1024
 
     def _load_csv(self):
         """
         Carrega e processa um arquivo CSV utilizando o pandas.
+        Arquivos grandes são lidos em blocos, convertidos uma única vez para um sidecar Arrow com
+        dtypes compactos e expostos como um DataFrame apoiado no arquivo mapeado em memória.
 
         return:
             - pandas.DataFrame: dataframe contendo os dados do arquivo CSV.
@@ -73,15 +200,30 @@ class CustomLoader:
         raise:
             - Exception se houver erro durante a leitura do CSV.
         """
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".csv") as tmp:
-            tmp.write(self.file.read())
-            tmp.flush()
-            temp_path = tmp.name
-
-            try:
-                df = pd.read_csv(temp_path)
-                return df
-
-            except Exception as e:
-                print(f"Erro ao carregar o CSV: {e}")
-                raise e
+        import pandas as pd
+
+        with span("loader.hash"):
+            chave = self.hash_arquivo()
+        anotar(arquivo=self.filename)
+        if self._usar_csv_colunar():
+            with span("loader.csv_colunar"):
+                df, self.relatorio_memoria = carregar_csv_colunar(self.file, chave)
+            return df
+
+        df = self.cache.obter_dataframe(chave)
+        anotar(cache_documentos=df is not None)
+        if df is not None:
+            return df
+
+        try:
+            # O pandas lê diretamente do buffer enviado, sem arquivo temporário
+            self.file.seek(0)
+            with span("loader.csv") as medicao:
+                df = pd.read_csv(self.file)
+                medicao.definir(linhas=len(df))
+            self.cache.salvar_dataframe(chave, df)
+            return df
+
+        except Exception as e:
+            print(f"Erro ao carregar o CSV: {e}")
+            raise e
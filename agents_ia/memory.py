@@ -9,15 +9,275 @@ from langchain_core.messages import (
     AIMessage,
     ToolMessage,
 )
+from agents_ia.history_store import SessionStore, SQLiteChatMessageHistory
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Sequence
+import os
+import threading
 
-# Armazena o histórico de mensagens para cada sessão identificada por session_id
-store = {}
+HISTORICO_ORCAMENTO_TOKENS = int(os.getenv("HISTORICO_ORCAMENTO_TOKENS", "3000"))
+HISTORICO_TURNOS_RECENTES = int(os.getenv("HISTORICO_TURNOS_RECENTES", "6"))
+# Fração do orçamento liberada quando a janela de turnos avança, para que o início do prompt não mude a cada turno
+HISTORICO_FOLGA_JANELA = float(os.getenv("HISTORICO_FOLGA_JANELA", "0.25"))
+# "sqlite" persiste o histórico em disco; "memoria" mantém apenas em memória (perdido ao descartar a sessão)
+HISTORICO_BACKEND = os.getenv("HISTORICO_BACKEND", "sqlite")
+
+# Os resumos são gerados fora do caminho crítico, em uma única thread compartilhada
+_executor_resumo = ThreadPoolExecutor(max_workers=1, thread_name_prefix="resumo")
+
+
+def estimar_tokens(mensagem: BaseMessage) -> int:
+    """
+    Estima a quantidade de tokens de uma mensagem (aproximadamente 4 caracteres por token).
+
+    mensagem: mensagem a ser estimada.
+
+    return: int com a estimativa de tokens.
+    """
+    return len(str(mensagem.content)) // 4 + 4
+
+
+def resumir_mensagens(resumo_anterior: str, mensagens: List[BaseMessage]) -> str:
+    """
+    Gera, com o LLM local, um resumo que incorpora o resumo anterior e as mensagens informadas.
+
+    resumo_anterior: resumo acumulado até o momento (pode ser vazio).
+    mensagens: mensagens antigas que serão compactadas.
+
+    return: string com o novo resumo.
+    """
+    from LLM.local_llm import LocalLLM
+
+    conversa = "\n".join(
+        f"{mensagem.type}: {mensagem.content}"
+        for mensagem in mensagens
+        if mensagem.content
+    )
+    resposta = LocalLLM(temperature=0.2).llm.invoke(
+        [
+            SystemMessage(
+                content=(
+                    "Resuma a conversa abaixo em português, em poucas frases, preservando nomes, "
+                    "fatos, decisões e perguntas em aberto. Incorpore o resumo anterior, se houver. "
+                    "Responda apenas com o resumo."
+                )
+            ),
+            HumanMessage(
+                content=f"Resumo anterior:\n{resumo_anterior or '(vazio)'}\n\nConversa:\n{conversa}"
+            ),
+        ]
+    )
+    return resposta.content
+
+
+class GerenciadorHistorico(BaseChatMessageHistory):
+    def __init__(
+        self,
+        armazenamento: BaseChatMessageHistory = None,
+        orcamento_tokens: int = HISTORICO_ORCAMENTO_TOKENS,
+        turnos_recentes: int = HISTORICO_TURNOS_RECENTES,
+        resumidor=resumir_mensagens,
+        folga_janela: float = HISTORICO_FOLGA_JANELA,
+    ):
+        """
+        Inicializa um histórico que mantém o prompt abaixo de um orçamento de tokens.
+        As mensagens de sistema são sempre mantidas, os últimos turnos são enviados na íntegra
+        e os turnos mais antigos são compactados em um resumo gerado em segundo plano.
+
+        armazenamento: histórico onde as mensagens são efetivamente guardadas (padrão: em memória).
+        orcamento_tokens: quantidade máxima estimada de tokens enviada ao modelo.
+        turnos_recentes: quantidade de turnos (pergunta e respostas) mantidos na íntegra.
+        resumidor: função (resumo_anterior, mensagens) -> str usada para compactar turnos antigos.
+        folga_janela: fração do orçamento liberada cada vez que turnos antigos saem da janela enviada.
+
+        return: None
+        """
+        self.armazenamento = armazenamento or InMemoryChatMessageHistory()
+        self.orcamento_tokens = orcamento_tokens
+        self.turnos_recentes = turnos_recentes
+        self.resumidor = resumidor
+        self.folga_janela = folga_janela
+        self.resumo = ""
+        # Quantidade de mensagens do armazenamento já incorporadas ao resumo
+        self._compactadas = 0
+        if hasattr(self.armazenamento, "carregar_resumo"):
+            self.resumo, self._compactadas = self.armazenamento.carregar_resumo()
+        self._compactacao = None
+        # Índice do armazenamento onde começa a janela de turnos enviada ao modelo
+        self._inicio_janela = 0
+        self._lock = threading.RLock()
+        with self._lock:
+            self._atualizar_janela()
+
+    @staticmethod
+    def _turnos(mensagens: Sequence[BaseMessage], inicio: int = 0) -> List[list]:
+        """
+        Agrupa as mensagens (exceto as de sistema) em turnos iniciados por uma HumanMessage.
+
+        mensagens: mensagens do armazenamento.
+        inicio: índice a partir do qual as mensagens são consideradas.
+
+        return: lista de turnos, cada um como lista de pares (índice, mensagem).
+        """
+        turnos = []
+        for indice in range(inicio, len(mensagens)):
+            mensagem = mensagens[indice]
+            if isinstance(mensagem, SystemMessage):
+                continue
+            if isinstance(mensagem, HumanMessage) or not turnos:
+                turnos.append([])
+            turnos[-1].append((indice, mensagem))
+        return turnos
+
+    def _mensagens_sistema(self, todas: Sequence[BaseMessage]) -> List[BaseMessage]:
+        """
+        Mensagens de sistema do armazenamento, seguidas do resumo dos turnos antigos, se houver.
+
+        todas: mensagens do armazenamento.
+
+        return: lista de mensagens de sistema.
+        """
+        sistema = [m for m in todas if isinstance(m, SystemMessage)]
+        if self.resumo:
+            sistema = sistema + [
+                SystemMessage(content=f"Resumo da conversa anterior:\n{self.resumo}")
+            ]
+        return sistema
+
+    def _atualizar_janela(self):
+        """
+        Avança a janela de turnos enviada ao modelo quando ela excede `turnos_recentes` ou o orçamento de
+        tokens, descartando turnos antigos até liberar `folga_janela` de ambos, para que o início do prompt
+        (e o cache de prefixo do Ollama) se mantenha pelos próximos turnos. Deve ser chamado com o lock.
+
+        return: None
+        """
+        todas = self.armazenamento.messages
+        sistema = self._mensagens_sistema(todas)
+        turnos = self._turnos(todas, max(self._compactadas, self._inicio_janela))
+
+        disponivel = self.orcamento_tokens - sum(estimar_tokens(m) for m in sistema)
+        custos = [sum(estimar_tokens(m) for _, m in turno) for turno in turnos]
+        total = sum(custos)
+        if len(turnos) <= self.turnos_recentes and total <= disponivel:
+            return
+        # O turno mais recente é sempre mantido, mesmo acima do orçamento
+        alvo_tokens = disponivel * (1 - self.folga_janela)
+        alvo_turnos = max(1, int(self.turnos_recentes * (1 - self.folga_janela)))
+        while len(turnos) > 1 and (len(turnos) > alvo_turnos or total > alvo_tokens):
+            total -= custos.pop(0)
+            turnos.pop(0)
+        self._inicio_janela = turnos[0][0][0] if turnos else len(todas)
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        """
+        Mensagens enviadas ao modelo, em uma ordem que só cresce no fim entre um turno e outro: mensagens de
+        sistema (o prompt base e o registro dos arquivos carregados, na ordem de chegada), resumo dos turnos
+        antigos e os turnos da janela corrente. A janela só é alterada por `_atualizar_janela`, quando
+        mensagens são adicionadas ou o resumo muda.
+        """
+        with self._lock:
+            todas = self.armazenamento.messages
+            sistema = self._mensagens_sistema(todas)
+            turnos = self._turnos(todas, max(self._compactadas, self._inicio_janela))
+        return sistema + [m for turno in turnos for _, m in turno]
+
+    def add_message(self, message: BaseMessage) -> None:
+        with self._lock:
+            self.armazenamento.add_message(message)
+            self._atualizar_janela()
+            self._agendar_compactacao()
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        with self._lock:
+            self.armazenamento.add_messages(messages)
+            self._atualizar_janela()
+            self._agendar_compactacao()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.armazenamento.clear()
+            self.resumo = ""
+            self._compactadas = 0
+            self._inicio_janela = 0
+            if hasattr(self.armazenamento, "salvar_resumo"):
+                self.armazenamento.salvar_resumo("", 0)
+
+    def _agendar_compactacao(self):
+        """
+        Agenda a compactação dos turnos que saíram da janela enviada ao modelo e ainda não estão
+        no resumo. Apenas uma compactação roda por vez. Deve ser chamado com o lock.
+
+        return: None
+        """
+        if self._compactacao is not None and not self._compactacao.done():
+            return
+        if self._inicio_janela <= self._compactadas:
+            return
+        todas = self.armazenamento.messages
+        fim = self._inicio_janela
+        mensagens = [
+            m
+            for m in todas[self._compactadas : fim]
+            if not isinstance(m, SystemMessage)
+        ]
+        if not mensagens:
+            self._compactadas = fim
+            return
+        self._compactacao = _executor_resumo.submit(
+            self._compactar, self.resumo, mensagens, fim
+        )
+
+    def _compactar(self, resumo_anterior: str, mensagens: List[BaseMessage], fim: int):
+        """
+        Gera o novo resumo e avança o ponto de compactação. Executa em segundo plano.
+
+        resumo_anterior: resumo vigente quando a compactação foi agendada.
+        mensagens: mensagens a serem incorporadas ao resumo.
+        fim: índice do armazenamento até onde as mensagens passam a ser representadas pelo resumo.
+
+        return: None
+        """
+        try:
+            resumo = self.resumidor(resumo_anterior, mensagens)
+        except Exception as e:
+            print(f"Erro ao resumir o histórico: {e}")
+            return
+        with self._lock:
+            self.resumo = resumo
+            self._compactadas = fim
+            if hasattr(self.armazenamento, "salvar_resumo"):
+                self.armazenamento.salvar_resumo(resumo, fim)
+            # O resumo ocupa parte do orçamento, e turnos podem ter saído da janela durante a compactação
+            self._atualizar_janela()
+            self._agendar_compactacao()
+        print(f"Histórico compactado: {len(mensagens)} mensagens resumidas.")
+
+
+def _criar_historico(session_id: str) -> BaseChatMessageHistory:
+    """
+    Cria o histórico de uma sessão conforme o backend configurado em HISTORICO_BACKEND.
+
+    session_id: identificador da sessão.
+
+    return: GerenciadorHistorico sobre o armazenamento escolhido.
+    """
+    if HISTORICO_BACKEND == "sqlite":
+        return GerenciadorHistorico(armazenamento=SQLiteChatMessageHistory(session_id))
+    return GerenciadorHistorico()
+
+
+# Armazena o histórico de mensagens para cada sessão identificada por session_id.
+# Apenas as sessões recentes ficam em memória (LRU com expiração por ociosidade).
+store = SessionStore(_criar_historico)
 
 
 def get_session_history(session_id: str) -> BaseChatMessageHistory:
     """
     Retorna o histórico de mensagens da sessão correspondente ao session_id.
     Se a sessão ainda não existir, cria um novo histórico com uma mensagem inicial do sistema.
+    Sessões descartadas da memória são recarregadas do armazenamento persistente.
 
     Parâmetros:
     - session_id (str): Identificador único da sessão de chat.
@@ -25,9 +285,9 @@ def get_session_history(session_id: str) -> BaseChatMessageHistory:
     Retorno:
     - BaseChatMessageHistory: Objeto contendo o histórico de mensagens da sessão.
     """
-    if session_id not in store:
-        store[session_id] = InMemoryChatMessageHistory()
-        store[session_id].add_message(
+    historico, carregado = store.obter(session_id)
+    if carregado and not historico.armazenamento.messages:
+        historico.add_message(
             SystemMessage(
                 content=(
                     """
@@ -47,12 +307,14 @@ def get_session_history(session_id: str) -> BaseChatMessageHistory:
                 )
             )
         )
-    return store[session_id]
+    return historico
 
 
 def add_system_message(session_id: str, texto: str):
     """
     Adiciona uma mensagem do sistema ao histórico da sessão. Se a sessão não existir, ela será criada.
+    As mensagens de sistema formam o registro de arquivos no início do prompt (ver `GerenciadorHistorico.messages`);
+    uma mensagem idêntica a outra já registrada não é repetida, para não alterar esse prefixo.
 
     Parâmetros:
     - session_id (str): Identificador único da sessão de chat.
@@ -61,7 +323,11 @@ def add_system_message(session_id: str, texto: str):
     Retorno:
     - None
     """
-    if session_id not in store:
-        get_session_history(session_id)
-    store[session_id].add_message(SystemMessage(content=texto))
+    historico = get_session_history(session_id)
+    if any(
+        isinstance(mensagem, SystemMessage) and mensagem.content == texto
+        for mensagem in historico.armazenamento.messages
+    ):
+        return
+    historico.add_message(SystemMessage(content=texto))
     print(f"Mensagem do sistema adicionada na sessão {session_id}: {texto}")
@@ -0,0 +1,234 @@
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from agents_ia.tracing import span
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import os
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+# Roteamento da busca por arquivo: restringe a consulta aos arquivos citados ou mais próximos
+RAG_ROTEAMENTO = os.getenv("RAG_ROTEAMENTO", "1") == "1"
+# Quantidade de arquivos consultados quando a consulta não cita nenhum pelo nome
+RAG_MAX_ARQUIVOS = int(os.getenv("RAG_MAX_ARQUIVOS", "2"))
+
+
+# Trechos entre aspas simples, duplas, tipográficas, crases ou aspas angulares
+_ASPAS = re.compile(r"[\"'`“”‘’«»]([^\"'`“”‘’«»]+)[\"'`“”‘’«»]")
+
+
+def _normalizar(texto: str) -> str:
+    # Minúsculas, sem acentos e com qualquer pontuação trocada por espaço
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(re.findall(r"[a-z0-9]+", texto))
+
+
+def arquivos_citados(consulta: str, arquivos: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    Identifica os arquivos citados na consulta. A citação é explícita quando traz o nome com a extensão
+    (ex.: "relatorio_2023.pdf") ou o nome entre aspas (ex.: "o 'relatório 2023' diz..."). O nome sem extensão
+    solto no texto é apenas uma menção, pois pode ser uma palavra comum da pergunta (ex.: `attention.pdf`
+    em "o que é attention?").
+
+    consulta: texto da consulta.
+    arquivos: nomes dos arquivos da sessão.
+
+    return: tupla (arquivos citados explicitamente, arquivos apenas mencionados), na ordem de `arquivos`.
+    """
+    texto = f" {_normalizar(consulta)} "
+    entre_aspas = {_normalizar(trecho) for trecho in _ASPAS.findall(consulta)}
+    explicitos, mencionados = [], []
+    for arquivo in arquivos:
+        base, extensao = os.path.splitext(arquivo)
+        nome = _normalizar(base) or _normalizar(arquivo)
+        if not nome:
+            continue
+        if (extensao and f" {_normalizar(arquivo)} " in texto) or (
+            entre_aspas & {nome, _normalizar(arquivo)}
+        ):
+            explicitos.append(arquivo)
+        elif f" {nome} " in texto:
+            mencionados.append(arquivo)
+    return explicitos, mencionados
+
+
+class CentroidesArquivos:
+    def __init__(self):
+        """
+        Centroide dos embeddings de cada arquivo da sessão (média dos vetores normalizados dos seus chunks),
+        usado para escolher os arquivos mais próximos da consulta sem percorrer todos os chunks.
+
+        return: None
+        """
+        self.somas: Dict[str, np.ndarray] = {}
+        self.contagens: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def arquivos(self) -> List[str]:
+        with self._lock:
+            return list(self.somas)
+
+    def adicionar(self, docs: List[Document], vetores: List[List[float]]):
+        """
+        Soma os vetores de um lote gravado aos centroides dos seus arquivos (metadado "Arquivo").
+        Compatível com o `ao_gravar` do PipelineIngestao.
+
+        docs: chunks do lote.
+        vetores: embeddings dos chunks, na mesma ordem.
+
+        return: None
+        """
+        matriz = np.asarray(vetores, dtype=np.float32)
+        if not len(matriz):
+            return
+        normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+        matriz = matriz / np.where(normas == 0, 1, normas)
+        with self._lock:
+            for doc, vetor in zip(docs, matriz):
+                arquivo = (doc.metadata or {}).get("Arquivo")
+                if arquivo is None:
+                    continue
+                if arquivo in self.somas:
+                    self.somas[arquivo] += vetor
+                    self.contagens[arquivo] += 1
+                else:
+                    self.somas[arquivo] = vetor.copy()
+                    self.contagens[arquivo] = 1
+
+    def remover(self, arquivo: str):
+        """
+        Descarta o centroide de um arquivo removido da coleção.
+
+        arquivo: nome do arquivo (metadado "Arquivo").
+
+        return: None
+        """
+        with self._lock:
+            self.somas.pop(arquivo, None)
+            self.contagens.pop(arquivo, None)
+
+    def ranquear(self, vetor: List[float]) -> List[Tuple[str, float]]:
+        """
+        Ordena os arquivos pela similaridade de cosseno entre a consulta e o centroide de cada um.
+
+        vetor: embedding da consulta.
+
+        return: lista de tuplas (arquivo, similaridade), da maior para a menor.
+        """
+        consulta = np.asarray(vetor, dtype=np.float32)
+        consulta = consulta / (np.linalg.norm(consulta) or 1)
+        with self._lock:
+            similaridades = [
+                (arquivo, float(soma @ consulta / (np.linalg.norm(soma) or 1)))
+                for arquivo, soma in self.somas.items()
+            ]
+        return sorted(similaridades, key=lambda item: item[1], reverse=True)
+
+    def salvar(self, caminho: str):
+        """
+        Grava os centroides em JSON, ao lado da coleção da sessão.
+
+        caminho: caminho do arquivo .json.
+
+        return: None
+        """
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        with self._lock:
+            dados = {
+                arquivo: {"soma": soma.tolist(), "chunks": self.contagens[arquivo]}
+                for arquivo, soma in self.somas.items()
+            }
+        temporario = f"{caminho}.tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            json.dump(dados, arquivo, ensure_ascii=False)
+        os.replace(temporario, caminho)
+
+    @classmethod
+    def carregar(cls, caminho: str) -> "CentroidesArquivos":
+        """
+        Lê os centroides gravados por `salvar`; se o arquivo não existir, retorna um conjunto vazio.
+
+        caminho: caminho do arquivo .json.
+
+        return: CentroidesArquivos
+        """
+        centroides = cls()
+        if not os.path.exists(caminho):
+            return centroides
+        with open(caminho, "r", encoding="utf-8") as arquivo:
+            dados = json.load(arquivo)
+        for nome, item in dados.items():
+            centroides.somas[nome] = np.asarray(item["soma"], dtype=np.float32)
+            centroides.contagens[nome] = item["chunks"]
+        return centroides
+
+
+class RoteadorArquivos(BaseRetriever):
+    """
+    Restringe a busca do retriever interno aos arquivos relevantes para a consulta, com um filtro
+    no metadado "Arquivo": os arquivos citados explicitamente (nome com extensão ou entre aspas) ou,
+    se nenhum for citado, os `max_arquivos` de centroide mais próximo somados aos apenas mencionados
+    pelo nome sem extensão. Sem `embeddings` (modo lexical), só as citações explícitas restringem a busca.
+    """
+
+    retriever: BaseRetriever
+    centroides: CentroidesArquivos
+    embeddings: Optional[Embeddings] = None
+    vectorstore: Any = None
+    max_arquivos: int = RAG_MAX_ARQUIVOS
+
+    def rotear(self, consulta: str) -> Optional[List[str]]:
+        """
+        Escolhe os arquivos em que a consulta será feita.
+
+        consulta: texto da consulta.
+
+        return: lista de arquivos, ou None para buscar em todos.
+        """
+        arquivos = self.centroides.arquivos
+        if len(arquivos) < 2:
+            return None
+        with span("chat.roteamento", arquivos=len(arquivos)) as etapa:
+            explicitos, mencionados = arquivos_citados(consulta, arquivos)
+            if explicitos:
+                etapa.definir(criterio="nome", escolhidos=len(explicitos))
+                return explicitos
+            if self.embeddings is None or len(arquivos) <= self.max_arquivos:
+                return None
+            # O embedding da consulta fica no cache e é reaproveitado pela busca vetorial
+            ranking = self.centroides.ranquear(self.embeddings.embed_query(consulta))
+            # Um arquivo mencionado entra na busca sem excluir os de centroide mais próximo
+            escolhidos = list(
+                dict.fromkeys(
+                    mencionados
+                    + [arquivo for arquivo, _ in ranking[: self.max_arquivos]]
+                )
+            )
+            etapa.definir(
+                criterio="nome+centroide" if mencionados else "centroide",
+                escolhidos=len(escolhidos),
+            )
+            return escolhidos
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        config = {"callbacks": run_manager.get_child()}
+        arquivos = self.rotear(query)
+        if not arquivos:
+            return self.retriever.invoke(query, config)
+        filtro = (
+            {"Arquivo": arquivos[0]}
+            if len(arquivos) == 1
+            else {"Arquivo": {"$in": arquivos}}
+        )
+        return self.retriever.invoke(query, config, filter=filtro)
@@ -0,0 +1,48 @@
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.prompts import MessagesPlaceholder
+import os
+
+# Mantém o início do prompt idêntico entre turnos e etapas, para o Ollama reaproveitar o cache de KV do prefixo
+PROMPT_PREFIXO_ESTAVEL = os.getenv("PROMPT_PREFIXO_ESTAVEL", "1") == "1"
+
+
+def montar_prompt(
+    instrucoes: str = None,
+    pergunta: str = "{input}",
+    prefixo_estavel: bool = None,
+) -> ChatPromptTemplate:
+    """
+    Monta o prompt de uma etapa do chat (resposta, reformulação, resposta com contexto, ferramenta do CSV).
+
+    Com o prefixo estável, o prompt começa pelo histórico da sessão, que só cresce no fim (prompt de sistema
+    base, registro dos arquivos carregados, resumo e turnos anteriores), e as instruções da etapa e o conteúdo
+    volátil (ex.: o contexto recuperado) vão na última mensagem, junto com a pergunta. Assim todas as etapas e
+    turnos compartilham o mesmo início e o Ollama só processa o que mudou desde a chamada anterior.
+    Sem ele, as instruções vão em uma mensagem de sistema antes do histórico (layout anterior).
+
+    instrucoes: instruções da etapa (podem conter variáveis, ex.: "{context}"); None para nenhuma.
+    pergunta: modelo da mensagem com a pergunta do usuário.
+    prefixo_estavel: sobrepõe PROMPT_PREFIXO_ESTAVEL.
+
+    return: ChatPromptTemplate com as variáveis `chat_history`, `input` e as das instruções.
+    """
+    if prefixo_estavel is None:
+        prefixo_estavel = PROMPT_PREFIXO_ESTAVEL
+    if not instrucoes:
+        return ChatPromptTemplate.from_messages(
+            [MessagesPlaceholder("chat_history"), ("human", pergunta)]
+        )
+    if prefixo_estavel:
+        return ChatPromptTemplate.from_messages(
+            [
+                MessagesPlaceholder("chat_history"),
+                ("human", f"{instrucoes}\n\nPergunta: {pergunta}"),
+            ]
+        )
+    return ChatPromptTemplate.from_messages(
+        [
+            ("system", instrucoes),
+            MessagesPlaceholder("chat_history"),
+            ("human", pergunta),
+        ]
+    )
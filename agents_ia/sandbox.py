@@ -0,0 +1,334 @@
+from agents_ia.columnar import (
+    COLUNAR_DIR,
+    abrir_sidecar,
+    liberar_sidecar,
+    limitar_sidecars,
+    reservar_sidecar,
+    tocar_sidecar,
+)
+from typing import List, Optional
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import weakref
+
+# Execução das ferramentas do modo CSV em processos separados, com limites por chamada
+CSV_SANDBOX = os.getenv("CSV_SANDBOX", "1") == "1"
+CSV_SANDBOX_PROCESSOS = int(os.getenv("CSV_SANDBOX_PROCESSOS", "2"))
+CSV_SANDBOX_TEMPO_CPU = int(os.getenv("CSV_SANDBOX_TEMPO_CPU", "20"))
+CSV_SANDBOX_TIMEOUT = float(os.getenv("CSV_SANDBOX_TIMEOUT", "60"))
+CSV_SANDBOX_MEMORIA_MB = int(os.getenv("CSV_SANDBOX_MEMORIA_MB", "1024"))
+CSV_SANDBOX_MAX_CARACTERES = int(os.getenv("CSV_SANDBOX_MAX_CARACTERES", "8000"))
+# Tempo máximo para um worker importar o pandas e abrir o DataFrame
+CSV_SANDBOX_TIMEOUT_INICIO = float(os.getenv("CSV_SANDBOX_TIMEOUT_INICIO", "120"))
+
+
+class TempoCPUExcedido(Exception):
+    pass
+
+
+def _tempo_esgotado(signum, frame):
+    raise TempoCPUExcedido("a execução excedeu o limite de tempo de CPU.")
+
+
+def truncar_resultado(texto: str, max_caracteres: int) -> str:
+    """
+    Limita o tamanho do resultado devolvido ao modelo, mantendo o início e o fim do texto.
+
+    texto: resultado da execução.
+    max_caracteres: tamanho máximo do texto devolvido.
+
+    return: texto original ou truncado, com a indicação do tamanho original.
+    """
+    if len(texto) <= max_caracteres:
+        return texto
+    fim = max_caracteres // 4
+    return (
+        f"{texto[: max_caracteres - fim]}\n"
+        f"... [saída truncada: {len(texto)} caracteres no total] ...\n"
+        f"{texto[-fim:]}"
+    )
+
+
+def _memoria_privada(pid: int) -> Optional[int]:
+    # Memória residente sem as páginas compartilhadas (ex.: o sidecar mapeado), lida do /proc
+    try:
+        with open(f"/proc/{pid}/statm") as arquivo:
+            campos = arquivo.read().split()
+        return (int(campos[1]) - int(campos[2])) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def preparar_sidecar(df, chave: str, pasta: str = COLUNAR_DIR) -> Optional[str]:
+    """
+    Grava o DataFrame como um arquivo Arrow IPC (uma única vez por conteúdo), para que os workers
+    o abram mapeado em memória em vez de recebê-lo serializado.
+
+    df: pandas.DataFrame carregado do CSV.
+    chave: SHA-256 do conteúdo do arquivo, usado para nomear o sidecar.
+    pasta: diretório onde o sidecar é gravado.
+
+    return: caminho do sidecar, ou None se o DataFrame não puder ser convertido para Arrow.
+    """
+    import pyarrow as pa
+
+    destino = os.path.join(pasta, f"{chave}.df.arrow")
+    if os.path.exists(destino):
+        tocar_sidecar(destino)
+        return destino
+    os.makedirs(pasta, exist_ok=True)
+    temporario = f"{destino}.{os.getpid()}.tmp"
+    try:
+        tabela = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.ipc.new_file(temporario, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+        os.replace(temporario, destino)
+    except (pa.ArrowException, TypeError, ValueError, OSError) as e:
+        print(f"DataFrame não convertido para Arrow, sandbox desativado: {e}")
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        return None
+    limitar_sidecars(pasta, manter=destino)
+    return destino
+
+
+def _executar_worker(conexao, sidecar: str, tempo_cpu: int, max_caracteres: int):
+    """
+    Laço do processo worker: abre o DataFrame mapeado em memória uma única vez e executa cada código
+    recebido pela conexão com o PythonAstREPLTool, sob o limite de tempo de CPU (RLIMIT_CPU).
+    Cada chamada parte de uma cópia rasa do DataFrame original (copy-on-write), então alterações
+    feitas por uma chamada não vazam para as seguintes nem para os outros workers.
+
+    conexao: ponta do Pipe ligada ao processo principal.
+    sidecar: caminho do arquivo Arrow com o DataFrame.
+    tempo_cpu: segundos de CPU permitidos por chamada.
+    max_caracteres: tamanho máximo do resultado devolvido.
+
+    return: None
+    """
+    # Ctrl+C no terminal é tratado pelo processo principal, que encerra os workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        _servir(conexao, sidecar, tempo_cpu, max_caracteres)
+    except (EOFError, OSError):
+        # O processo principal encerrou e a conexão foi fechada
+        return
+
+
+def _servir(conexao, sidecar: str, tempo_cpu: int, max_caracteres: int):
+    try:
+        import pandas as pd
+        from langchain_experimental.tools import PythonAstREPLTool
+
+        pd.set_option("mode.copy_on_write", True)
+        df = abrir_sidecar(sidecar)
+    except Exception as e:
+        conexao.send(("erro", f"{type(e).__name__}: {e}"))
+        return
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None and hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _tempo_esgotado)
+    else:
+        resource = None
+    conexao.send(("pronto", None))
+
+    while True:
+        codigo = conexao.recv()
+        if codigo is None:
+            return
+        try:
+            if resource is not None:
+                # O RLIMIT_CPU é acumulado pelo processo: o limite da chamada é o uso atual mais `tempo_cpu`
+                uso = resource.getrusage(resource.RUSAGE_SELF)
+                _, maximo = resource.getrlimit(resource.RLIMIT_CPU)
+                limite = int(uso.ru_utime + uso.ru_stime) + tempo_cpu + 1
+                if maximo != resource.RLIM_INFINITY:
+                    limite = min(limite, maximo)
+                resource.setrlimit(resource.RLIMIT_CPU, (limite, maximo))
+            ferramenta = PythonAstREPLTool(locals={"df": df.copy(deep=False)})
+            resultado = str(ferramenta.run(codigo))
+        except Exception as e:
+            resultado = f"{type(e).__name__}: {e}"
+        finally:
+            if resource is not None:
+                _, maximo = resource.getrlimit(resource.RLIMIT_CPU)
+                resource.setrlimit(resource.RLIMIT_CPU, (maximo, maximo))
+        conexao.send(truncar_resultado(resultado, max_caracteres))
+
+
+class _Worker:
+    def __init__(self, contexto, sidecar: str, tempo_cpu: int, max_caracteres: int):
+        self.conexao, filho = contexto.Pipe()
+        self.processo = contexto.Process(
+            target=_executar_worker,
+            args=(filho, sidecar, tempo_cpu, max_caracteres),
+            name="csv-sandbox",
+            daemon=True,
+        )
+        self.processo.start()
+        filho.close()
+        self.pronto = False
+
+    def aguardar_pronto(self, timeout: float):
+        if self.pronto:
+            return
+        if not self.conexao.poll(timeout):
+            raise TimeoutError("o worker do sandbox não ficou pronto a tempo.")
+        estado, erro = self.conexao.recv()
+        if estado != "pronto":
+            raise RuntimeError(f"falha ao iniciar o worker do sandbox: {erro}")
+        self.pronto = True
+
+    def encerrar(self):
+        if self.processo.is_alive():
+            self.processo.kill()
+        self.processo.join(timeout=5)
+        self.conexao.close()
+
+
+def _encerrar_workers(workers: List[_Worker], lock: threading.Lock, sidecar: str):
+    with lock:
+        ativos = list(workers)
+    for worker in ativos:
+        worker.encerrar()
+    liberar_sidecar(sidecar)
+
+
+class ExecutorSandbox:
+    def __init__(
+        self,
+        sidecar: str,
+        processos: int = CSV_SANDBOX_PROCESSOS,
+        tempo_cpu: int = CSV_SANDBOX_TEMPO_CPU,
+        timeout: float = CSV_SANDBOX_TIMEOUT,
+        memoria_mb: int = CSV_SANDBOX_MEMORIA_MB,
+        max_caracteres: int = CSV_SANDBOX_MAX_CARACTERES,
+    ):
+        """
+        Pool de processos pré-aquecidos que executam o código pandas gerado pelo modelo fora do processo
+        do Streamlit. Cada worker abre o DataFrame do sidecar Arrow mapeado em memória (as páginas são
+        compartilhadas pelo sistema operacional, sem serializar o DataFrame a cada chamada).
+        Por chamada são aplicados: limite de tempo de CPU (no worker), tempo máximo de espera e limite de
+        memória privada (verificados pelo processo principal, que encerra e recria o worker que os exceder)
+        e truncamento do resultado.
+        Os workers são encerrados por `fechar()` ou, se ele não for chamado, quando o executor é coletado
+        pelo garbage collector (ex.: sessão do Streamlit encerrada).
+
+        sidecar: caminho do arquivo Arrow com o DataFrame.
+        processos: quantidade de workers (chamadas simultâneas).
+        tempo_cpu: segundos de CPU permitidos por chamada.
+        timeout: segundos de execução por chamada (a espera por um worker livre tem o mesmo limite).
+        memoria_mb: memória privada máxima de um worker durante a chamada, em MB.
+        max_caracteres: tamanho máximo do resultado devolvido ao modelo.
+
+        return: None
+        """
+        self.sidecar = sidecar
+        self.tempo_cpu = tempo_cpu
+        self.timeout = timeout
+        self.memoria_bytes = memoria_mb * 1024 * 1024
+        self.max_caracteres = max_caracteres
+        self.execucoes = 0
+        self.reinicios = 0
+        self._contexto = multiprocessing.get_context("spawn")
+        self._livres = queue.Queue()
+        self._workers: List[_Worker] = []
+        self._fechado = False
+        self._lock = threading.Lock()
+        # Workers recriados reabrem o sidecar pelo caminho: ele não pode sair do cache enquanto o executor existir
+        reservar_sidecar(sidecar)
+        self._finalizar = weakref.finalize(
+            self, _encerrar_workers, self._workers, self._lock, sidecar
+        )
+        for _ in range(max(1, processos)):
+            worker = self._novo_worker()
+            self._livres.put(worker)
+
+    def _novo_worker(self) -> _Worker:
+        worker = _Worker(
+            self._contexto, self.sidecar, self.tempo_cpu, self.max_caracteres
+        )
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _substituir(self, worker: _Worker) -> _Worker:
+        # Encerra o worker que excedeu um limite (ou morreu) e inicia outro no lugar
+        worker.encerrar()
+        with self._lock:
+            self._workers.remove(worker)
+            self.reinicios += 1
+        return self._novo_worker()
+
+    def executar(self, codigo: str) -> str:
+        """
+        Executa o código em um worker livre e devolve o resultado como texto.
+        Falhas e limites excedidos são devolvidos como mensagens de erro, no mesmo formato dos erros
+        do PythonAstREPLTool, para que o modelo possa reagir a eles.
+
+        codigo: código Python gerado pelo modelo.
+
+        return: resultado da execução (truncado em `max_caracteres`).
+        """
+        if self._fechado:
+            raise RuntimeError("o executor do sandbox foi encerrado.")
+        try:
+            worker = self._livres.get(timeout=self.timeout)
+        except queue.Empty:
+            return f"TimeoutError: nenhum worker livre em {self.timeout:.0f}s."
+        try:
+            worker.aguardar_pronto(CSV_SANDBOX_TIMEOUT_INICIO)
+            worker.conexao.send(codigo)
+            inicio = time.monotonic()
+            while not worker.conexao.poll(0.05):
+                if not worker.processo.is_alive():
+                    raise EOFError
+                if time.monotonic() - inicio > self.timeout:
+                    worker = self._substituir(worker)
+                    return (
+                        f"TimeoutError: a execução excedeu {self.timeout:.0f}s "
+                        "e foi interrompida."
+                    )
+                memoria = _memoria_privada(worker.processo.pid)
+                if memoria is not None and memoria > self.memoria_bytes:
+                    worker = self._substituir(worker)
+                    return (
+                        f"MemoryError: a execução excedeu {self.memoria_bytes // 2**20} MB "
+                        "e foi interrompida."
+                    )
+            resultado = worker.conexao.recv()
+            self.execucoes += 1
+            return resultado
+        except (EOFError, OSError, RuntimeError) as e:
+            # Worker que não iniciou ou morreu durante a chamada (ex.: encerrado pelo sistema por falta de memória)
+            worker = self._substituir(worker)
+            return f"RuntimeError: {str(e) or 'o processo de execução foi encerrado'}"
+        finally:
+            if self._fechado:
+                worker.encerrar()
+            else:
+                self._livres.put(worker)
+
+    def fechar(self):
+        """
+        Encerra todos os workers. Chamadas em andamento terminam com erro.
+
+        return: None
+        """
+        self._fechado = True
+        self._finalizar()
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                "workers": len(self._workers),
+                "execucoes": self.execucoes,
+                "reinicios": self.reinicios,
+            }
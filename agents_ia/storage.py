@@ -0,0 +1,581 @@
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import copy
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+
+# Diretório das coleções das sessões (uma subpasta `session_<id>` por sessão)
+CHROMA_STORAGE_DIR = os.getenv("CHROMA_STORAGE_DIR", "./chroma_storage")
+# Sessões sem acesso há mais dias que isso são removidas pela coleta de lixo (0 desativa)
+ARMAZENAMENTO_TTL_DIAS = float(os.getenv("ARMAZENAMENTO_TTL_DIAS", "30"))
+# Espaço máximo das coleções; acima dele as sessões acessadas há mais tempo são removidas (0 desativa)
+ARMAZENAMENTO_MAX_MB = float(os.getenv("ARMAZENAMENTO_MAX_MB", "4096"))
+# Fração de chunks removidos de uma coleção do Chroma a partir da qual ela é compactada
+ARMAZENAMENTO_COMPACTAR_FRACAO = float(
+    os.getenv("ARMAZENAMENTO_COMPACTAR_FRACAO", "0.2")
+)
+# Intervalo da coleta de lixo periódica da API, em segundos (0 desativa)
+ARMAZENAMENTO_INTERVALO_GC = float(os.getenv("ARMAZENAMENTO_INTERVALO_GC", "3600"))
+# Intervalo mínimo entre gravações do manifesto causadas apenas por acessos
+_INTERVALO_ACESSO = 60.0
+
+
+def pasta_sessao(session_id: str, pasta: str = CHROMA_STORAGE_DIR) -> str:
+    """
+    Caminho da coleção persistida de uma sessão.
+
+    session_id: identificador da sessão.
+    pasta: diretório das coleções.
+
+    return: caminho do diretório da sessão.
+    """
+    return f"{pasta}/session_{session_id}"
+
+
+def _tamanho_pasta(caminho: str) -> int:
+    total = 0
+    for raiz, _, arquivos in os.walk(caminho):
+        for nome in arquivos:
+            try:
+                total += os.path.getsize(os.path.join(raiz, nome))
+            except OSError:
+                pass
+    return total
+
+
+def _liberar_chroma(caminho: str):
+    # O Chroma mantém um sistema (com as conexões do SQLite) por diretório no processo; sem descartá-lo, uma
+    # coleção recriada na mesma pasta continuaria gravando no banco apagado. A API pública só limpa o cache
+    # de todos os diretórios (`clear_system_cache`), o que invalidaria as coleções das outras sessões, então
+    # o registro interno é usado, com chromadb fixado em requirements*.txt. Sem ele, nada é feito.
+    modulo = sys.modules.get("chromadb.api.shared_system_client")
+    sistemas = getattr(
+        getattr(modulo, "SharedSystemClient", None), "_identifier_to_system", None
+    )
+    if not isinstance(sistemas, dict):
+        return
+    sistema = sistemas.pop(caminho, None)
+    if sistema is not None:
+        try:
+            sistema.stop()
+        except Exception as e:
+            print(f"Erro ao encerrar o Chroma de '{caminho}': {e}")
+
+
+def _lock_ingestao(session_id: str):
+    # Mesmo lock dos jobs de ingestão da sessão: remoções e compactações não concorrem com gravações
+    from agents_ia.jobs import obter_fila_ingestao
+
+    return obter_fila_ingestao().lock_sessao(session_id)
+
+
+def _esquecer_jobs(session_id: str, hash_arquivo: str = None):
+    # Jobs concluídos do conteúdo removido fariam um reenvio do mesmo arquivo ser ignorado
+    from agents_ia.jobs import obter_fila_ingestao
+
+    obter_fila_ingestao().esquecer(session_id, hash_arquivo)
+
+
+class ArmazenamentoSessoes:
+    def __init__(
+        self,
+        pasta: str = CHROMA_STORAGE_DIR,
+        ttl_dias: float = ARMAZENAMENTO_TTL_DIAS,
+        max_mb: float = ARMAZENAMENTO_MAX_MB,
+        fracao_compactacao: float = ARMAZENAMENTO_COMPACTAR_FRACAO,
+    ):
+        """
+        Gerencia o ciclo de vida das coleções persistidas das sessões com um manifesto (`manifest.json`)
+        que registra, por sessão, o backend, os arquivos indexados (nome, SHA-256 do conteúdo, tamanho e
+        quantidade de chunks), o espaço em disco e o último acesso. Com ele as coleções são reabertas em vez
+        de reprocessadas, as sessões ociosas são removidas por TTL ou cota de disco e as coleções do Chroma
+        são compactadas depois de remoções.
+
+        pasta: diretório das coleções.
+        ttl_dias: dias sem acesso após os quais uma sessão é removida (0 desativa).
+        max_mb: espaço máximo ocupado pelas coleções, em MB (0 desativa).
+        fracao_compactacao: fração de chunks removidos que dispara a compactação de uma coleção do Chroma.
+
+        return: None
+        """
+        self.pasta = pasta
+        self.ttl_segundos = ttl_dias * 86400
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.fracao_compactacao = fracao_compactacao
+        self.caminho_manifesto = os.path.join(pasta, "manifest.json")
+        self._lock = threading.RLock()
+        self._gravado_em = 0.0
+        self._sessoes: Dict[str, dict] = self._ler()
+
+    def _ler(self) -> Dict[str, dict]:
+        if not os.path.exists(self.caminho_manifesto):
+            return {}
+        try:
+            with open(self.caminho_manifesto, "r", encoding="utf-8") as arquivo:
+                return json.load(arquivo).get("sessoes", {})
+        except (OSError, ValueError) as e:
+            # As pastas continuam no disco e são readotadas por `sincronizar`
+            print(f"Manifesto do armazenamento ilegível, recriando: {e}")
+            return {}
+
+    def _gravar(self):
+        os.makedirs(self.pasta, exist_ok=True)
+        temporario = f"{self.caminho_manifesto}.tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            json.dump({"sessoes": self._sessoes}, arquivo, ensure_ascii=False, indent=1)
+        os.replace(temporario, self.caminho_manifesto)
+        self._gravado_em = time.time()
+
+    def sessao(self, session_id: str) -> Optional[dict]:
+        """
+        Retorna uma cópia do registro da sessão no manifesto.
+
+        session_id: identificador da sessão.
+
+        return: dict com o registro, ou None se a sessão não tiver coleção.
+        """
+        with self._lock:
+            registro = self._sessoes.get(str(session_id))
+            return copy.deepcopy(registro) if registro else None
+
+    def sessoes(self) -> Dict[str, dict]:
+        with self._lock:
+            return copy.deepcopy(self._sessoes)
+
+    def arquivo_indexado(self, session_id: str, hash_arquivo: str) -> Optional[str]:
+        """
+        Verifica se um conteúdo já está indexado na coleção da sessão.
+
+        session_id: identificador da sessão.
+        hash_arquivo: SHA-256 do conteúdo do arquivo.
+
+        return: nome com que o conteúdo foi indexado, ou None.
+        """
+        with self._lock:
+            registro = self._sessoes.get(str(session_id)) or {}
+            for nome, arquivo in registro.get("arquivos", {}).items():
+                if arquivo.get("hash") == hash_arquivo:
+                    return nome
+        return None
+
+    def _novo_registro(self, session_id: str, backend: str, agora: float) -> dict:
+        return {
+            "pasta": pasta_sessao(session_id, self.pasta),
+            "backend": backend,
+            "criada_em": agora,
+            "ultimo_acesso": agora,
+            "bytes": 0,
+            "chunks": 0,
+            "chunks_removidos": 0,
+            "arquivos": {},
+        }
+
+    def registrar_arquivos(
+        self,
+        session_id: str,
+        arquivos: List[Tuple[str, Optional[str], int]],
+        backend: str = None,
+    ):
+        """
+        Registra no manifesto os arquivos recém-indexados na coleção da sessão. A quantidade de chunks
+        de cada arquivo vem dos centroides gravados junto da coleção.
+
+        session_id: identificador da sessão.
+        arquivos: lista de tuplas (nome, SHA-256 do conteúdo, tamanho em bytes).
+        backend: vetorstore da coleção ("chroma" ou "flat"); None mantém o já registrado, ou VECTORSTORE_BACKEND.
+
+        return: None
+        """
+        from agents_ia.flat_index import VECTORSTORE_BACKEND
+        from agents_ia.partition import CentroidesArquivos
+
+        session_id = str(session_id)
+        caminho = pasta_sessao(session_id, self.pasta)
+        contagens = CentroidesArquivos.carregar(f"{caminho}/centroides.json").contagens
+        agora = time.time()
+        with self._lock:
+            registro = self._sessoes.get(session_id)
+            if registro is None:
+                registro = self._novo_registro(
+                    session_id, backend or VECTORSTORE_BACKEND, agora
+                )
+                self._sessoes[session_id] = registro
+            for nome, hash_arquivo, tamanho in arquivos:
+                registro["arquivos"][nome] = {
+                    "hash": hash_arquivo,
+                    "bytes": tamanho,
+                    "chunks": contagens.get(nome, 0),
+                    "indexado_em": agora,
+                }
+            if backend:
+                registro["backend"] = backend
+            registro["chunks"] = sum(contagens.values())
+            registro["bytes"] = _tamanho_pasta(caminho)
+            registro["ultimo_acesso"] = agora
+            self._gravar()
+
+    def tocar(self, session_id: str):
+        """
+        Atualiza o último acesso da sessão. O manifesto só é regravado por acessos a cada minuto.
+
+        session_id: identificador da sessão.
+
+        return: None
+        """
+        agora = time.time()
+        with self._lock:
+            registro = self._sessoes.get(str(session_id))
+            if registro is None:
+                return
+            registro["ultimo_acesso"] = agora
+            if agora - self._gravado_em >= _INTERVALO_ACESSO:
+                self._gravar()
+
+    def sincronizar(self, protegidas: Iterable[str] = ()):
+        """
+        Alinha o manifesto com o disco: remove registros cujas pastas não existem mais e adota pastas de
+        sessão sem registro (ex.: criadas por versões anteriores), com os arquivos lidos dos centroides e
+        o último acesso igual à data de modificação da pasta.
+
+        protegidas: sessões em uso (ex.: com ingestão em andamento), que não são adotadas.
+
+        return: None
+        """
+        from agents_ia.partition import CentroidesArquivos
+
+        protegidas = {str(session_id) for session_id in protegidas}
+        pastas = {}
+        if os.path.isdir(self.pasta):
+            for nome in os.listdir(self.pasta):
+                caminho = os.path.join(self.pasta, nome)
+                if nome.startswith("session_") and os.path.isdir(caminho):
+                    pastas[nome[len("session_") :]] = caminho
+        with self._lock:
+            for session_id in list(self._sessoes):
+                if session_id not in pastas and session_id not in protegidas:
+                    del self._sessoes[session_id]
+            for session_id, caminho in pastas.items():
+                if session_id in self._sessoes or session_id in protegidas:
+                    continue
+                contagens = CentroidesArquivos.carregar(
+                    f"{caminho}/centroides.json"
+                ).contagens
+                modificada = os.path.getmtime(caminho)
+                backend = (
+                    "flat"
+                    if os.path.exists(os.path.join(caminho, "flat.json"))
+                    else "chroma"
+                )
+                registro = self._novo_registro(session_id, backend, modificada)
+                registro["arquivos"] = {
+                    nome: {
+                        "hash": None,
+                        "bytes": None,
+                        "chunks": chunks,
+                        "indexado_em": modificada,
+                    }
+                    for nome, chunks in contagens.items()
+                }
+                registro["chunks"] = sum(contagens.values())
+                registro["bytes"] = _tamanho_pasta(caminho)
+                self._sessoes[session_id] = registro
+            self._gravar()
+
+    def remover_sessao(self, session_id: str) -> int:
+        """
+        Apaga a coleção da sessão (vetores, índice BM25 e centroides), o seu registro no manifesto e os traces
+        guardados em memória. O histórico de mensagens não é afetado.
+
+        session_id: identificador da sessão.
+
+        return: bytes liberados.
+        """
+        from agents_ia.answer_cache import obter_cache_respostas
+        from agents_ia.tracing import obter_registro_traces
+
+        session_id = str(session_id)
+        caminho = pasta_sessao(session_id, self.pasta)
+        with _lock_ingestao(session_id), self._lock:
+            registro = self._sessoes.pop(session_id, None)
+            _liberar_chroma(caminho)
+            liberados = _tamanho_pasta(caminho)
+            shutil.rmtree(caminho, ignore_errors=True)
+            self._gravar()
+        _esquecer_jobs(session_id)
+        # As respostas em cache foram geradas com os documentos apagados
+        obter_cache_respostas().invalidar(f"session_{session_id}")
+        obter_registro_traces().remover(session_id)
+        if registro is not None or liberados:
+            print(f"Coleção da sessão {session_id} removida ({liberados} bytes).")
+        return liberados
+
+    def coletar_lixo(self, protegidas: Iterable[str] = ()) -> dict:
+        """
+        Remove as coleções das sessões ociosas há mais de `ttl_dias` e, se o total ainda exceder `max_mb`,
+        as das sessões acessadas há mais tempo até voltar abaixo da cota.
+
+        protegidas: sessões em uso no processo, que nunca são removidas (além das com ingestão pendente).
+
+        return: dict com as sessões removidas, os bytes liberados e o estado final.
+        """
+        from agents_ia.jobs import obter_fila_ingestao
+
+        # Sessões com arquivos na fila de ingestão também não são removidas
+        protegidas = {str(session_id) for session_id in protegidas}
+        protegidas.update(obter_fila_ingestao().sessoes_ativas())
+        self.sincronizar(protegidas)
+        agora = time.time()
+        with self._lock:
+            candidatas = sorted(
+                (
+                    (registro["ultimo_acesso"], session_id, registro["bytes"])
+                    for session_id, registro in self._sessoes.items()
+                    if session_id not in protegidas
+                ),
+            )
+            total = sum(registro["bytes"] for registro in self._sessoes.values())
+        removidas = []
+        liberados = 0
+        for ultimo_acesso, session_id, tamanho in candidatas:
+            expirada = self.ttl_segundos and agora - ultimo_acesso > self.ttl_segundos
+            excedente = self.max_bytes and total > self.max_bytes
+            if not (expirada or excedente):
+                # Ordenadas por acesso: as seguintes também estão dentro do TTL
+                break
+            liberados += self.remover_sessao(session_id)
+            total -= tamanho
+            removidas.append(session_id)
+        resultado = {
+            "removidas": removidas,
+            "bytes_liberados": liberados,
+            **self.estatisticas(),
+        }
+        print(f"Coleta de lixo do armazenamento: {resultado}")
+        return resultado
+
+    def remover_arquivo(self, session_id: str, nome: str) -> int:
+        """
+        Remove de uma coleção os chunks de um arquivo (vetorstore, índice BM25 e centroide) e o registro
+        do arquivo no manifesto. Coleções do Chroma são compactadas quando os chunks removidos desde a última
+        compactação passam de `fracao_compactacao`; o FlatVectorStore já é regravado sem as linhas removidas.
+        Retrievers abertos antes da remoção devem ser recriados (ver `restaurar_sessao`).
+
+        session_id: identificador da sessão.
+        nome: nome do arquivo (metadado "Arquivo").
+
+        return: quantidade de chunks removidos.
+        """
+        from agents_ia.answer_cache import obter_cache_respostas
+        from agents_ia.bm25 import IndiceBM25
+        from agents_ia.embedding import EmbeddingProcessor
+        from agents_ia.partition import CentroidesArquivos
+
+        session_id = str(session_id)
+        with _lock_ingestao(session_id):
+            registro = self.sessao(session_id)
+            if registro is None or nome not in registro["arquivos"]:
+                raise KeyError(
+                    f"Arquivo '{nome}' não encontrado na sessão {session_id}."
+                )
+            processor = EmbeddingProcessor(
+                data=None, session_id=session_id, backend=registro["backend"]
+            )
+            filtro = {"Arquivo": nome}
+            vectorstore = processor._abrir_vectorstore()
+            if registro["backend"] == "flat":
+                removidos = vectorstore.remover(filtro)
+            else:
+                ids = vectorstore.get(where=filtro, include=[])["ids"]
+                if ids:
+                    vectorstore.delete(ids=ids)
+                removidos = len(ids)
+
+            indice = IndiceBM25.carregar(processor.bm25_path)
+            indice.remover(filtro)
+            indice.salvar(processor.bm25_path)
+            centroides = CentroidesArquivos.carregar(processor.centroides_path)
+            centroides.remover(nome)
+            centroides.salvar(processor.centroides_path)
+            obter_cache_respostas().invalidar(processor.collection_name)
+
+            with self._lock:
+                atual = self._sessoes.get(session_id)
+                if atual is not None:
+                    atual["arquivos"].pop(nome, None)
+                    atual["chunks"] = max(0, atual["chunks"] - removidos)
+                    if registro["backend"] != "flat":
+                        atual["chunks_removidos"] += removidos
+                    atual["ultimo_acesso"] = time.time()
+                    vivos = atual["chunks"] + atual["chunks_removidos"]
+                    compactar = (
+                        atual["chunks_removidos"]
+                        and vivos
+                        and atual["chunks_removidos"] / vivos >= self.fracao_compactacao
+                    )
+                else:
+                    compactar = False
+            if compactar:
+                self.compactar(session_id)
+            with self._lock:
+                if session_id in self._sessoes:
+                    self._sessoes[session_id]["bytes"] = _tamanho_pasta(
+                        processor.persist_path
+                    )
+                self._gravar()
+        _esquecer_jobs(session_id, registro["arquivos"][nome]["hash"])
+        print(f"'{nome}' removido da sessão {session_id}: {removidos} chunks.")
+        return removidos
+
+    def compactar(self, session_id: str) -> int:
+        """
+        Reconstrói a coleção do Chroma da sessão só com os chunks atuais (sem recalcular embeddings),
+        apaga o índice HNSW da coleção anterior e executa VACUUM no banco, devolvendo ao disco o espaço
+        dos chunks removidos. Vetorstores abertos antes da compactação devem ser reabertos.
+
+        session_id: identificador da sessão.
+
+        return: bytes liberados.
+        """
+        session_id = str(session_id)
+        with _lock_ingestao(session_id):
+            registro = self.sessao(session_id)
+            if registro is None or registro["backend"] == "flat":
+                return 0
+            import chromadb
+
+            caminho = pasta_sessao(session_id, self.pasta)
+            nome_colecao = f"session_{session_id}"
+            antes = _tamanho_pasta(caminho)
+            # Compartilha o sistema do Chroma já aberto para a pasta pelos vetorstores da sessão
+            cliente = chromadb.PersistentClient(path=caminho)
+            dados = cliente.get_or_create_collection(nome_colecao).get(
+                include=["embeddings", "documents", "metadatas"]
+            )
+            cliente.delete_collection(nome_colecao)
+            colecao = cliente.create_collection(nome_colecao)
+            for inicio in range(0, len(dados["ids"]), 1000):
+                fim = inicio + 1000
+                colecao.add(
+                    ids=dados["ids"][inicio:fim],
+                    embeddings=dados["embeddings"][inicio:fim],
+                    documents=dados["documents"][inicio:fim],
+                    metadatas=dados["metadatas"][inicio:fim],
+                )
+            try:
+                conexao = sqlite3.connect(os.path.join(caminho, "chroma.sqlite3"))
+                segmentos = {
+                    linha[0] for linha in conexao.execute("SELECT id FROM segments")
+                }
+                conexao.execute("VACUUM")
+                conexao.close()
+            except sqlite3.Error as e:
+                print(f"VACUUM não executado na sessão {session_id}: {e}")
+            else:
+                # O Chroma não apaga a pasta do índice HNSW da coleção excluída
+                for nome in os.listdir(caminho):
+                    pasta = os.path.join(caminho, nome)
+                    if os.path.isdir(pasta) and nome not in segmentos:
+                        shutil.rmtree(pasta, ignore_errors=True)
+
+            depois = _tamanho_pasta(caminho)
+            with self._lock:
+                atual = self._sessoes.get(session_id)
+                if atual is not None:
+                    atual["chunks_removidos"] = 0
+                    atual["bytes"] = depois
+                    self._gravar()
+        print(f"Coleção da sessão {session_id} compactada: {antes} -> {depois} bytes.")
+        return max(0, antes - depois)
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                "sessoes": len(self._sessoes),
+                "arquivos": sum(len(r["arquivos"]) for r in self._sessoes.values()),
+                "chunks": sum(r["chunks"] for r in self._sessoes.values()),
+                "bytes": sum(r["bytes"] for r in self._sessoes.values()),
+                "max_bytes": self.max_bytes,
+            }
+
+
+def restaurar_sessao(session_id: str, agente) -> bool:
+    """
+    Reabre a coleção persistida da sessão e coloca o agente no modo RAG, sem reprocessar os arquivos.
+    Com a coleção vazia (todos os arquivos removidos), não altera o agente.
+
+    session_id: identificador da sessão.
+    agente: ChatAgent da sessão.
+
+    return: True se o agente passou a usar a coleção.
+    """
+    armazenamento = obter_armazenamento()
+    registro = armazenamento.sessao(session_id)
+    if not registro or not registro["arquivos"]:
+        return False
+    from agents_ia.embedding import EmbeddingProcessor
+
+    processor = EmbeddingProcessor(data=None, session_id=session_id)
+    agente.trocar_para_rag(processor.obter_retriever())
+    armazenamento.tocar(session_id)
+    print(
+        f"Sessão {session_id} restaurada: {len(registro['arquivos'])} arquivos, "
+        f"{registro['chunks']} chunks."
+    )
+    return True
+
+
+_armazenamento_padrao = None
+_armazenamento_lock = threading.Lock()
+
+
+def obter_armazenamento() -> ArmazenamentoSessoes:
+    """
+    Retorna o gerenciador de armazenamento compartilhado pelo processo, criando-o na primeira chamada.
+
+    return: ArmazenamentoSessoes
+    """
+    global _armazenamento_padrao
+    with _armazenamento_lock:
+        if _armazenamento_padrao is None:
+            _armazenamento_padrao = ArmazenamentoSessoes()
+        return _armazenamento_padrao
+
+
+_coleta_periodica = None
+
+
+def iniciar_coleta_periodica(
+    protegidas: Callable[[], Iterable[str]] = None,
+    intervalo: float = ARMAZENAMENTO_INTERVALO_GC,
+) -> bool:
+    """
+    Inicia, uma vez por processo, uma thread que executa a coleta de lixo do armazenamento a cada
+    `intervalo` segundos. Usada pelo app do Streamlit; a API tem a sua tarefa no ciclo de vida.
+
+    protegidas: função que retorna as sessões em uso no momento da coleta (opcional).
+    intervalo: segundos entre as coletas (0 desativa).
+
+    return: True se a thread foi iniciada nesta chamada.
+    """
+    global _coleta_periodica
+
+    def coletar():
+        while True:
+            time.sleep(intervalo)
+            try:
+                obter_armazenamento().coletar_lixo(protegidas() if protegidas else ())
+            except Exception as e:
+                print(f"Erro na coleta de lixo do armazenamento: {e}")
+
+    with _armazenamento_lock:
+        if intervalo <= 0 or _coleta_periodica is not None:
+            return False
+        _coleta_periodica = threading.Thread(
+            target=coletar, name="coleta-armazenamento", daemon=True
+        )
+        _coleta_periodica.start()
+    return True
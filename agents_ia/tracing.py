@@ -0,0 +1,428 @@
+from langchain_core.callbacks import BaseCallbackHandler
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import partial
+from typing import (
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+)
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+
+# Instrumentação por etapas; com TRACING=0 os spans viram operações vazias
+TRACING_ATIVO = os.getenv("TRACING", "1") == "1"
+TRACING_LOG_PATH = os.getenv("TRACING_LOG_PATH", "./logs/tracing.jsonl")
+TRACING_MAX_TRACES = int(os.getenv("TRACING_MAX_TRACES", "50"))
+TRACING_MAX_SESSOES = int(os.getenv("TRACING_MAX_SESSOES", "256"))
+
+_trace_atual: ContextVar[Optional["Trace"]] = ContextVar("trace_atual", default=None)
+
+
+class Trace:
+    def __init__(self, tipo: str, **atributos):
+        """
+        Registro de uma execução completa (um turno de chat ou a ingestão de um arquivo).
+        As etapas com o mesmo nome são agregadas: soma de duração, quantidade de chamadas e atributos numéricos.
+
+        tipo: tipo da execução (ex.: "turno", "ingestao").
+        atributos: atributos da execução (ex.: session_id, modo, arquivo).
+
+        return: None
+        """
+        self.id = uuid.uuid4().hex
+        self.tipo = tipo
+        self.atributos = atributos
+        self.etapas: Dict[str, dict] = OrderedDict()
+        self.inicio = time.time()
+        self._inicio_relogio = time.perf_counter()
+        self.duracao = None
+        self._lock = threading.Lock()
+
+    def registrar(self, nome: str, segundos: float, **atributos):
+        """
+        Soma a duração e os atributos de uma ocorrência da etapa `nome`.
+        Pode ser chamado de qualquer thread.
+
+        nome: nome da etapa (ex.: "loader.parse", "chat.geracao").
+        segundos: duração da ocorrência.
+        atributos: atributos numéricos são somados; os demais substituem o valor anterior.
+
+        return: None
+        """
+        with self._lock:
+            etapa = self.etapas.setdefault(nome, {"segundos": 0.0, "chamadas": 0})
+            etapa["segundos"] += segundos
+            etapa["chamadas"] += 1
+            _somar(etapa, atributos)
+
+    def anotar(self, **atributos):
+        with self._lock:
+            _somar(self.atributos, atributos)
+
+    def finalizar(self):
+        self.duracao = time.perf_counter() - self._inicio_relogio
+
+    def para_dict(self) -> dict:
+        with self._lock:
+            return {
+                "id": self.id,
+                "tipo": self.tipo,
+                "inicio": self.inicio,
+                "duracao": self.duracao,
+                **self.atributos,
+                "etapas": {nome: dict(etapa) for nome, etapa in self.etapas.items()},
+            }
+
+
+def _somar(destino: dict, atributos: dict):
+    for chave, valor in atributos.items():
+        if (
+            isinstance(valor, (int, float))
+            and not isinstance(valor, bool)
+            and isinstance(destino.get(chave), (int, float))
+        ):
+            destino[chave] += valor
+        else:
+            destino[chave] = valor
+
+
+class _Span:
+    __slots__ = ("trace", "nome", "atributos", "inicio")
+
+    def __init__(self, trace: Trace, nome: str, atributos: dict):
+        self.trace = trace
+        self.nome = nome
+        self.atributos = atributos
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.trace.registrar(
+            self.nome, time.perf_counter() - self.inicio, **self.atributos
+        )
+        return False
+
+    def definir(self, **atributos):
+        self.atributos.update(atributos)
+
+
+class _SpanNulo:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def definir(self, **atributos):
+        pass
+
+
+_SPAN_NULO = _SpanNulo()
+
+
+def trace_atual() -> Optional[Trace]:
+    return _trace_atual.get()
+
+
+def span(nome: str, **atributos):
+    """
+    Mede a duração do bloco como uma ocorrência da etapa `nome` do trace corrente.
+    Fora de um trace (ou com o tracing desativado) devolve um span vazio, sem custo de medição.
+
+    nome: nome da etapa.
+    atributos: atributos iniciais; outros podem ser adicionados com `definir()` dentro do bloco.
+
+    return: context manager do span.
+    """
+    trace = _trace_atual.get()
+    if trace is None:
+        return _SPAN_NULO
+    return _Span(trace, nome, atributos)
+
+
+def anotar(**atributos):
+    """
+    Adiciona atributos ao trace corrente (numéricos são somados), se houver.
+
+    return: None
+    """
+    trace = _trace_atual.get()
+    if trace is not None:
+        trace.anotar(**atributos)
+
+
+def medir_iterador(nome: str, itens: Iterable, tamanho: Callable = None) -> Iterator:
+    """
+    Mede o tempo gasto para produzir cada item de um iterador preguiçoso (ex.: páginas de um PDF),
+    acumulando-o na etapa `nome` do trace corrente.
+
+    nome: nome da etapa.
+    itens: iterável a ser medido.
+    tamanho: função opcional que recebe o item e devolve seu tamanho (somado em "caracteres").
+
+    return: iterador com os mesmos itens.
+    """
+    trace = _trace_atual.get()
+    if trace is None:
+        return iter(itens)
+    return _medir_iterador(trace, nome, iter(itens), tamanho)
+
+
+def _medir_iterador(trace: Trace, nome: str, iterador: Iterator, tamanho: Callable):
+    while True:
+        inicio = time.perf_counter()
+        try:
+            item = next(iterador)
+        except StopIteration:
+            return
+        atributos = {"itens": 1}
+        if tamanho is not None:
+            atributos["caracteres"] = tamanho(item)
+        trace.registrar(nome, time.perf_counter() - inicio, **atributos)
+        yield item
+
+
+def no_contexto(funcao: Callable) -> Callable:
+    """
+    Prende a função ao contexto corrente, para que spans abertos em outra thread
+    (ex.: ThreadPoolExecutor) sejam registrados no mesmo trace.
+
+    funcao: função a ser executada em outra thread.
+
+    return: função equivalente que roda em uma cópia do contexto atual.
+    """
+    if _trace_atual.get() is None:
+        return funcao
+    return partial(copy_context().run, funcao)
+
+
+def em_contexto_proprio(gerador: Iterator) -> Iterator:
+    """
+    Executa cada passo do gerador em uma cópia do contexto de quem o criou. Assim um trace aberto
+    dentro do gerador (ex.: `responder_stream`) não fica definido no contexto do consumidor entre os
+    `yield`s, nem depois, se o consumidor abandonar a iteração (rerun do Streamlit, cliente desconectado).
+
+    gerador: gerador ainda não iniciado.
+
+    return: iterador com os mesmos itens.
+    """
+    contexto = copy_context()
+    try:
+        while True:
+            try:
+                item = contexto.run(next, gerador)
+            except StopIteration:
+                return
+            yield item
+    finally:
+        # Fecha o gerador no próprio contexto, para que o trace seja finalizado e registrado
+        contexto.run(gerador.close)
+
+
+async def aem_contexto_proprio(gerador: AsyncIterator) -> AsyncIterator:
+    """
+    Versão assíncrona de `em_contexto_proprio`: cada passo roda em uma task com a cópia do contexto.
+
+    gerador: gerador assíncrono ainda não iniciado.
+
+    return: iterador assíncrono com os mesmos itens.
+    """
+    contexto = copy_context()
+    try:
+        while True:
+            try:
+                item = await asyncio.create_task(gerador.__anext__(), context=contexto)
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        await asyncio.create_task(gerador.aclose(), context=contexto)
+
+
+class ContadorTokens(BaseCallbackHandler):
+    def __init__(self, trace: Trace):
+        """
+        Callback que registra no trace a duração e os tokens de prompt e de resposta de cada chamada ao LLM,
+        a partir do `usage_metadata` devolvido pelo Ollama, e o tempo de processamento do prompt
+        (`prompt_eval_duration`), que cai quando o Ollama reaproveita o prefixo da chamada anterior.
+
+        trace: trace onde as chamadas são registradas.
+
+        return: None
+        """
+        self.trace = trace
+        self._inicios = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._inicios[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._inicios[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        inicio = self._inicios.pop(run_id, None)
+        tokens_prompt = tokens_resposta = 0
+        segundos_prompt = 0.0
+        for geracoes in response.generations:
+            for geracao in geracoes:
+                mensagem = getattr(geracao, "message", None)
+                uso = getattr(mensagem, "usage_metadata", None)
+                if uso:
+                    tokens_prompt += uso.get("input_tokens", 0)
+                    tokens_resposta += uso.get("output_tokens", 0)
+                # Durações do Ollama em nanossegundos
+                metadados = getattr(mensagem, "response_metadata", None) or {}
+                segundos_prompt += (metadados.get("prompt_eval_duration") or 0) / 1e9
+        self.trace.registrar(
+            "llm",
+            time.perf_counter() - inicio if inicio is not None else 0.0,
+            tokens_prompt=tokens_prompt,
+            tokens_resposta=tokens_resposta,
+            segundos_prompt=segundos_prompt,
+        )
+        self.trace.anotar(
+            tokens_prompt=tokens_prompt,
+            tokens_resposta=tokens_resposta,
+            segundos_prompt=segundos_prompt,
+        )
+
+
+def callbacks_trace() -> List[BaseCallbackHandler]:
+    """
+    Callbacks a serem passados no `config` das chamadas ao LangChain para contar tokens no trace corrente.
+
+    return: lista de callbacks (vazia fora de um trace).
+    """
+    trace = _trace_atual.get()
+    return [ContadorTokens(trace)] if trace is not None else []
+
+
+class RegistroTraces:
+    def __init__(
+        self,
+        caminho_log: str = TRACING_LOG_PATH,
+        max_traces: int = TRACING_MAX_TRACES,
+        max_sessoes: int = TRACING_MAX_SESSOES,
+    ):
+        """
+        Guarda os traces finalizados por sessão (os `max_traces` mais recentes), os totais acumulados
+        por etapa e anexa cada trace como uma linha JSON em `caminho_log` para análise offline.
+        Apenas as `max_sessoes` sessões com traces mais recentes são mantidas em memória (LRU).
+
+        caminho_log: arquivo JSONL de saída (vazio desativa o log).
+        max_traces: quantidade de traces recentes mantidos em memória por sessão.
+        max_sessoes: quantidade máxima de sessões mantidas em memória.
+
+        return: None
+        """
+        self.caminho_log = caminho_log
+        self.max_traces = max_traces
+        self.max_sessoes = max_sessoes
+        self._traces = OrderedDict()
+        self._totais = OrderedDict()
+        self._lock = threading.Lock()
+        if caminho_log and os.path.dirname(caminho_log):
+            os.makedirs(os.path.dirname(caminho_log), exist_ok=True)
+
+    def registrar(self, trace: Trace):
+        dados = trace.para_dict()
+        session_id = str(dados.get("session_id"))
+        with self._lock:
+            self._traces.setdefault(session_id, deque(maxlen=self.max_traces)).append(
+                dados
+            )
+            totais = self._totais.setdefault(
+                session_id, {"execucoes": 0, "segundos": 0.0, "etapas": OrderedDict()}
+            )
+            totais["execucoes"] += 1
+            totais["segundos"] += dados["duracao"] or 0.0
+            for chave in ("tokens_prompt", "tokens_resposta"):
+                totais[chave] = totais.get(chave, 0) + dados.get(chave, 0)
+            for nome, etapa in dados["etapas"].items():
+                acumulado = totais["etapas"].setdefault(
+                    nome, {"segundos": 0.0, "chamadas": 0}
+                )
+                _somar(acumulado, etapa)
+            self._traces.move_to_end(session_id)
+            self._totais.move_to_end(session_id)
+            while len(self._traces) > self.max_sessoes:
+                antiga, _ = self._traces.popitem(last=False)
+                self._totais.pop(antiga, None)
+            if self.caminho_log:
+                with open(self.caminho_log, "a", encoding="utf-8") as arquivo:
+                    arquivo.write(
+                        json.dumps(dados, ensure_ascii=False, default=str) + "\n"
+                    )
+
+    def ultimos(self, session_id: str, quantidade: int = 1) -> List[dict]:
+        with self._lock:
+            return list(self._traces.get(str(session_id), []))[-quantidade:]
+
+    def totais(self, session_id: str) -> dict:
+        with self._lock:
+            totais = self._totais.get(str(session_id))
+            return json.loads(json.dumps(totais)) if totais else {}
+
+    def remover(self, session_id: str):
+        with self._lock:
+            self._traces.pop(str(session_id), None)
+            self._totais.pop(str(session_id), None)
+
+
+_registro_padrao = None
+_registro_lock = threading.Lock()
+
+
+def obter_registro_traces() -> RegistroTraces:
+    """
+    Retorna o registro de traces compartilhado pelo processo, criando-o na primeira chamada.
+
+    return: RegistroTraces
+    """
+    global _registro_padrao
+    with _registro_lock:
+        if _registro_padrao is None:
+            _registro_padrao = RegistroTraces()
+        return _registro_padrao
+
+
+@contextmanager
+def iniciar_trace(tipo: str, **atributos):
+    """
+    Abre um trace como contexto corrente; ao sair, ele é finalizado e entregue ao registro do processo.
+    Com o tracing desativado, ou dentro de outro trace, não cria nada novo.
+
+    tipo: tipo da execução (ex.: "turno", "ingestao").
+    atributos: atributos da execução (use `session_id` para agrupar por sessão).
+
+    return: context manager que produz o Trace (ou None).
+    """
+    if not TRACING_ATIVO or _trace_atual.get() is not None:
+        yield _trace_atual.get()
+        return
+    trace = Trace(tipo, **atributos)
+    token = _trace_atual.set(trace)
+    try:
+        yield trace
+    finally:
+        try:
+            _trace_atual.reset(token)
+        except ValueError:
+            # Geradores abandonados podem ser finalizados em outro contexto
+            _trace_atual.set(None)
+        trace.finalizar()
+        obter_registro_traces().registrar(trace)
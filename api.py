@@ -0,0 +1,286 @@
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from agents_ia.chat import ChatAgent
+from agents_ia.embedding_batcher import estatisticas_batchers
+from agents_ia.jobs import JobIngestao, enviar_arquivos, obter_fila_ingestao
+from agents_ia.memory import get_session_history
+from agents_ia.storage import (
+    ARMAZENAMENTO_INTERVALO_GC,
+    obter_armazenamento,
+    restaurar_sessao,
+)
+from LLM.local_llm import estatisticas_limites
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+import asyncio
+import json
+import os
+import uuid
+
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORTA = int(os.getenv("API_PORTA", "8000"))
+# Quantidade máxima de agentes de sessão mantidos em memória (LRU); o histórico continua no store
+API_MAX_SESSOES = int(os.getenv("API_MAX_SESSOES", "500"))
+
+
+class SessoesAPI:
+    def __init__(self, max_sessoes: int = API_MAX_SESSOES):
+        """
+        Agentes de chat das sessões atendidas pela API, um por sessão, com um lock por sessão
+        para que os turnos de uma mesma conversa não se misturem no histórico.
+        O histórico fica no store compartilhado de `agents_ia/memory.py` e os documentos na coleção persistida
+        da sessão; um agente descartado da memória é recriado a partir deles (ver `restaurar_sessao`).
+
+        max_sessoes: quantidade máxima de agentes mantidos (LRU).
+
+        return: None
+        """
+        self.max_sessoes = max_sessoes
+        self._agentes: OrderedDict = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def obter(self, session_id: str) -> ChatAgent:
+        agente = self._agentes.get(session_id)
+        if agente is not None:
+            self._agentes.move_to_end(session_id)
+            return agente
+        agente = ChatAgent()
+        self._agentes[session_id] = agente
+        self._locks.setdefault(session_id, asyncio.Lock())
+        while len(self._agentes) > self.max_sessoes:
+            antigo_id, antigo = self._agentes.popitem(last=False)
+            self._fechar(antigo_id, antigo)
+        return agente
+
+    def descartar(self, session_id: str):
+        """
+        Remove o agente da sessão da memória; o próximo acesso cria um novo a partir do armazenamento.
+
+        session_id: identificador da sessão.
+
+        return: None
+        """
+        agente = self._agentes.pop(session_id, None)
+        if agente is not None:
+            self._fechar(session_id, agente)
+
+    def _fechar(self, session_id: str, agente: ChatAgent):
+        if session_id in self._locks and not self._locks[session_id].locked():
+            del self._locks[session_id]
+        agente.fechar()
+
+    def ids(self) -> List[str]:
+        return list(self._agentes)
+
+    def lock(self, session_id: str) -> asyncio.Lock:
+        return self._locks.setdefault(session_id, asyncio.Lock())
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._agentes
+
+    def __len__(self) -> int:
+        return len(self._agentes)
+
+
+class NovaSessao(BaseModel):
+    session_id: Optional[str] = None
+
+
+class Pergunta(BaseModel):
+    pergunta: str
+    stream: bool = True
+
+
+async def _coletar_lixo_periodicamente():
+    # Sessões com agente em memória (em conversa ou com arquivos na fila de ingestão) não são removidas
+    while True:
+        await asyncio.sleep(ARMAZENAMENTO_INTERVALO_GC)
+        try:
+            await asyncio.to_thread(
+                obter_armazenamento().coletar_lixo, protegidas=sessoes.ids()
+            )
+        except Exception as e:
+            print(f"Erro na coleta de lixo do armazenamento: {e}")
+
+
+@asynccontextmanager
+async def _ciclo_de_vida(app: FastAPI):
+    tarefa = None
+    if ARMAZENAMENTO_INTERVALO_GC > 0:
+        tarefa = asyncio.create_task(_coletar_lixo_periodicamente())
+    yield
+    if tarefa is not None:
+        tarefa.cancel()
+
+
+app = FastAPI(title="Assistente Virtual", lifespan=_ciclo_de_vida)
+sessoes = SessoesAPI()
+
+
+def _job_para_dict(job: JobIngestao) -> dict:
+    return {
+        "id": job.id,
+        "arquivo": job.arquivo,
+        "status": job.status,
+        "progresso": job.progresso,
+        "mensagem": job.mensagem,
+        "erro": job.erro,
+        "segundos": job.segundos,
+    }
+
+
+def _evento_sse(dados: dict, evento: str = None) -> str:
+    # Cada evento SSE é uma linha `data:` com JSON (os trechos podem conter quebras de linha)
+    prefixo = f"event: {evento}\n" if evento else ""
+    return f"{prefixo}data: {json.dumps(dados, ensure_ascii=False, default=str)}\n\n"
+
+
+@app.get("/saude")
+async def saude():
+    return {
+        "status": "ok",
+        "sessoes": len(sessoes),
+        "modelos": estatisticas_limites(),
+        "lotes_embedding": estatisticas_batchers(),
+        "ingestao": obter_fila_ingestao().estatisticas(),
+        "armazenamento": await asyncio.to_thread(obter_armazenamento().estatisticas),
+    }
+
+
+async def _agente(session_id: str) -> ChatAgent:
+    # Uma sessão que não está em memória reabre a sua coleção persistida, se houver, antes do primeiro turno
+    if session_id in sessoes:
+        return sessoes.obter(session_id)
+    agente = sessoes.obter(session_id)
+    async with sessoes.lock(session_id):
+        await asyncio.to_thread(restaurar_sessao, session_id, agente)
+    return agente
+
+
+@app.post("/sessoes", status_code=201)
+async def criar_sessao(corpo: NovaSessao = None):
+    session_id = (corpo.session_id if corpo else None) or uuid.uuid4().hex
+    session_id = str(session_id).strip()
+    agente = await _agente(session_id)
+    # Cria (ou recarrega) o histórico no store compartilhado, que pode estar em disco
+    await asyncio.to_thread(get_session_history, session_id)
+    return {"session_id": session_id, "modo": agente._tipo_runnable}
+
+
+@app.get("/sessoes/{session_id}")
+async def estado_sessao(session_id: str):
+    registro = await asyncio.to_thread(obter_armazenamento().sessao, session_id)
+    if session_id not in sessoes and registro is None:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada.")
+    agente = await _agente(session_id)
+    return {
+        "session_id": session_id,
+        "modo": agente._tipo_runnable,
+        "arquivos": (registro or {}).get("arquivos", {}),
+        "jobs": [_job_para_dict(job) for job in obter_fila_ingestao().jobs(session_id)],
+        "metricas": agente.metricas,
+    }
+
+
+@app.post("/sessoes/{session_id}/arquivos", status_code=202)
+async def enviar(session_id: str, arquivos: List[UploadFile] = File(...)):
+    agente = await _agente(session_id)
+    recebidos = []
+    for arquivo in arquivos:
+        if arquivo.filename.split(".")[-1].lower() not in ("pdf", "csv"):
+            raise HTTPException(
+                status_code=415,
+                detail=f"Tipo de arquivo não suportado: '{arquivo.filename}'.",
+            )
+        recebidos.append((arquivo.filename, await arquivo.read()))
+    # O hash do conteúdo é calculado fora do event loop; o processamento segue na fila de ingestão
+    jobs = await asyncio.to_thread(enviar_arquivos, session_id, recebidos, agente)
+    return {"session_id": session_id, "jobs": [_job_para_dict(job) for job in jobs]}
+
+
+@app.delete("/sessoes/{session_id}/arquivos/{arquivo}")
+async def remover_arquivo(session_id: str, arquivo: str):
+    armazenamento = obter_armazenamento()
+    async with sessoes.lock(session_id):
+        try:
+            chunks = await asyncio.to_thread(
+                armazenamento.remover_arquivo, session_id, arquivo
+            )
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=str(e.args[0]))
+        # O retriever aberto foi montado com os documentos removidos: o agente é recriado da coleção atual
+        if session_id in sessoes and sessoes.obter(session_id)._tipo_runnable == "rag":
+            sessoes.descartar(session_id)
+            await asyncio.to_thread(
+                restaurar_sessao, session_id, sessoes.obter(session_id)
+            )
+        registro = await asyncio.to_thread(armazenamento.sessao, session_id)
+    return {
+        "session_id": session_id,
+        "arquivo": arquivo,
+        "chunks_removidos": chunks,
+        "arquivos": list((registro or {}).get("arquivos", {})),
+    }
+
+
+@app.delete("/sessoes/{session_id}")
+async def remover_sessao(session_id: str):
+    async with sessoes.lock(session_id):
+        liberados = await asyncio.to_thread(
+            obter_armazenamento().remover_sessao, session_id
+        )
+        await asyncio.to_thread(get_session_history(session_id).clear)
+        sessoes.descartar(session_id)
+    return {"session_id": session_id, "bytes_liberados": liberados}
+
+
+@app.get("/sessoes/{session_id}/jobs")
+async def listar_jobs(session_id: str):
+    return {
+        "session_id": session_id,
+        "jobs": [_job_para_dict(job) for job in obter_fila_ingestao().jobs(session_id)],
+    }
+
+
+async def _responder(agente: ChatAgent, session_id: str, pergunta: str):
+    # Um turno por vez em cada sessão; o limite por modelo é aplicado a cada requisição ao Ollama
+    async with sessoes.lock(session_id):
+        async for trecho in agente.aresponder_stream(pergunta, session_id):
+            yield trecho
+
+
+async def _eventos_sse(agente: ChatAgent, session_id: str, pergunta: str):
+    try:
+        async for trecho in _responder(agente, session_id, pergunta):
+            yield _evento_sse({"texto": trecho})
+    except Exception as e:
+        yield _evento_sse({"erro": f"{type(e).__name__}: {e}"}, evento="erro")
+        return
+    yield _evento_sse(agente.metricas, evento="fim")
+
+
+@app.post("/sessoes/{session_id}/chat")
+async def conversar(session_id: str, corpo: Pergunta):
+    agente = await _agente(session_id)
+    # O manifesto é gravado em disco: a atualização do último acesso sai do event loop
+    await asyncio.to_thread(obter_armazenamento().tocar, session_id)
+    if corpo.stream:
+        return StreamingResponse(
+            _eventos_sse(agente, session_id, corpo.pergunta),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    partes = [trecho async for trecho in _responder(agente, session_id, corpo.pergunta)]
+    return {
+        "session_id": session_id,
+        "resposta": "".join(partes),
+        "metricas": agente.metricas,
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=API_HOST, port=API_PORTA)
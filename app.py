@@ -1,13 +1,23 @@
 import streamlit as st
 from agents_ia.chat import ChatAgent
-from agents_ia.embedding import EmbeddingProcessor
-from agents_ia.loader import CustomLoader
-from agents_ia.memory import add_system_message
-import os
+from agents_ia.jobs import enviar_arquivos, obter_fila_ingestao
+from agents_ia.embedding_cache import obter_cache_embeddings
+from agents_ia.document_cache import obter_cache_documentos
+from agents_ia.answer_cache import obter_cache_respostas
+from agents_ia.tracing import obter_registro_traces
+from agents_ia.storage import (
+    iniciar_coleta_periodica,
+    obter_armazenamento,
+    restaurar_sessao,
+)
+from LLM.local_llm import estatisticas_clientes
 
 # Define as configurações da página do Streamlit
 st.set_page_config(page_title="Chat com LLaMA3", page_icon="🐉")
 
+# As coleções ociosas ou acima da cota são removidas periodicamente (a thread é iniciada uma vez por processo)
+iniciar_coleta_periodica()
+
 # ---------------------- Inicialização de estado da sessão ----------------------
 
 # Garante que o estado da sessão está definido
@@ -16,19 +26,29 @@ if "session_id" not in st.session_state:
 if "chat_agent" not in st.session_state:
     st.session_state.chat_agent = {}
 if "chat_histories" not in st.session_state:
-    st.session_state.chat_histories = {}
+    # Sessões com coleção persistida de execuções anteriores aparecem na lista desde o início
+    st.session_state.chat_histories = {
+        sid: [] for sid in obter_armazenamento().sessoes()
+    }
 if "embedded_files" not in st.session_state:
     st.session_state.embedded_files = {}
 if "answer" not in st.session_state:
     st.session_state.answer = {}
+if "relatorios_csv" not in st.session_state:
+    st.session_state.relatorios_csv = {}
+if "jobs_notificados" not in st.session_state:
+    st.session_state.jobs_notificados = set()
 
 # Converte session_id para string e inicializa objetos por sessão, se necessário
 st.session_state.session_id = str(st.session_state.session_id)
 session_id = st.session_state.session_id
 if session_id not in st.session_state.chat_agent:
     st.session_state.chat_agent[session_id] = ChatAgent()
+    # Reabre a coleção já indexada da sessão, sem reprocessar os arquivos
+    restaurar_sessao(session_id, st.session_state.chat_agent[session_id])
 if session_id not in st.session_state.embedded_files:
-    st.session_state.embedded_files[session_id] = set()
+    registro = obter_armazenamento().sessao(session_id) or {"arquivos": {}}
+    st.session_state.embedded_files[session_id] = set(registro["arquivos"])
 if session_id not in st.session_state.chat_histories:
     st.session_state.chat_histories[session_id] = []
 
@@ -62,6 +82,47 @@ for sid in st.session_state.chat_histories.keys():
         args=(sid_str,),
     )
 
+# ---------------------- Acompanhamento da ingestão ----------------------
+
+
+def acompanhar_ingestao(sid):
+    """
+    Mostra o progresso dos arquivos em processamento na sessão e, quando um job termina,
+    registra o arquivo na sessão e recarrega a página para exibir o novo estado do chat.
+
+    sid: identificador da sessão de chat.
+
+    return: None
+    """
+    houve_conclusao = False
+    for job in obter_fila_ingestao().jobs(sid):
+        if not job.finalizado:
+            st.progress(job.progresso or 0.0, text=job.mensagem)
+            continue
+        if job.id in st.session_state.jobs_notificados:
+            continue
+        st.session_state.jobs_notificados.add(job.id)
+        houve_conclusao = True
+        if job.status == "erro":
+            conteudo = job.mensagem
+        else:
+            st.session_state.embedded_files[sid].add(job.arquivo)
+            conteudo = f"Arquivo '{job.arquivo}' carregado com sucesso!"
+            relatorio = job.resultado
+            if relatorio:
+                st.session_state.relatorios_csv[job.arquivo] = relatorio
+                conteudo += (
+                    f" Modo colunar: {relatorio['linhas']} linhas, memória "
+                    f"{relatorio['memoria_padrao_bytes'] / 1e6:.1f} MB -> "
+                    f"{relatorio['memoria_compacta_bytes'] / 1e6:.1f} MB"
+                )
+        st.session_state.chat_histories[sid].append(
+            {"role": "system", "content": conteudo}
+        )
+    if houve_conclusao:
+        st.rerun()
+
+
 # ---------------------- Interface principal ----------------------
 
 # Tabs para alternar entre chat e debug
@@ -88,75 +149,42 @@ with tabs[0]:
     for msg in chat_history:
         with st.chat_message(msg["role"]):
             st.markdown(msg["content"])
-    # Processamento de arquivos PDF ou CSV enviados pelo usuário
+    # Arquivos PDF ou CSV enviados vão para a fila de ingestão, sem bloquear o chat
     if prompt and prompt["files"]:
+        agente = st.session_state.chat_agent[session_id]
+        arquivos = []
         for uploaded_file in prompt["files"]:
             filename = uploaded_file.name
-            ext = filename.split(".")[-1].lower()
 
             # Ignora arquivos já embeddados
             if filename in st.session_state.embedded_files[session_id]:
                 continue
 
-            with st.spinner("Vetorizando o arquivo..."):
-                loader = CustomLoader(file=uploaded_file, filename=filename)
-                docs = loader._load()
-                uploaded_file.close()
-
-                # Caso seja PDF, cria o retriever com embeddings e atualiza o agente
-                if ext == "pdf":
-                    processor = EmbeddingProcessor(data=docs, session_id=session_id)
-                    retriever = processor.create_retriever()
-                    st.session_state.chat_agent[session_id].trocar_para_rag(retriever)
-                    st.session_state.embedded_files[session_id].add(filename)
-
-                    add_system_message(
-                        session_id,
-                        f"Voce agora possui conhecimento sobre o arquivo PDF (que podem ser referidos como textos, artigos, etc) de nome: '{filename}'! \nResponda perguntas sobre o conteúdo desse arquivo. \nSe não souber a resposta, seja honesto e proponha caminhos para buscar a informação. \nSe tiver mais de um arquivo, use o nome do arquivo para referenciar o conteúdo que deseja consultar.",
-                    )
-
-                    st.session_state.chat_histories[session_id].append(
-                        {
-                            "role": "system",
-                            "content": f"Arquivo '{filename}' embeddado com sucesso!",
-                        }
-                    )
-                    st.success(f"PDF '{filename}' embeddado com sucesso!")
-
-                # Caso seja CSV, processa com ferramenta de análise de dados
-                elif ext == "csv":
-                    st.session_state.chat_agent[session_id].load_dataframe_tools(
-                        df=docs
-                    )
-                    add_system_message(
-                        session_id,
-                        f"Voce agora possui conhecimento sobre o arquivo CSV de nome: '{filename}'! \nResponda perguntas sobre o conteúdo desse arquivo utilizando apenas python e pandas. \nSe não souber a resposta, seja honesto e proponha caminhos para buscar a informação. \nSe tiver mais de um arquivo, use o nome do arquivo para referenciar o conteúdo que deseja consultar.",
-                    )
-
-                    st.session_state.chat_histories[session_id].append(
-                        {
-                            "role": "system",
-                            "content": f"Arquivo '{filename}' carregado com sucesso!",
-                        }
-                    )
-                    st.success(f"CSV '{filename}' processado com sucesso!")
-            st.session_state.carregando_arquivo = False
+            arquivos.append((filename, uploaded_file.getvalue()))
+            uploaded_file.close()
+
+        if arquivos:
+            enviar_arquivos(session_id, arquivos, agente)
+
+    # Acompanha os jobs da sessão, atualizando a cada segundo enquanto houver algum em andamento
+    pendentes = any(
+        not job.finalizado for job in obter_fila_ingestao().jobs(current_session_id)
+    )
+    st.fragment(acompanhar_ingestao, run_every=1 if pendentes else None)(
+        current_session_id
+    )
     # Processa a mensagem textual enviada no prompt
     if prompt and prompt.text:
         st.chat_message("user").markdown(prompt.text)
 
         with st.chat_message("assistant"):
-            with st.spinner("Pensando..."):
-                answer = st.session_state.chat_agent[current_session_id].responder(
-                    prompt.text, session_id=current_session_id
-                )
-                st.session_state.answer[current_session_id] = answer
-
-                # Extrai o texto da resposta (pode ser string ou objeto Message)
-                answer_text = (
-                    answer.get("answer") if isinstance(answer, dict) else answer.content
-                )
-                st.markdown(answer_text)
+            # Renderiza os tokens conforme chegam do modelo
+            agente = st.session_state.chat_agent[current_session_id]
+            answer_text = st.write_stream(
+                agente.responder_stream(prompt.text, session_id=current_session_id)
+            )
+            st.session_state.answer[current_session_id] = answer_text
+        obter_armazenamento().tocar(current_session_id)
 
         # Atualiza histórico da sessão
         st.session_state.chat_histories[current_session_id].append(
@@ -174,3 +202,22 @@ with tabs[1]:
         "Arquivos embeddados:", st.session_state.embedded_files[current_session_id]
     )
     st.write("Conteudo Resposta LLM:", st.session_state.answer[current_session_id])
+    st.write(
+        "Métricas da última resposta:",
+        getattr(st.session_state.chat_agent.get(current_session_id), "metricas", {}),
+    )
+    st.write("Cache de embeddings:", obter_cache_embeddings().estatisticas())
+    st.write("Cache de documentos:", obter_cache_documentos().estatisticas())
+    st.write("Cache de respostas:", obter_cache_respostas().estatisticas())
+    st.write("Clientes Ollama:", estatisticas_clientes())
+    st.write("Fila de ingestão:", obter_fila_ingestao().estatisticas())
+    st.write("Armazenamento das sessões:", obter_armazenamento().estatisticas())
+    st.write("CSVs em modo colunar:", st.session_state.relatorios_csv)
+    st.write(
+        "Trace da última execução:",
+        obter_registro_traces().ultimos(current_session_id),
+    )
+    st.write(
+        "Tempo acumulado por etapa na sessão:",
+        obter_registro_traces().totais(current_session_id),
+    )
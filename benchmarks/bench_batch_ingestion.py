@@ -0,0 +1,137 @@
+"""
+Benchmark da ingestão em lote: mede a leitura e a divisão de uma pasta de PDFs com `dividir_em_lote`
+usando de 1 a N processos, e reporta tempo, arquivos/s, speedup e eficiência em relação a 1 processo.
+
+Cada repetição usa conteúdos diferentes (bytes extras após o fim do PDF), para que o cache de documentos
+não seja aproveitado entre execuções; a primeira repetição de cada pool é descartada, pois inclui a
+criação dos processos e a importação dos módulos. A vetorização não é medida aqui (ver `run_benchmarks.py`).
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_batch_ingestion.py --processos 1,2,4,8 --arquivos 16
+    python benchmarks/bench_batch_ingestion.py --pasta ./meus_pdfs --repeticoes 5
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+
+def carregar_pdfs(args) -> list:
+    if args.pasta:
+        nomes = sorted(n for n in os.listdir(args.pasta) if n.lower().endswith(".pdf"))
+        arquivos = []
+        for nome in nomes:
+            with open(os.path.join(args.pasta, nome), "rb") as arquivo:
+                arquivos.append((nome, arquivo.read()))
+        return arquivos
+    with open(os.path.join(RAIZ, "pdf_sample", "attention.pdf"), "rb") as arquivo:
+        dados = arquivo.read()
+    return [(f"attention_{i}.pdf", dados) for i in range(args.arquivos)]
+
+
+def variar(arquivos: list, repeticao: int) -> list:
+    # Bytes após o %%EOF são ignorados pelos leitores de PDF, mas mudam o hash do conteúdo
+    return [
+        (nome, dados + f"\n% bench {repeticao} {i}\n".encode())
+        for i, (nome, dados) in enumerate(arquivos)
+    ]
+
+
+def medir(arquivos: list, processos: int, repeticoes: int, por_paginas: bool) -> dict:
+    from agents_ia.batch_ingestion import dividir_em_lote
+
+    tempos = []
+    chunks = 0
+    with ProcessPoolExecutor(
+        max_workers=processos, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        # A repetição 0 aquece o pool (criação dos processos e importações) e é descartada
+        for repeticao in range(repeticoes + 1):
+            lote = variar(arquivos, processos * 1000 + repeticao)
+            inicio = time.perf_counter()
+            chunks = sum(
+                1
+                for _ in dividir_em_lote(
+                    lote, por_paginas=por_paginas, executor=executor
+                )
+            )
+            if repeticao:
+                tempos.append(time.perf_counter() - inicio)
+    segundos = statistics.median(tempos)
+    return {
+        "segundos_p50": segundos,
+        "segundos_min": min(tempos),
+        "arquivos_por_s": len(arquivos) / segundos,
+        "chunks": chunks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pasta", help="pasta com os PDFs (padrão: cópias do exemplo)")
+    parser.add_argument("--arquivos", type=int, default=8)
+    parser.add_argument(
+        "--processos",
+        default=",".join(
+            str(n)
+            for n in sorted({1, 2, 4, os.cpu_count() or 1})
+            if n <= (os.cpu_count() or 1)
+        ),
+    )
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument(
+        "--unstructured",
+        action="store_true",
+        help="lê com o UnstructuredPDFLoader em vez do pypdf página a página",
+    )
+    args = parser.parse_args()
+
+    arquivos = carregar_pdfs(args)
+    if not arquivos:
+        parser.error("nenhum PDF encontrado")
+    # Cache de documentos em uma pasta temporária, herdada pelos processos do pool
+    pasta_cache = tempfile.mkdtemp(prefix="bench_lote_")
+    os.environ["DOCUMENT_CACHE_DIR"] = pasta_cache
+    try:
+        resultados = {}
+        for processos in [int(n) for n in args.processos.split(",") if n]:
+            resultados[processos] = medir(
+                arquivos, processos, args.repeticoes, not args.unstructured
+            )
+            print(
+                f"{processos} processo(s): {resultados[processos]['segundos_p50']:.2f}s",
+                file=sys.stderr,
+            )
+    finally:
+        shutil.rmtree(pasta_cache, ignore_errors=True)
+
+    base = resultados.get(1) or next(iter(resultados.values()))
+    for processos, resultado in resultados.items():
+        resultado["speedup"] = base["segundos_p50"] / resultado["segundos_p50"]
+        resultado["eficiencia"] = resultado["speedup"] / processos
+    print(
+        json.dumps(
+            {
+                "nucleos": os.cpu_count(),
+                "arquivos": len(arquivos),
+                "megabytes": sum(len(dados) for _, dados in arquivos) / 1e6,
+                "repeticoes": args.repeticoes,
+                "processos": resultados,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
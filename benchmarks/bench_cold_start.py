@@ -0,0 +1,162 @@
+"""
+Benchmark de inicialização a frio: mede o tempo de importação dos módulos do projeto e a latência da
+primeira resposta de um processo novo, com e sem o aquecimento dos modelos (`aquecer_em_segundo_plano`).
+
+Cada medição roda em um subprocesso, para que nenhum módulo já esteja importado. A primeira resposta usa o
+servidor fake do Ollama com `manter_carregado`: a carga do modelo (`--latencia-carga`) só é paga uma vez,
+como no Ollama real, e um servidor novo é criado por execução, de modo que cada uma começa com os modelos
+descarregados. `--atraso-usuario` simula o tempo entre abrir a página e enviar a primeira pergunta.
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_cold_start.py --repeticoes 5 --latencia-carga 3
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_ollama import ConfigFakeOllama, ServidorFakeOllama  # noqa: E402
+
+# Módulos importados pelo app.py na inicialização
+MODULOS_APP = [
+    "agents_ia.chat",
+    "agents_ia.jobs",
+    "agents_ia.embedding_cache",
+    "agents_ia.document_cache",
+    "agents_ia.answer_cache",
+    "agents_ia.tracing",
+    "LLM.local_llm",
+]
+
+CODIGO_IMPORTACAO = """
+import importlib, json, sys, time
+sys.path.insert(0, {raiz!r})
+inicio = time.perf_counter()
+for modulo in {modulos!r}:
+    importlib.import_module(modulo)
+pesados = ["pandas", "langchain_experimental", "chromadb", "langchain_community.vectorstores",
+           "unstructured", "pyarrow", "pypdf"]
+print(json.dumps({{
+    "segundos": time.perf_counter() - inicio,
+    "carregados": [nome for nome in pesados if nome in sys.modules],
+}}))
+"""
+
+CODIGO_PRIMEIRA_RESPOSTA = """
+import json, sys, time
+inicio = time.perf_counter()
+sys.path.insert(0, {raiz!r})
+if {aquecer!r}:
+    from LLM.local_llm import aquecer_em_segundo_plano
+    aquecer_em_segundo_plano()
+from agents_ia.chat import ChatAgent
+agente = ChatAgent()
+importacao = time.perf_counter() - inicio
+# Tempo até o usuário enviar a primeira pergunta
+time.sleep({atraso!r})
+pergunta = time.perf_counter()
+primeiro = None
+for trecho in agente.responder_stream("Olá, tudo bem?", session_id="cold_start"):
+    if primeiro is None:
+        primeiro = time.perf_counter() - pergunta
+print(json.dumps({{
+    "importacao_s": importacao,
+    "primeiro_token_s": primeiro,
+    "resposta_s": time.perf_counter() - pergunta,
+}}))
+"""
+
+
+def executar(codigo: str, ambiente: dict, pasta: str) -> dict:
+    saida = subprocess.run(
+        [sys.executable, "-c", codigo],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=pasta,
+        env={**os.environ, **ambiente},
+    ).stdout
+    # O resultado é a última linha; as anteriores são logs do projeto
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def medir_importacao(args, pasta: str) -> dict:
+    resultados = [
+        executar(CODIGO_IMPORTACAO.format(raiz=RAIZ, modulos=MODULOS_APP), {}, pasta)
+        for _ in range(args.repeticoes)
+    ]
+    segundos = [r["segundos"] for r in resultados]
+    return {
+        "segundos_p50": statistics.median(segundos),
+        "segundos_min": min(segundos),
+        "modulos_pesados_carregados": resultados[-1]["carregados"],
+    }
+
+
+def medir_primeira_resposta(args, pasta: str, aquecer: bool) -> dict:
+    config = ConfigFakeOllama(
+        latencia_carga=args.latencia_carga,
+        tokens_por_segundo=args.tokens_por_segundo,
+        manter_carregado=True,
+    )
+    execucoes = []
+    for _ in range(args.repeticoes):
+        # Servidor novo por execução: os modelos começam descarregados
+        with ServidorFakeOllama(config) as servidor:
+            execucoes.append(
+                executar(
+                    CODIGO_PRIMEIRA_RESPOSTA.format(
+                        raiz=RAIZ, aquecer=aquecer, atraso=args.atraso_usuario
+                    ),
+                    {"OLLAMA_URL": servidor.url, "TRACING_LOG_PATH": ""},
+                    pasta,
+                )
+            )
+    return {
+        chave: statistics.median(e[chave] for e in execucoes)
+        for chave in ("importacao_s", "primeiro_token_s", "resposta_s")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--latencia-carga", type=float, default=3.0)
+    parser.add_argument("--tokens-por-segundo", type=float, default=200.0)
+    parser.add_argument("--atraso-usuario", type=float, default=2.0)
+    parser.add_argument(
+        "--sem-aquecimento",
+        action="store_true",
+        help="mede apenas o cenário sem aquecimento",
+    )
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix="bench_cold_")
+    try:
+        resultado = {
+            "latencia_carga_s": args.latencia_carga,
+            "atraso_usuario_s": args.atraso_usuario,
+            "importacao": medir_importacao(args, pasta),
+            "primeira_resposta": {
+                "sem_aquecimento": medir_primeira_resposta(args, pasta, False)
+            },
+        }
+        if not args.sem_aquecimento:
+            resultado["primeira_resposta"]["com_aquecimento"] = medir_primeira_resposta(
+                args, pasta, True
+            )
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+    print(json.dumps(resultado, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark do reaproveitamento do prefixo do prompt: mede, turno a turno de uma conversa no modo RAG, o tempo
+de processamento do prompt informado pelo Ollama (`prompt_eval_duration`, somado entre as chamadas do turno)
+com o layout anterior (instruções e contexto na mensagem de sistema inicial, `PROMPT_PREFIXO_ESTAVEL=0`) e com
+o prefixo estável (histórico primeiro, contexto na última mensagem).
+
+Usa o servidor fake do Ollama com `cache_prefixo`: só os tokens após o maior prefixo em comum com o prompt
+anterior do mesmo modelo são processados, como no cache de KV do Ollama. Cada layout roda em um subprocesso,
+com um servidor novo e caches frios. Com `--url`, usa um Ollama real (os modelos precisam estar instalados).
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_prompt_cache.py --turnos 8 --segundos-por-mil-tokens 0.5
+    python benchmarks/bench_prompt_cache.py --url http://127.0.0.1:11434
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_ollama import ConfigFakeOllama, ServidorFakeOllama  # noqa: E402
+
+CODIGO_CONVERSA = """
+import json, sys
+sys.path.insert(0, {raiz!r})
+from langchain_core.documents import Document
+from agents_ia.chat import ChatAgent
+from agents_ia.embedding import EmbeddingProcessor
+from agents_ia.memory import add_system_message
+from agents_ia.tracing import obter_registro_traces
+
+temas = ["atenção", "codificador", "decodificador", "embeddings", "treinamento", "regularização"]
+paginas = [
+    Document(
+        page_content=" ".join(
+            f"Seção {{i}} sobre {{temas[i % len(temas)]}}: o modelo usa a frase {{j}} para explicar o conceito."
+            for j in range(40)
+        ),
+        metadata={{"Arquivo": "artigo.pdf", "page": i}},
+    )
+    for i in range(30)
+]
+session_id = "bench_prompt"
+agente = ChatAgent()
+agente.trocar_para_rag(EmbeddingProcessor(data=paginas, session_id=session_id).create_retriever())
+add_system_message(session_id, "Voce agora possui conhecimento sobre o arquivo PDF de nome: 'artigo.pdf'!")
+
+turnos = []
+registro = obter_registro_traces()
+for i in range({turnos!r}):
+    pergunta = f"O que o artigo diz sobre {{temas[i % len(temas)]}} na seção {{i}}?"
+    for _ in agente.responder_stream(pergunta, session_id=session_id):
+        pass
+    trace = registro.ultimos(session_id)[-1]
+    llm = trace["etapas"].get("llm", {{}})
+    turnos.append({{
+        "segundos_prompt": llm.get("segundos_prompt", 0.0),
+        "tokens_prompt": llm.get("tokens_prompt", 0),
+        "chamadas": llm.get("chamadas", 0),
+        "duracao": trace["duracao"],
+    }})
+print(json.dumps(turnos))
+"""
+
+
+def conversar(args, estavel: bool, url: str, pasta: str) -> list:
+    ambiente = {
+        **os.environ,
+        "OLLAMA_URL": url,
+        "PROMPT_PREFIXO_ESTAVEL": "1" if estavel else "0",
+        "HISTORICO_BACKEND": "memoria",
+        "EMBEDDING_CACHE_PATH": os.path.join(pasta, "embeddings.sqlite3"),
+        "DOCUMENT_CACHE_DIR": os.path.join(pasta, "documentos"),
+        "TRACING_LOG_PATH": "",
+        # Turnos com perguntas diferentes não devem ser respondidos pelo cache semântico
+        "RESPOSTA_CACHE_LIMIAR": "1.1",
+    }
+    saida = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            CODIGO_CONVERSA.format(raiz=RAIZ, turnos=args.turnos),
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=pasta,
+        env=ambiente,
+    ).stdout
+    # O resultado é a última linha JSON; as demais são logs do projeto (inclusive da compactação em segundo plano)
+    linha = [l for l in saida.splitlines() if l.startswith("[")][-1]
+    return json.loads(linha)
+
+
+def medir(args, estavel: bool) -> dict:
+    pasta = tempfile.mkdtemp(prefix="bench_prompt_")
+    try:
+        with contextlib.ExitStack() as pilha:
+            url = args.url
+            if url is None:
+                config = ConfigFakeOllama(
+                    cache_prefixo=True,
+                    segundos_por_mil_tokens_prompt=args.segundos_por_mil_tokens,
+                    tokens_por_segundo=args.tokens_por_segundo,
+                )
+                url = pilha.enter_context(ServidorFakeOllama(config)).url
+            turnos = conversar(args, estavel, url, pasta)
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+    # O primeiro turno sempre processa o prompt inteiro; o ganho aparece a partir do segundo
+    seguintes = [t["segundos_prompt"] for t in turnos[1:]] or [0.0]
+    return {
+        "prompt_eval_s_por_turno": [round(t["segundos_prompt"], 4) for t in turnos],
+        "tokens_prompt_por_turno": [t["tokens_prompt"] for t in turnos],
+        "prompt_eval_s_media_apos_1o_turno": statistics.fmean(seguintes),
+        "prompt_eval_s_total": sum(t["segundos_prompt"] for t in turnos),
+        "turno_s_media": statistics.fmean(t["duracao"] for t in turnos),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turnos", type=int, default=8)
+    parser.add_argument("--segundos-por-mil-tokens", type=float, default=0.5)
+    parser.add_argument("--tokens-por-segundo", type=float, default=1000.0)
+    parser.add_argument(
+        "--url", default=None, help="URL de um Ollama real (padrão: servidor fake)"
+    )
+    args = parser.parse_args()
+
+    anterior = medir(args, estavel=False)
+    estavel = medir(args, estavel=True)
+    resultado = {
+        "turnos": args.turnos,
+        "servidor": args.url or "fake",
+        "layout_anterior": anterior,
+        "prefixo_estavel": estavel,
+        "reducao_prompt_eval": (
+            1 - estavel["prompt_eval_s_total"] / anterior["prompt_eval_s_total"]
+            if anterior["prompt_eval_s_total"]
+            else None
+        ),
+    }
+    print(json.dumps(resultado, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark de recuperação: compara latência por consulta e recall@k dos modos de busca
+vetorial (Chroma), lexical (BM25) e híbrido (RRF).
+
+As consultas são geradas a partir dos próprios chunks: um trecho de palavras consecutivas de um chunk
+sorteado, e o chunk de origem é a resposta esperada. Com `--identificadores`, parte das consultas
+usa apenas um termo raro do chunk (simulando identificadores, códigos de erro e nomes de tabela).
+
+Uso (na raiz do projeto, com o Ollama rodando):
+    python benchmarks/bench_retrieval.py --pdf pdf_sample/attention.pdf --consultas 100
+    python benchmarks/bench_retrieval.py --embeddings fake   # sem Ollama; recall vetorial sem significado
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents_ia.bm25 import tokenizar  # noqa: E402
+from agents_ia.embedding import EmbeddingProcessor  # noqa: E402
+from agents_ia.loader import CustomLoader  # noqa: E402
+
+
+def carregar_chunks(caminho_pdf: str, processor: EmbeddingProcessor):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    with open(caminho_pdf, "rb") as arquivo:
+        loader = CustomLoader(arquivo, os.path.basename(caminho_pdf))
+        paginas = list(loader._load_pdf_paginas())
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=processor.chunk_size, chunk_overlap=processor.chunk_overlap
+    )
+    return paginas, splitter.split_documents(paginas)
+
+
+def gerar_consultas(chunks, quantidade: int, palavras: int, identificadores: bool):
+    aleatorio = random.Random(42)
+    frequencia = {}
+    for chunk in chunks:
+        for termo in set(tokenizar(chunk.page_content)):
+            frequencia[termo] = frequencia.get(termo, 0) + 1
+
+    consultas = []
+    for i in range(quantidade):
+        alvo = aleatorio.randrange(len(chunks))
+        texto = chunks[alvo].page_content.split()
+        raros = [
+            t
+            for t in tokenizar(chunks[alvo].page_content)
+            if frequencia[t] == 1 and len(t) > 3
+        ]
+        if identificadores and i % 2 and raros:
+            consulta = aleatorio.choice(raros)
+        else:
+            inicio = aleatorio.randrange(max(1, len(texto) - palavras))
+            consulta = " ".join(texto[inicio : inicio + palavras])
+        consultas.append((consulta, chunks[alvo].page_content))
+    return consultas
+
+
+def medir(retriever, consultas, k: int) -> dict:
+    latencias = []
+    acertos = 0
+    for consulta, esperado in consultas:
+        inicio = time.perf_counter()
+        docs = retriever.invoke(consulta)
+        latencias.append(time.perf_counter() - inicio)
+        acertos += any(doc.page_content == esperado for doc in docs[:k])
+    latencias.sort()
+    return {
+        "recall_at_k": acertos / len(consultas),
+        "latencia_p50_ms": statistics.median(latencias) * 1000,
+        "latencia_p95_ms": latencias[int(0.95 * (len(latencias) - 1))] * 1000,
+        "latencia_media_ms": statistics.fmean(latencias) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pdf", default="pdf_sample/attention.pdf")
+    parser.add_argument("--consultas", type=int, default=100)
+    parser.add_argument("--palavras", type=int, default=8)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--identificadores", action="store_true")
+    parser.add_argument("--embeddings", choices=["ollama", "fake"], default="ollama")
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix="bench_retrieval_")
+    try:
+        base = EmbeddingProcessor(data=[], session_id="bench_retrieval")
+        if args.embeddings == "fake":
+            from langchain_core.embeddings import DeterministicFakeEmbedding
+
+            base.embeddings = DeterministicFakeEmbedding(size=256)
+        paginas, chunks = carregar_chunks(args.pdf, base)
+        consultas = gerar_consultas(
+            chunks, args.consultas, args.palavras, args.identificadores
+        )
+
+        # Indexa uma única vez; os três modos leem a mesma coleção e o mesmo índice BM25
+        base.data = paginas
+        base.persist_path = os.path.join(pasta, "chroma")
+        base.bm25_path = os.path.join(base.persist_path, "bm25.json.gz")
+        inicio = time.perf_counter()
+        base.create_retriever()
+        segundos_indexacao = time.perf_counter() - inicio
+
+        resultados = {
+            "pdf": args.pdf,
+            "chunks": len(chunks),
+            "consultas": len(consultas),
+            "k": args.k,
+            "embeddings": args.embeddings,
+            "segundos_indexacao": segundos_indexacao,
+            "modos": {},
+        }
+        for modo in ("vetorial", "lexica", "hibrida"):
+            base.modo_busca = modo
+            retriever = base.obter_retriever()
+            retriever.invoke("aquecimento")
+            resultados["modos"][modo] = medir(retriever, consultas, args.k)
+
+        print(json.dumps(resultados, indent=2, ensure_ascii=False))
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
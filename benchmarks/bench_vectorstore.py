@@ -0,0 +1,190 @@
+"""
+Benchmark de vetorstores: compara o Chroma com o FlatVectorStore (matriz float32 mapeada em memória)
+em tempo de ingestão, tempo de abertura de uma coleção persistida, latência de top-k e memória residente.
+
+Cada backend é medido em processos separados (um para construir a coleção e outro para reabri-la e consultar),
+para que a memória e o tempo de abertura não sejam afetados pelo outro backend. Os vetores são sintéticos,
+então o benchmark não depende do Ollama.
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_vectorstore.py --chunks 5000 --dimensao 1024 --consultas 200
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+
+def memoria_residente_mb() -> float:
+    # VmRSS do /proc no Linux; nos demais sistemas usa o pico informado pelo resource
+    try:
+        with open("/proc/self/status") as arquivo:
+            for linha in arquivo:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def vetores_sinteticos(quantidade: int, dimensao: int, semente: int):
+    import numpy as np
+
+    return np.random.default_rng(semente).standard_normal(
+        (quantidade, dimensao), dtype=np.float32
+    )
+
+
+def abrir(backend: str, pasta: str, dimensao: int):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    embeddings = DeterministicFakeEmbedding(size=dimensao)
+    if backend == "flat":
+        from agents_ia.flat_index import FlatVectorStore
+
+        return FlatVectorStore(embedding_function=embeddings, persist_directory=pasta)
+    from langchain_community.vectorstores import Chroma
+
+    return Chroma(
+        embedding_function=embeddings,
+        persist_directory=pasta,
+        collection_name="bench_vectorstore",
+    )
+
+
+def construir(args) -> dict:
+    from langchain_core.documents import Document
+    from agents_ia.ingestion import gravar_vetores
+
+    vetores = vetores_sinteticos(args.chunks, args.dimensao, semente=1)
+    inicio = time.perf_counter()
+    store = abrir(args.backend, args.pasta, args.dimensao)
+    for lote in range(0, args.chunks, 256):
+        docs = [
+            Document(
+                page_content=f"chunk {i}",
+                metadata={"Arquivo": f"arquivo_{i % 10}.pdf", "page": i},
+            )
+            for i in range(lote, min(lote + 256, args.chunks))
+        ]
+        gravar_vetores(store, docs, vetores[lote : lote + len(docs)].tolist())
+    return {"segundos_ingestao": time.perf_counter() - inicio}
+
+
+def consultar(args) -> dict:
+    memoria_inicial = memoria_residente_mb()
+    inicio = time.perf_counter()
+    store = abrir(args.backend, args.pasta, args.dimensao)
+    consultas = vetores_sinteticos(args.consultas, args.dimensao, semente=2)
+    # A primeira consulta conclui a abertura (carga do índice no Chroma, páginas mapeadas no flat)
+    store.similarity_search_by_vector(consultas[0].tolist(), k=args.k)
+    segundos_abertura = time.perf_counter() - inicio
+
+    latencias = []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        store.similarity_search_by_vector(consulta.tolist(), k=args.k)
+        latencias.append(time.perf_counter() - inicio)
+
+    latencias_filtro = []
+    for consulta in consultas[: max(1, len(consultas) // 4)]:
+        inicio = time.perf_counter()
+        store.similarity_search_by_vector(
+            consulta.tolist(), k=args.k, filter={"Arquivo": "arquivo_3.pdf"}
+        )
+        latencias_filtro.append(time.perf_counter() - inicio)
+
+    latencias.sort()
+    return {
+        "segundos_abertura": segundos_abertura,
+        "latencia_p50_ms": statistics.median(latencias) * 1000,
+        "latencia_p95_ms": latencias[int(0.95 * (len(latencias) - 1))] * 1000,
+        "latencia_filtro_p50_ms": statistics.median(latencias_filtro) * 1000,
+        "memoria_mb": memoria_residente_mb() - memoria_inicial,
+    }
+
+
+def tamanho_em_disco_mb(pasta: str) -> float:
+    total = 0
+    for raiz, _, arquivos in os.walk(pasta):
+        total += sum(os.path.getsize(os.path.join(raiz, nome)) for nome in arquivos)
+    return total / (1024 * 1024)
+
+
+def executar_etapa(etapa: str, backend: str, pasta: str, args) -> dict:
+    comando = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--etapa",
+        etapa,
+        "--backend",
+        backend,
+        "--pasta",
+        pasta,
+        "--chunks",
+        str(args.chunks),
+        "--dimensao",
+        str(args.dimensao),
+        "--consultas",
+        str(args.consultas),
+        "--k",
+        str(args.k),
+    ]
+    saida = subprocess.run(
+        comando, capture_output=True, text=True, check=True, cwd=RAIZ
+    ).stdout
+    # O resultado é a última linha; as anteriores são logs das bibliotecas
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--dimensao", type=int, default=1024)
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--backends", default="chroma,flat")
+    parser.add_argument("--etapa", choices=["construir", "consultar"])
+    parser.add_argument("--backend")
+    parser.add_argument("--pasta")
+    args = parser.parse_args()
+
+    if args.etapa:
+        resultado = construir(args) if args.etapa == "construir" else consultar(args)
+        print(json.dumps(resultado))
+        return
+
+    resultados = {
+        "chunks": args.chunks,
+        "dimensao": args.dimensao,
+        "consultas": args.consultas,
+        "k": args.k,
+        "backends": {},
+    }
+    base = tempfile.mkdtemp(prefix="bench_vectorstore_")
+    try:
+        for backend in args.backends.split(","):
+            pasta = os.path.join(base, backend)
+            resultado = executar_etapa("construir", backend, pasta, args)
+            resultado.update(executar_etapa("consultar", backend, pasta, args))
+            resultado["disco_mb"] = tamanho_em_disco_mb(pasta)
+            resultados["backends"][backend] = resultado
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == "__main__":
+    main()
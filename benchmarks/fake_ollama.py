@@ -0,0 +1,441 @@
+"""
+Servidor HTTP local que imita a API do Ollama usada pelo projeto, para benchmarks sem GPU nem modelos.
+
+Rotas atendidas:
+    POST /api/chat        respostas em streaming (NDJSON) ou completas, com chamadas de ferramenta quando
+                          a requisição envia `tools` e a última mensagem é do usuário
+    POST /api/generate    respostas de texto (usado também para aquecer modelos)
+    POST /api/embed       embeddings determinísticos derivados do hash do texto
+    POST /api/embeddings  rota antiga de embeddings, um texto por requisição
+    GET  /api/tags, /api/version
+
+A latência é configurável: tempo de carga, tempo de processamento do prompt por 1000 tokens, taxa de geração
+(tokens/s) e latência fixa e por texto dos embeddings. Com `cache_prefixo`, o servidor simula o cache de KV
+do Ollama: apenas os tokens após o maior prefixo em comum com o prompt anterior do mesmo modelo são
+processados, e `prompt_eval_duration` reflete isso.
+
+Uso como processo independente:
+    python benchmarks/fake_ollama.py --porta 11435 --tokens-por-segundo 40
+    OLLAMA_URL=http://127.0.0.1:11435 streamlit run app.py
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dataclasses import dataclass
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+
+import numpy as np
+
+
+@dataclass
+class ConfigFakeOllama:
+    # Latência fixa antes de processar o prompt (carga do modelo, fila)
+    latencia_carga: float = 0.0
+    # Tempo para processar 1000 tokens de prompt
+    segundos_por_mil_tokens_prompt: float = 0.05
+    # Taxa de geração de tokens da resposta
+    tokens_por_segundo: float = 200.0
+    # Quantidade de tokens de cada resposta de texto
+    tokens_resposta: int = 48
+    # Dimensão e latências dos embeddings
+    dimensao_embedding: int = 1024
+    latencia_embedding: float = 0.002
+    latencia_por_texto: float = 0.0005
+    # Simula o reaproveitamento do prefixo do prompt anterior (cache de KV)
+    cache_prefixo: bool = False
+    # Mantém os modelos carregados pelo tempo de keep_alive: a latência de carga só é paga na primeira
+    # requisição (ou após expirar), inclusive nos embeddings, como no Ollama real
+    manter_carregado: bool = False
+    # Código executado pela ferramenta nas respostas com chamada de ferramenta
+    codigo_ferramenta: str = "df.describe()"
+
+
+def _tokens(texto: str) -> int:
+    # Aproximação de 4 caracteres por token
+    return max(1, len(texto) // 4)
+
+
+def _segundos_keep_alive(keep_alive) -> float:
+    # Formato do Ollama: número de segundos ou duração ("30s", "5m", "1h"); negativo mantém para sempre
+    if keep_alive is None:
+        return 300.0
+    if isinstance(keep_alive, str):
+        unidades = {"s": 1, "m": 60, "h": 3600}
+        if keep_alive[-1:] in unidades:
+            return float(keep_alive[:-1]) * unidades[keep_alive[-1]]
+        keep_alive = float(keep_alive)
+    return float("inf") if keep_alive < 0 else float(keep_alive)
+
+
+def vetor_embedding(texto: str, dimensao: int) -> list:
+    """
+    Gera um vetor unitário determinístico a partir do SHA-256 do texto.
+
+    texto: texto a ser "vetorizado".
+    dimensao: dimensão do vetor.
+
+    return: lista de floats.
+    """
+    semente = int.from_bytes(hashlib.sha256(texto.encode("utf-8")).digest()[:8], "big")
+    vetor = np.random.default_rng(semente).standard_normal(dimensao)
+    return (vetor / np.linalg.norm(vetor)).astype(np.float32).tolist()
+
+
+class EstadoFakeOllama:
+    def __init__(self, config: ConfigFakeOllama):
+        """
+        Estado compartilhado entre as requisições: configuração, contadores e último prompt por modelo.
+
+        config: ConfigFakeOllama com as latências simuladas.
+
+        return: None
+        """
+        self.config = config
+        self.requisicoes = {}
+        self._prompts = {}
+        # Instante em que cada modelo termina de carregar e instante em que é descarregado
+        self._prontos = {}
+        self._expiracoes = {}
+        self.cargas = {}
+        self._lock = threading.Lock()
+
+    def contar(self, rota: str):
+        with self._lock:
+            self.requisicoes[rota] = self.requisicoes.get(rota, 0) + 1
+
+    def espera_carga(self, modelo: str, keep_alive, embedding: bool = False) -> float:
+        """
+        Tempo que a requisição espera pela carga do modelo.
+        Sem `manter_carregado`, geração sempre paga `latencia_carga` e embeddings não pagam nada.
+        Com `manter_carregado`, a carga acontece uma vez; requisições durante a carga esperam o restante.
+
+        modelo: nome do modelo.
+        keep_alive: keep_alive enviado na requisição.
+        embedding: se a requisição é de embedding.
+
+        return: segundos de espera.
+        """
+        config = self.config
+        if not config.manter_carregado:
+            return 0.0 if embedding else config.latencia_carga
+        agora = time.monotonic()
+        with self._lock:
+            pronto = self._prontos.get(modelo)
+            if pronto is None or agora >= self._expiracoes.get(modelo, 0.0):
+                pronto = agora + config.latencia_carga
+                self._prontos[modelo] = pronto
+                self.cargas[modelo] = self.cargas.get(modelo, 0) + 1
+            self._expiracoes[modelo] = max(pronto, agora) + _segundos_keep_alive(
+                keep_alive
+            )
+        return max(pronto - agora, 0.0)
+
+    def tokens_processados(self, modelo: str, prompt: str) -> int:
+        """
+        Quantidade de tokens do prompt que precisam ser processados, descontando o prefixo em cache.
+
+        modelo: nome do modelo.
+        prompt: texto completo do prompt.
+
+        return: int
+        """
+        if not self.config.cache_prefixo:
+            return _tokens(prompt)
+        with self._lock:
+            anterior = self._prompts.get(modelo, "")
+            self._prompts[modelo] = prompt
+        comum = 0
+        for a, b in zip(anterior, prompt):
+            if a != b:
+                break
+            comum += 1
+        return max(1, _tokens(prompt) - comum // 4)
+
+
+def _texto_resposta(mensagens: list, quantidade: int) -> str:
+    # Pedidos de reformulação devolvem a própria pergunta, como faria um modelo obediente.
+    # As instruções podem vir no sistema ou antes da pergunta, na última mensagem ("...\n\nPergunta: ...")
+    sistema = " ".join(m.get("content", "") for m in mensagens if m["role"] == "system")
+    perguntas = [m.get("content", "") for m in mensagens if m["role"] == "user"]
+    ultima = perguntas[-1] if perguntas else ""
+    pergunta = ultima.rsplit("Pergunta: ", 1)[-1]
+    if perguntas and "Reformule apenas" in f"{sistema} {ultima}":
+        return pergunta
+    palavras = re.findall(r"\w+", pergunta) or ["resposta"]
+    return " ".join(palavras[i % len(palavras)] for i in range(quantidade))
+
+
+class ManipuladorFakeOllama(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    estado: EstadoFakeOllama = None
+
+    def log_message(self, formato, *args):
+        pass
+
+    def handle(self):
+        # Clientes que encerram antes da resposta (ex.: aquecimento em thread daemon) não são erro
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _ler_json(self) -> dict:
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(tamanho) or b"{}")
+
+    def _enviar_json(self, dados: dict, status: int = 200):
+        corpo = json.dumps(dados).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _iniciar_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _enviar_linha(self, dados: dict):
+        linha = (json.dumps(dados) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(linha):X}\r\n".encode() + linha + b"\r\n")
+        self.wfile.flush()
+
+    def _finalizar_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        self.estado.contar(self.path)
+        if self.path == "/api/tags":
+            self._enviar_json({"models": []})
+        elif self.path == "/api/version":
+            self._enviar_json({"version": "0.0.0-fake"})
+        else:
+            self._enviar_json({"error": "rota não encontrada"}, status=404)
+
+    def do_POST(self):
+        self.estado.contar(self.path)
+        corpo = self._ler_json()
+        if self.path == "/api/chat":
+            self._gerar(corpo, corpo.get("messages") or [], chat=True)
+        elif self.path == "/api/generate":
+            mensagens = [{"role": "user", "content": corpo.get("prompt", "")}]
+            if corpo.get("system"):
+                mensagens.insert(0, {"role": "system", "content": corpo["system"]})
+            self._gerar(corpo, mensagens, chat=False)
+        elif self.path in ("/api/embed", "/api/embeddings"):
+            self._embeddings(corpo)
+        else:
+            self._enviar_json({"error": "rota não encontrada"}, status=404)
+
+    def _embeddings(self, corpo: dict):
+        config = self.estado.config
+        textos = corpo.get("input", corpo.get("prompt", ""))
+        if isinstance(textos, str):
+            textos = [textos]
+        espera = self.estado.espera_carga(
+            corpo.get("model", "fake"), corpo.get("keep_alive"), embedding=True
+        )
+        time.sleep(
+            espera + config.latencia_embedding + config.latencia_por_texto * len(textos)
+        )
+        vetores = [
+            vetor_embedding(texto, config.dimensao_embedding) for texto in textos
+        ]
+        if self.path == "/api/embeddings":
+            self._enviar_json({"embedding": vetores[0] if vetores else []})
+        else:
+            self._enviar_json({"model": corpo.get("model"), "embeddings": vetores})
+
+    def _gerar(self, corpo: dict, mensagens: list, chat: bool):
+        config = self.estado.config
+        modelo = corpo.get("model", "fake")
+        inicio = time.perf_counter()
+
+        # Requisições sem mensagens só carregam o modelo (ex.: aquecimento com keep_alive)
+        espera = self.estado.espera_carga(modelo, corpo.get("keep_alive"))
+        if not any(m.get("content") for m in mensagens):
+            time.sleep(espera)
+            self._enviar_json(
+                {
+                    "model": modelo,
+                    "done": True,
+                    "done_reason": "load",
+                    **(
+                        {"message": {"role": "assistant", "content": ""}}
+                        if chat
+                        else {"response": ""}
+                    ),
+                }
+            )
+            return
+
+        prompt = "\n".join(f"{m['role']}: {m.get('content', '')}" for m in mensagens)
+        prompt_tokens = _tokens(prompt)
+        processados = self.estado.tokens_processados(modelo, prompt)
+        prompt_eval = processados * config.segundos_por_mil_tokens_prompt / 1000
+        time.sleep(espera + prompt_eval)
+
+        chamar_ferramenta = (
+            chat
+            and corpo.get("tools")
+            and mensagens
+            and mensagens[-1]["role"] == "user"
+        )
+        if chamar_ferramenta:
+            nome = corpo["tools"][0].get("function", {}).get("name", "python_repl_ast")
+            partes = []
+            mensagem_final = {
+                "role": "assistant",
+                "content": "",
+                "tool_calls": [
+                    {
+                        "function": {
+                            "name": nome,
+                            "arguments": {"query": config.codigo_ferramenta},
+                        }
+                    }
+                ],
+            }
+        else:
+            texto = _texto_resposta(mensagens, config.tokens_resposta)
+            partes = re.findall(r"\S+\s*", texto) or [texto]
+            mensagem_final = {"role": "assistant", "content": ""}
+
+        intervalo = (
+            1.0 / config.tokens_por_segundo if config.tokens_por_segundo else 0.0
+        )
+        stream = corpo.get("stream", True)
+
+        def resumo(eval_duration: float) -> dict:
+            return {
+                "model": modelo,
+                "done": True,
+                "done_reason": "stop",
+                "total_duration": int((time.perf_counter() - inicio) * 1e9),
+                "load_duration": int(espera * 1e9),
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(prompt_eval * 1e9),
+                "eval_count": max(1, len(partes)),
+                "eval_duration": int(eval_duration * 1e9),
+            }
+
+        inicio_geracao = time.perf_counter()
+        if not stream:
+            time.sleep(intervalo * len(partes))
+            if partes:
+                mensagem_final["content"] = "".join(partes)
+            final = resumo(time.perf_counter() - inicio_geracao)
+            if chat:
+                final["message"] = mensagem_final
+            else:
+                final["response"] = mensagem_final["content"]
+            self._enviar_json(final)
+            return
+
+        self._iniciar_stream()
+        for parte in partes:
+            time.sleep(intervalo)
+            linha = {"model": modelo, "done": False}
+            if chat:
+                linha["message"] = {"role": "assistant", "content": parte}
+            else:
+                linha["response"] = parte
+            self._enviar_linha(linha)
+        final = resumo(time.perf_counter() - inicio_geracao)
+        if chat:
+            final["message"] = mensagem_final
+        else:
+            final["response"] = ""
+        self._enviar_linha(final)
+        self._finalizar_stream()
+
+
+class ServidorFakeOllama:
+    def __init__(
+        self, config: ConfigFakeOllama = None, host: str = "127.0.0.1", porta: int = 0
+    ):
+        """
+        Servidor fake do Ollama executado em uma thread do próprio processo.
+
+        config: ConfigFakeOllama com as latências simuladas.
+        host: endereço de escuta.
+        porta: porta de escuta (0 escolhe uma porta livre).
+
+        return: None
+        """
+        self.estado = EstadoFakeOllama(config or ConfigFakeOllama())
+        manipulador = type(
+            "Manipulador", (ManipuladorFakeOllama,), {"estado": self.estado}
+        )
+        self._servidor = ThreadingHTTPServer((host, porta), manipulador)
+        self._servidor.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, porta = self._servidor.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def iniciar(self) -> "ServidorFakeOllama":
+        self._thread = threading.Thread(
+            target=self._servidor.serve_forever, name="fake-ollama", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *args):
+        self.parar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor fake da API do Ollama")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=11435)
+    parser.add_argument("--latencia-carga", type=float, default=0.0)
+    parser.add_argument("--segundos-por-mil-tokens-prompt", type=float, default=0.05)
+    parser.add_argument("--tokens-por-segundo", type=float, default=200.0)
+    parser.add_argument("--tokens-resposta", type=int, default=48)
+    parser.add_argument("--dimensao-embedding", type=int, default=1024)
+    parser.add_argument("--latencia-embedding", type=float, default=0.002)
+    parser.add_argument("--latencia-por-texto", type=float, default=0.0005)
+    parser.add_argument("--cache-prefixo", action="store_true")
+    parser.add_argument("--manter-carregado", action="store_true")
+    args = parser.parse_args()
+
+    config = ConfigFakeOllama(
+        latencia_carga=args.latencia_carga,
+        segundos_por_mil_tokens_prompt=args.segundos_por_mil_tokens_prompt,
+        tokens_por_segundo=args.tokens_por_segundo,
+        tokens_resposta=args.tokens_resposta,
+        dimensao_embedding=args.dimensao_embedding,
+        latencia_embedding=args.latencia_embedding,
+        latencia_por_texto=args.latencia_por_texto,
+        cache_prefixo=args.cache_prefixo,
+        manter_carregado=args.manter_carregado,
+    )
+    servidor = ServidorFakeOllama(config, host=args.host, porta=args.porta)
+    print(f"Fake Ollama em {servidor.url}")
+    try:
+        servidor._servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor._servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Suíte de benchmarks offline: executa o carregamento de arquivos, a ingestão e as respostas do ChatAgent
+nos modos llm, rag e csv contra o servidor fake do Ollama (`fake_ollama.py`), sem depender de um Ollama real.
+
+Cada cenário reporta quantidade de execuções, latência média e p50/p95/p99 (ms) e vazão, em JSON,
+para que execuções diferentes possam ser comparadas. Todos os arquivos gerados (caches, Chroma, histórico)
+ficam em um diretório temporário, de modo que cada execução começa com os caches frios.
+
+Uso (na raiz do projeto):
+    python benchmarks/run_benchmarks.py --repeticoes 10 --saida resultados.json
+    python benchmarks/run_benchmarks.py --cenarios rag,csv --tokens-por-segundo 40
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_ollama import ConfigFakeOllama, ServidorFakeOllama  # noqa: E402
+
+CENARIOS = ["loader_pdf", "loader_csv", "ingestao", "llm", "rag", "csv"]
+
+
+def percentil(valores: list, p: float) -> float:
+    # Percentil com interpolação linear entre as posições vizinhas
+    ordenados = sorted(valores)
+    posicao = (len(ordenados) - 1) * p / 100
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (
+        posicao - inferior
+    )
+
+
+def resumir(latencias: list, unidades: int = None, **extras) -> dict:
+    """
+    Resume as latências (em segundos) de um cenário.
+
+    latencias: duração de cada execução.
+    unidades: quantidade de itens processados no total (ex.: chunks), para a vazão por item.
+    extras: métricas adicionais do cenário.
+
+    return: dict com n, média, p50, p95, p99 (ms) e vazão.
+    """
+    total = sum(latencias)
+    resultado = {
+        "n": len(latencias),
+        "media_ms": statistics.fmean(latencias) * 1000,
+        "p50_ms": percentil(latencias, 50) * 1000,
+        "p95_ms": percentil(latencias, 95) * 1000,
+        "p99_ms": percentil(latencias, 99) * 1000,
+        "execucoes_por_s": len(latencias) / total if total else 0.0,
+    }
+    if unidades is not None:
+        resultado["itens_por_s"] = unidades / total if total else 0.0
+    resultado.update(extras)
+    return resultado
+
+
+def csv_sintetico(linhas: int) -> bytes:
+    import numpy as np
+    import pandas as pd
+
+    aleatorio = np.random.default_rng(7)
+    df = pd.DataFrame(
+        {
+            "id": np.arange(linhas),
+            "categoria": aleatorio.choice(["A", "B", "C", "D"], size=linhas),
+            "valor": aleatorio.normal(100, 15, size=linhas).round(2),
+            "quantidade": aleatorio.integers(0, 500, size=linhas),
+        }
+    )
+    return df.to_csv(index=False).encode("utf-8")
+
+
+class ArquivoEnviado:
+    """Imita o arquivo devolvido pelo st.file_uploader (BytesIO com nome)."""
+
+    def __init__(self, dados: bytes, nome: str):
+        import io
+
+        self._buffer = io.BytesIO(dados)
+        self.name = nome
+
+    def __getattr__(self, nome):
+        return getattr(self._buffer, nome)
+
+
+def bench_loader_pdf(args, pdf: bytes) -> dict:
+    from agents_ia.document_cache import DocumentCache
+    from agents_ia.loader import CustomLoader
+
+    latencias = []
+    paginas = 0
+    for i in range(args.repeticoes):
+        loader = CustomLoader(ArquivoEnviado(pdf, "attention.pdf"), "attention.pdf")
+        # Cache de documentos vazio a cada repetição, para medir a extração
+        loader.cache = DocumentCache(pasta=os.path.join("bench_docs", str(i)))
+        inicio = time.perf_counter()
+        docs = list(loader.lazy_load())
+        latencias.append(time.perf_counter() - inicio)
+        paginas += len(docs)
+    return resumir(latencias, unidades=paginas, paginas=paginas // len(latencias))
+
+
+def bench_loader_csv(args, csv: bytes) -> dict:
+    from agents_ia.document_cache import DocumentCache
+    from agents_ia.loader import CustomLoader
+
+    latencias = []
+    for i in range(args.repeticoes):
+        loader = CustomLoader(ArquivoEnviado(csv, "dados.csv"), "dados.csv")
+        loader.cache = DocumentCache(pasta=os.path.join("bench_csv", str(i)))
+        inicio = time.perf_counter()
+        df = loader._load()
+        latencias.append(time.perf_counter() - inicio)
+    return resumir(latencias, unidades=len(df) * len(latencias), linhas=len(df))
+
+
+def bench_ingestao(args, paginas: list) -> dict:
+    from agents_ia.embedding import EmbeddingProcessor
+    from agents_ia.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+    latencias = []
+    chunks = 0
+    for i in range(args.repeticoes):
+        processor = EmbeddingProcessor(
+            data=list(paginas), session_id=f"bench_ingestao_{i}"
+        )
+        # Cache de embeddings vazio a cada repetição, para que todos os chunks vão ao servidor
+        processor.embeddings = CachedEmbeddings(
+            processor.embeddings.embeddings,
+            modelo=processor.embeddings.modelo,
+            cache=EmbeddingCache(caminho=f"bench_embeddings/{i}.sqlite3"),
+        )
+        resultado = {}
+        inicio = time.perf_counter()
+        processor.create_retriever(
+            on_progress=lambda p: resultado.update(n=p.concluidos)
+        )
+        latencias.append(time.perf_counter() - inicio)
+        chunks += resultado.get("n", 0)
+    return resumir(latencias, unidades=chunks, chunks=chunks // len(latencias))
+
+
+def bench_chat(args, modo: str, paginas: list, csv: bytes) -> dict:
+    from agents_ia.chat import ChatAgent
+    from agents_ia.embedding import EmbeddingProcessor
+    from agents_ia.loader import CustomLoader
+
+    agente = ChatAgent()
+    if modo == "rag":
+        processor = EmbeddingProcessor(data=list(paginas), session_id="bench_rag")
+        agente.trocar_para_rag(processor.create_retriever())
+    elif modo == "csv":
+        df = CustomLoader(ArquivoEnviado(csv, "dados.csv"), "dados.csv")._load()
+        agente.load_dataframe_tools(df=df)
+
+    perguntas = {
+        "llm": "Explique em poucas palavras o que é um transformer {i}",
+        "rag": "O que o artigo diz sobre multi-head attention na consulta {i}?",
+        "csv": "Qual a média da coluna valor no recorte {i}?",
+    }[modo]
+
+    latencias = []
+    primeiros_tokens = []
+    for i in range(args.repeticoes):
+        inicio = time.perf_counter()
+        agente.responder(perguntas.format(i=i), session_id=f"bench_{modo}_{i}")
+        latencias.append(time.perf_counter() - inicio)
+
+        for _ in agente.responder_stream(
+            perguntas.format(i=f"stream {i}"), session_id=f"bench_{modo}_stream_{i}"
+        ):
+            pass
+        if agente.metricas.get("tempo_primeiro_token") is not None:
+            primeiros_tokens.append(agente.metricas["tempo_primeiro_token"])
+
+    extras = {}
+    if primeiros_tokens:
+        extras["primeiro_token_p50_ms"] = percentil(primeiros_tokens, 50) * 1000
+        extras["primeiro_token_p95_ms"] = percentil(primeiros_tokens, 95) * 1000
+    return resumir(latencias, **extras)
+
+
+def executar_cenarios(args, cenarios, resultados, pdf, csv, paginas):
+    for cenario in cenarios:
+        inicio = time.perf_counter()
+        if cenario == "loader_pdf":
+            resultados[cenario] = bench_loader_pdf(args, pdf)
+        elif cenario == "loader_csv":
+            resultados[cenario] = bench_loader_csv(args, csv)
+        elif cenario == "ingestao":
+            resultados[cenario] = bench_ingestao(args, paginas)
+        else:
+            resultados[cenario] = bench_chat(args, cenario, paginas, csv)
+        print(
+            f"Cenário '{cenario}' concluído em {time.perf_counter() - inicio:.2f}s",
+            file=sys.stderr,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cenarios", default=",".join(CENARIOS))
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument(
+        "--pdf", default=os.path.join(RAIZ, "pdf_sample", "attention.pdf")
+    )
+    parser.add_argument("--linhas-csv", type=int, default=50000)
+    parser.add_argument(
+        "--saida", help="arquivo JSON onde o resultado também é gravado"
+    )
+    parser.add_argument("--latencia-carga", type=float, default=0.0)
+    parser.add_argument("--segundos-por-mil-tokens-prompt", type=float, default=0.05)
+    parser.add_argument("--tokens-por-segundo", type=float, default=200.0)
+    parser.add_argument("--tokens-resposta", type=int, default=48)
+    parser.add_argument("--latencia-embedding", type=float, default=0.002)
+    parser.add_argument("--latencia-por-texto", type=float, default=0.0005)
+    args = parser.parse_args()
+    cenarios = [c for c in args.cenarios.split(",") if c]
+    desconhecidos = set(cenarios) - set(CENARIOS)
+    if desconhecidos:
+        parser.error(f"cenários desconhecidos: {sorted(desconhecidos)}")
+
+    config = ConfigFakeOllama(
+        latencia_carga=args.latencia_carga,
+        segundos_por_mil_tokens_prompt=args.segundos_por_mil_tokens_prompt,
+        tokens_por_segundo=args.tokens_por_segundo,
+        tokens_resposta=args.tokens_resposta,
+        latencia_embedding=args.latencia_embedding,
+        latencia_por_texto=args.latencia_por_texto,
+    )
+    pdf_caminho = os.path.abspath(args.pdf)
+    saida = os.path.abspath(args.saida) if args.saida else None
+    diretorio_original = os.getcwd()
+    pasta = tempfile.mkdtemp(prefix="bench_")
+
+    with ServidorFakeOllama(config) as servidor:
+        # A URL precisa estar definida antes de importar os módulos do projeto
+        os.environ["OLLAMA_URL"] = servidor.url
+        os.chdir(pasta)
+        try:
+            from agents_ia.loader import CustomLoader
+
+            with open(pdf_caminho, "rb") as arquivo:
+                pdf = arquivo.read()
+            csv = csv_sintetico(args.linhas_csv)
+            paginas = list(
+                CustomLoader(
+                    ArquivoEnviado(pdf, "attention.pdf"), "attention.pdf"
+                )._load_pdf_paginas()
+            )
+
+            resultados = {}
+            # Os logs do projeto (print) vão para o stderr, deixando o stdout só com o JSON
+            with contextlib.redirect_stdout(sys.stderr):
+                executar_cenarios(args, cenarios, resultados, pdf, csv, paginas)
+        finally:
+            os.chdir(diretorio_original)
+            shutil.rmtree(pasta, ignore_errors=True)
+        requisicoes = dict(servidor.estado.requisicoes)
+
+    relatorio = {
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "repeticoes": args.repeticoes,
+        "fake_ollama": vars(config),
+        "requisicoes_ollama": requisicoes,
+        "cenarios": resultados,
+    }
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if saida:
+        with open(saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto)
+    print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,19 @@
 import subprocess
-import shutil
 import os
 
 
 def main():
-    # Caminho para a pasta chroma_storage
-    chroma_storage_path = os.path.join(os.getcwd(), "chroma_storage")
-    print(f"Verificando a pasta '{chroma_storage_path}'...")
-    # Excluir a pasta chroma_storage, se existir
-    if os.path.exists(chroma_storage_path):
-        shutil.rmtree(chroma_storage_path)
-        print(f"Pasta '{chroma_storage_path}' excluída com sucesso.")
-    else:
-        print(f"Pasta '{chroma_storage_path}' não encontrada.")
+    # As coleções das sessões são mantidas entre execuções; só as ociosas ou acima da cota são removidas
+    from agents_ia.storage import CHROMA_STORAGE_DIR, obter_armazenamento
+
+    print(f"Verificando a pasta '{os.path.abspath(CHROMA_STORAGE_DIR)}'...")
+    obter_armazenamento().coletar_lixo()
+
+    # Carrega os modelos no Ollama em segundo plano enquanto o Streamlit inicia
+    from LLM.local_llm import OLLAMA_AQUECIMENTO, aquecer_em_segundo_plano
+
+    if OLLAMA_AQUECIMENTO:
+        aquecer_em_segundo_plano()
 
     # Rodar o script streamlit
     command = "streamlit run app.py"
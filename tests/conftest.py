@@ -0,0 +1,86 @@
+from langchain_core.embeddings import Embeddings
+from typing import List
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+
+from fake_ollama import ConfigFakeOllama, ServidorFakeOllama, vetor_embedding
+
+_servidor = None
+_pasta = None
+
+
+def pytest_configure(config):
+    # As configurações dos módulos são lidas na importação: o Ollama falso e as pastas temporárias
+    # precisam estar definidos antes de os testes importarem o projeto
+    global _servidor, _pasta
+    _pasta = tempfile.mkdtemp(prefix="testes_agents_ia_")
+    _servidor = ServidorFakeOllama(ConfigFakeOllama()).iniciar()
+    os.environ.update(
+        {
+            "OLLAMA_URL": _servidor.url,
+            "OLLAMA_AQUECIMENTO": "0",
+            "ANONYMIZED_TELEMETRY": "False",
+            "HISTORICO_BACKEND": "memoria",
+            "TRACING_LOG_PATH": "",
+            "EMBEDDING_CACHE_PATH": os.path.join(_pasta, "embeddings.sqlite3"),
+            "DOCUMENT_CACHE_DIR": os.path.join(_pasta, "documentos"),
+            "COLUNAR_DIR": os.path.join(_pasta, "colunar"),
+            "CHROMA_STORAGE_DIR": os.path.join(_pasta, "chroma_storage"),
+        }
+    )
+
+
+def pytest_unconfigure(config):
+    if _servidor is not None:
+        _servidor.parar()
+    if _pasta is not None:
+        shutil.rmtree(_pasta, ignore_errors=True)
+
+
+class EmbeddingsFalsos(Embeddings):
+    def __init__(self, dimensao: int = 32, atraso: float = 0.0, erro: Exception = None):
+        """
+        Embeddings determinísticos (os mesmos vetores do Ollama falso) que registram cada chamada ao modelo.
+
+        dimensao: dimensão dos vetores.
+        atraso: segundos de espera em cada chamada, para simular a latência do modelo.
+        erro: exceção levantada em todas as chamadas (opcional).
+
+        return: None
+        """
+        self.dimensao = dimensao
+        self.atraso = atraso
+        self.erro = erro
+        self.chamadas: List[List[str]] = []
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            self.chamadas.append(list(texts))
+        if self.atraso:
+            time.sleep(self.atraso)
+        if self.erro is not None:
+            raise self.erro
+        return [vetor_embedding(texto, self.dimensao) for texto in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    @property
+    def textos_enviados(self) -> List[str]:
+        return [texto for chamada in self.chamadas for texto in chamada]
+
+
+@pytest.fixture
+def embeddings() -> EmbeddingsFalsos:
+    return EmbeddingsFalsos()
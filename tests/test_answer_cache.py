@@ -0,0 +1,55 @@
+from agents_ia.answer_cache import AnswerCache
+import time
+
+from conftest import vetor_embedding
+
+
+def test_reaproveita_pergunta_equivalente_no_mesmo_namespace():
+    cache = AnswerCache(limiar=0.95)
+    vetor = vetor_embedding("qual o prazo?", 32)
+    cache.salvar("colecao_a", vetor, "30 dias")
+
+    # Uma pequena perturbação continua acima do limiar; outra pergunta não
+    proximo = [valor * 1.01 for valor in vetor]
+    proximo[0] += 0.01
+    assert cache.obter("colecao_a", proximo) == "30 dias"
+    assert cache.obter("colecao_a", vetor_embedding("quem assina?", 32)) is None
+    assert cache.obter("colecao_b", vetor) is None
+    assert cache.estatisticas()["hits"] == 1
+
+
+def test_invalidar_remove_so_o_namespace():
+    cache = AnswerCache()
+    vetor = vetor_embedding("pergunta", 32)
+    cache.salvar("colecao_a", vetor, "resposta a")
+    cache.salvar("colecao_b", vetor, "resposta b")
+
+    cache.invalidar("colecao_a")
+
+    assert cache.obter("colecao_a", vetor) is None
+    assert cache.obter("colecao_b", vetor) == "resposta b"
+
+
+def test_respostas_expiram():
+    cache = AnswerCache(ttl_segundos=0.05)
+    vetor = vetor_embedding("pergunta", 32)
+    cache.salvar("colecao", vetor, "resposta")
+
+    assert cache.obter("colecao", vetor) == "resposta"
+    time.sleep(0.1)
+    assert cache.obter("colecao", vetor) is None
+    assert cache.estatisticas()["itens"] == 0
+
+
+def test_remove_as_respostas_usadas_ha_mais_tempo():
+    cache = AnswerCache(max_itens=2)
+    vetores = {texto: vetor_embedding(texto, 32) for texto in ["p1", "p2", "p3"]}
+    cache.salvar("colecao", vetores["p1"], "r1")
+    cache.salvar("colecao", vetores["p2"], "r2")
+    # "p1" é usada e "p2" passa a ser a menos recente
+    assert cache.obter("colecao", vetores["p1"]) == "r1"
+    cache.salvar("colecao", vetores["p3"], "r3")
+
+    assert cache.obter("colecao", vetores["p2"]) is None
+    assert cache.obter("colecao", vetores["p1"]) == "r1"
+    assert cache.obter("colecao", vetores["p3"]) == "r3"
@@ -0,0 +1,159 @@
+from agents_ia.bm25 import (
+    BM25Retriever,
+    HybridRetriever,
+    IndiceBM25,
+    fundir_rrf,
+    tokenizar,
+)
+from agents_ia.flat_index import FlatVectorStore
+from langchain_core.documents import Document
+import threading
+import time
+
+
+def _doc(texto: str, arquivo: str = "a.pdf", pagina: int = 0) -> Document:
+    return Document(page_content=texto, metadata={"Arquivo": arquivo, "page": pagina})
+
+
+def _indice() -> IndiceBM25:
+    indice = IndiceBM25()
+    indice.adicionar(
+        [
+            _doc("O erro ERR-404 aparece quando a página não existe", "erros.pdf", 1),
+            _doc("Relatório de vendas do trimestre", "vendas.pdf", 1),
+            _doc("Vendas por região e vendas por produto", "vendas.pdf", 2),
+            _doc("Configuração da tabela.coluna no banco", "banco.pdf", 1),
+        ]
+    )
+    return indice
+
+
+def test_tokenizar_normaliza_e_mantem_identificadores():
+    assert tokenizar("Relatório ÁGIL") == ["relatorio", "agil"]
+    assert tokenizar("ERR-404 em tabela.coluna") == [
+        "err-404",
+        "err",
+        "404",
+        "em",
+        "tabela.coluna",
+        "tabela",
+        "coluna",
+    ]
+
+
+def test_buscar_ordena_por_bm25():
+    resultados = _indice().buscar("vendas", k=2)
+
+    # O documento com mais ocorrências do termo vem primeiro
+    assert [doc.metadata["page"] for doc, _ in resultados] == [2, 1]
+    assert resultados[0][1] > resultados[1][1] > 0
+    assert _indice().buscar("err-404", k=1)[0][0].metadata["Arquivo"] == "erros.pdf"
+    assert _indice().buscar("inexistente") == []
+
+
+def test_buscar_com_filtro():
+    indice = _indice()
+
+    resultados = indice.buscar("vendas", k=4, filtro={"page": {"$gte": 2}})
+
+    assert [doc.metadata["page"] for doc, _ in resultados] == [2]
+    assert indice.buscar("vendas", filtro={"Arquivo": {"$in": ["banco.pdf"]}}) == []
+
+
+def test_remover_reconstroi_o_indice():
+    indice = _indice()
+
+    assert indice.remover({"Arquivo": "vendas.pdf"}) == 2
+    assert len(indice) == 2
+    assert indice.buscar("vendas") == []
+    assert indice.buscar("banco")[0][0].metadata["Arquivo"] == "banco.pdf"
+    assert indice.remover({"Arquivo": "vendas.pdf"}) == 0
+
+
+class IndiceComPausa(IndiceBM25):
+    def adicionar(self, docs):
+        # Abre espaço para as buscas de outra thread entre as operações sobre o índice
+        time.sleep(0.005)
+        super().adicionar(docs)
+
+
+def test_buscas_concorrentes_nao_veem_o_indice_pela_metade():
+    indice = IndiceComPausa()
+    indice.adicionar(
+        [_doc(f"relatório de vendas {i}", "vendas.pdf", i) for i in range(20)]
+    )
+    indice.adicionar([_doc("configuração do banco", "banco.pdf")])
+    parar = threading.Event()
+    vazias = []
+
+    def buscar():
+        while not parar.is_set():
+            if not indice.buscar("vendas", k=1):
+                vazias.append(True)
+
+    thread = threading.Thread(target=buscar)
+    thread.start()
+    try:
+        for _ in range(10):
+            indice.remover({"Arquivo": "banco.pdf"})
+            indice.adicionar([_doc("configuração do banco", "banco.pdf")])
+    finally:
+        parar.set()
+        thread.join()
+
+    # Os documentos de vendas continuam no índice durante toda a remoção
+    assert vazias == []
+    assert len(indice) == 21
+
+
+def test_salvar_e_carregar(tmp_path):
+    indice = _indice()
+    caminho = str(tmp_path / "bm25.json.gz")
+
+    indice.salvar(caminho)
+    carregado = IndiceBM25.carregar(caminho)
+
+    assert len(carregado) == len(indice)
+    assert [
+        (doc.page_content, pontuacao) for doc, pontuacao in carregado.buscar("vendas")
+    ] == [(doc.page_content, pontuacao) for doc, pontuacao in indice.buscar("vendas")]
+    assert len(IndiceBM25.carregar(str(tmp_path / "ausente.json.gz"))) == 0
+
+
+def test_fundir_rrf_prioriza_documentos_nas_duas_listas():
+    a, b, c, d = (_doc(texto) for texto in "abcd")
+    vetorial = [a, b, c]
+    lexical = [d, c, _doc("a")]
+
+    fundidos = fundir_rrf([vetorial, lexical], k=3, rrf_k=60)
+
+    # "c" aparece nas duas listas; a cópia de "a" é o mesmo documento (conteúdo, arquivo e página)
+    assert [doc.page_content for doc in fundidos] == ["a", "c", "d"]
+    assert fundir_rrf([vetorial, lexical], k=10, rrf_k=60)[-1] is b
+
+
+def test_fundir_rrf_distingue_paginas_com_mesmo_texto():
+    fundidos = fundir_rrf([[_doc("x", pagina=1)], [_doc("x", pagina=2)]], k=4)
+
+    assert [doc.metadata["page"] for doc in fundidos] == [1, 2]
+
+
+def test_hybrid_retriever_aplica_o_filtro_nas_duas_buscas(tmp_path, embeddings):
+    docs = [
+        _doc("vendas do trimestre", "vendas.pdf", 1),
+        _doc("vendas por região", "vendas.pdf", 2),
+        _doc("vendas da filial", "filial.pdf", 1),
+    ]
+    store = FlatVectorStore(embeddings, str(tmp_path))
+    store.add_documents(docs)
+    indice = IndiceBM25()
+    indice.adicionar(docs)
+    retriever = HybridRetriever(
+        vetorial=store.as_retriever(search_kwargs={"k": 3}),
+        lexical=BM25Retriever(indice=indice),
+        k=3,
+    )
+
+    assert len(retriever.invoke("vendas")) == 3
+    filtrados = retriever.invoke("vendas", filter={"Arquivo": "filial.pdf"})
+    assert [doc.metadata["Arquivo"] for doc in filtrados] == ["filial.pdf"]
@@ -0,0 +1,96 @@
+from agents_ia.columnar import (
+    abrir_sidecar,
+    carregar_csv_colunar,
+    converter_csv,
+    limitar_sidecars,
+    liberar_sidecar,
+    reservar_sidecar,
+)
+import io
+import os
+
+import pandas as pd
+
+
+def _converter(tmp_path, conteudo: bytes, linhas_por_bloco: int = 3):
+    destino = str(tmp_path / "dados.arrow")
+    relatorio = converter_csv(
+        io.BytesIO(conteudo), destino, linhas_por_bloco=linhas_por_bloco
+    )
+    return abrir_sidecar(destino), relatorio["dtypes"]
+
+
+def test_coluna_numerica_que_vira_texto_preserva_os_blocos_anteriores(tmp_path):
+    df, dtypes = _converter(tmp_path, b"a,b\n1,2.5\n1,2.5\n1,2.5\nx,3\nx,3\nx,3")
+
+    # Os valores dos blocos numéricos não foram coletados como categorias: a coluna fica como texto
+    assert dtypes["a"] == "string"
+    assert list(df["a"]) == ["1", "1", "1", "x", "x", "x"]
+    assert list(df["b"]) == [2.5, 2.5, 2.5, 3.0, 3.0, 3.0]
+
+
+def test_coluna_texto_que_recebe_numeros_preserva_os_valores(tmp_path):
+    df, dtypes = _converter(tmp_path, b"a\nx\nx\nx\n1\n1\n1")
+
+    assert dtypes["a"] == "string"
+    assert list(df["a"]) == ["x", "x", "x", "1", "1", "1"]
+
+
+def test_inteiro_promovido_a_float_entre_blocos(tmp_path):
+    df, dtypes = _converter(tmp_path, b"n\n1\n2\n3\n4.5\n5\n6")
+
+    assert dtypes["n"] == "float32"
+    assert list(df["n"]) == [1.0, 2.0, 3.0, 4.5, 5.0, 6.0]
+
+
+def test_inteiros_reduzidos_ao_menor_tipo(tmp_path):
+    df, dtypes = _converter(tmp_path, b"p,n,g,f\n1,-1,70000,1.0\n2,,3,2.0\n3,5,4,\n")
+
+    assert dtypes["p"] == "uint8"
+    # Nulos usam os inteiros anuláveis; floats com valores inteiros também são reduzidos
+    assert dtypes["n"] == "Int8"
+    assert dtypes["g"] == "uint32"
+    assert dtypes["f"] == "UInt8"
+    assert df["n"].isna().tolist() == [False, True, False]
+
+
+def test_texto_repetido_vira_categoria(tmp_path):
+    conteudo = b"cor\n" + b"azul\nverde\n" * 6
+    df, dtypes = _converter(tmp_path, conteudo)
+
+    assert dtypes["cor"] == "category"
+    assert list(df["cor"]) == ["azul", "verde"] * 6
+    # Valores quase todos distintos continuam texto
+    _, dtypes = _converter(tmp_path, b"id\n" + b"\n".join(b"v%d" % i for i in range(9)))
+    assert dtypes["id"] == "string"
+
+
+def test_sidecar_reaproveitado_pelo_hash(tmp_path):
+    conteudo = b"a,b\n1,x\n2,y\n"
+    df, relatorio = carregar_csv_colunar(io.BytesIO(conteudo), "chave", str(tmp_path))
+    # Uma segunda carga não lê a fonte
+    novo, _ = carregar_csv_colunar(None, "chave", str(tmp_path))
+
+    pd.testing.assert_frame_equal(df, novo)
+    assert relatorio["linhas"] == 2
+    assert relatorio["sidecar"] == str(tmp_path / "chave.arrow")
+
+
+def test_limitar_sidecars_remove_os_mais_antigos_exceto_reservados(tmp_path):
+    caminhos = []
+    for indice, chave in enumerate(["a", "b", "c"]):
+        carregar_csv_colunar(io.BytesIO(b"v\n" + b"1\n" * 100), chave, str(tmp_path))
+        caminho = str(tmp_path / f"{chave}.arrow")
+        os.utime(caminho, (indice, indice))
+        caminhos.append(caminho)
+    tamanho = os.path.getsize(caminhos[0])
+
+    reservar_sidecar(caminhos[0])
+    try:
+        liberados = limitar_sidecars(str(tmp_path), max_bytes=tamanho)
+    finally:
+        liberar_sidecar(caminhos[0])
+
+    # "a" é o mais antigo, mas está reservado: saem "b" e "c"
+    assert liberados == 2 * tamanho
+    assert sorted(os.listdir(tmp_path)) == ["a.arrow", "a.json"]
@@ -0,0 +1,110 @@
+from agents_ia.dataframe_tools import (
+    CacheResultadosDataFrame,
+    normalizar_codigo,
+    perfil_dataframe,
+)
+from langchain_experimental.tools import PythonAstREPLTool
+
+import pandas as pd
+import pytest
+
+
+def _ferramenta():
+    df = pd.DataFrame({"cidade": ["a", "b", "a"], "valor": [1, 2, 3]})
+    return PythonAstREPLTool(locals={"df": df})
+
+
+def test_normaliza_formatacao_e_markdown():
+    assert normalizar_codigo("```python\ndf['valor'].sum()  # total\n```") == (
+        "df['valor'].sum()",
+        False,
+    )
+    assert normalizar_codigo("df[ 'valor' ].sum( )")[0] == "df['valor'].sum()"
+    assert normalizar_codigo("df[") is None
+
+
+@pytest.mark.parametrize(
+    "codigo",
+    [
+        "x = 1",
+        "x += 1",
+        "x: int = 1",
+        "import math",
+        "from math import pi",
+        "def f():\n    return 1",
+        "class A:\n    pass",
+        "del x",
+        "for i in range(3):\n    pass",
+        "with open('a') as arquivo:\n    pass",
+        "print([y := 1 for _ in range(2)])",
+        "df['nova'] = 1",
+        "df.valor = 0",
+        "df.drop(columns=['valor'], inplace=True)",
+        "lista.append(1)",
+        "exec('x = 1')",
+    ],
+)
+def test_codigo_que_altera_o_estado_do_repl(codigo):
+    assert normalizar_codigo(codigo)[1] is True
+
+
+@pytest.mark.parametrize(
+    "codigo",
+    [
+        "df['valor'].sum()",
+        "print(df.groupby('cidade')['valor'].mean())",
+        "[v * 2 for v in df['valor']]",
+        "df.apply(lambda linha: linha['valor'], axis=1).max()",
+    ],
+)
+def test_codigo_sem_efeitos(codigo):
+    assert normalizar_codigo(codigo)[1] is False
+
+
+def test_variaveis_do_repl_invalidam_os_resultados():
+    ferramenta = _ferramenta()
+    cache = CacheResultadosDataFrame()
+
+    assert cache.executar("x = 1", ferramenta.run) == ("", False)
+    assert cache.executar("print(x)", ferramenta.run) == ("1\n", False)
+    assert cache.executar("print(x)", ferramenta.run) == ("1\n", True)
+    cache.executar("x = 2", ferramenta.run)
+    assert cache.executar("print(x)", ferramenta.run) == ("2\n", False)
+
+
+def test_alteracao_do_dataframe_invalida_os_resultados():
+    ferramenta = _ferramenta()
+    cache = CacheResultadosDataFrame()
+
+    assert cache.executar("df['valor'].sum()", ferramenta.run) == ("6", False)
+    assert cache.executar("df[ 'valor' ].sum()", ferramenta.run) == ("6", True)
+    cache.executar("df.loc[0, 'valor'] = 10", ferramenta.run)
+
+    assert cache.executar("df['valor'].sum()", ferramenta.run) == ("15", False)
+    assert cache.estatisticas()["versao"] == 1
+
+
+def test_limite_de_itens_e_caracteres():
+    cache = CacheResultadosDataFrame(max_itens=2, max_caracteres=10)
+    executar = lambda codigo: codigo.strip("'")
+
+    cache.executar("'aaaa'", executar)
+    cache.executar("'bbbb'", executar)
+    cache.executar("'cccc'", executar)
+    # Resultados maiores que o limite não são guardados
+    cache.executar(f"'{'x' * 20}'", executar)
+
+    assert cache.executar("'aaaa'", executar)[1] is False
+    assert cache.executar("'cccc'", executar)[1] is True
+    assert cache.estatisticas()["caracteres"] <= 10
+
+
+def test_perfil_dataframe_resume_as_colunas():
+    df = pd.DataFrame({"cidade": ["a", "b", "a"], "valor": [1, 2, None]})
+
+    perfil = perfil_dataframe(df, max_colunas=1)
+
+    assert perfil.splitlines()[0] == "3 linhas x 2 colunas."
+    assert "'cidade' (object, 0 nulos): 2 distintos" in perfil
+    assert "'a' (2)" in perfil
+    assert perfil.splitlines()[-1] == "- ... e mais 1 colunas."
@@ -0,0 +1,102 @@
+from agents_ia.document_cache import DocumentCache
+from langchain_core.documents import Document
+import os
+
+import pandas as pd
+
+
+def _documentos(quantidade: int, tamanho: int = 10) -> list:
+    return [
+        Document(page_content=f"página {i} " + "x" * tamanho, metadata={"page": i})
+        for i in range(quantidade)
+    ]
+
+
+def test_documentos_gravados_voltam_iguais(tmp_path):
+    cache = DocumentCache(pasta=str(tmp_path))
+    chave = DocumentCache.hash_conteudo(b"arquivo")
+
+    assert cache.obter_documentos(chave, "paginas") is None
+    cache.salvar_documentos(chave, "paginas", _documentos(3))
+
+    lidos = list(cache.obter_documentos(chave, "paginas"))
+    assert [doc.page_content for doc in lidos] == [
+        doc.page_content for doc in _documentos(3)
+    ]
+    assert [doc.metadata for doc in lidos] == [{"page": 0}, {"page": 1}, {"page": 2}]
+    # Cada forma de extração tem a sua entrada
+    assert cache.obter_documentos(chave, "unstructured") is None
+    assert cache.estatisticas()["hits"] == 1
+
+
+def test_iterador_interrompido_nao_publica_entrada(tmp_path):
+    cache = DocumentCache(pasta=str(tmp_path))
+
+    for _ in cache.gravar_documentos("chave", "paginas", _documentos(3)):
+        break
+
+    assert cache.obter_documentos("chave", "paginas") is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_remove_os_arquivos_acessados_ha_mais_tempo(tmp_path):
+    cache = DocumentCache(pasta=str(tmp_path))
+    for indice, chave in enumerate(["a", "b", "c"]):
+        cache.salvar_documentos(chave, "paginas", _documentos(50, 200))
+        os.utime(cache._caminho(chave, "paginas.jsonl.gz"), (indice, indice))
+
+    # "a" é consultado e passa a ser o mais recente
+    assert cache.obter_documentos("a", "paginas") is not None
+    tamanho = os.path.getsize(cache._caminho("b", "paginas.jsonl.gz"))
+    cache.max_bytes = 2 * tamanho + tamanho // 2
+    cache._remover_excedentes()
+
+    assert cache.obter_documentos("b", "paginas") is None
+    assert cache.obter_documentos("a", "paginas") is not None
+    assert cache.obter_documentos("c", "paginas") is not None
+
+
+def test_dataframe_em_parquet(tmp_path):
+    cache = DocumentCache(pasta=str(tmp_path))
+    df = pd.DataFrame({"nome": ["a", "b"], "valor": [1, 2]})
+
+    assert cache.obter_dataframe("csv") is None
+    cache.salvar_dataframe("csv", df)
+
+    pd.testing.assert_frame_equal(cache.obter_dataframe("csv"), df)
+
+
+def test_remocao_lru_durante_a_leitura_nao_interrompe_os_documentos(tmp_path):
+    cache = DocumentCache(pasta=str(tmp_path))
+    cache.salvar_documentos("chave", "paginas", _documentos(3))
+
+    docs = cache.obter_documentos("chave", "paginas")
+    # Outra thread remove a entrada entre a consulta e a leitura dos documentos
+    os.remove(cache._caminho("chave", "paginas.jsonl.gz"))
+
+    assert [doc.metadata["page"] for doc in docs] == [0, 1, 2]
+    assert cache.obter_documentos("chave", "paginas") is None
+
+
+def test_entradas_ilegiveis_contam_como_miss(tmp_path):
+    cache = DocumentCache(pasta=str(tmp_path))
+    for sufixo in ("paginas.jsonl.gz", "csv.parquet"):
+        with open(cache._caminho("chave", sufixo), "wb") as arquivo:
+            arquivo.write(b"corrompido")
+
+    assert cache.obter_documentos("chave", "paginas") is None
+    assert cache.obter_dataframe("chave") is None
+    estatisticas = cache.estatisticas()
+    assert (estatisticas["hits"], estatisticas["misses"]) == (0, 2)
+
+
+def test_falha_ao_gravar_dataframe_preserva_a_entrada_publicada(tmp_path):
+    cache = DocumentCache(pasta=str(tmp_path))
+    df = pd.DataFrame({"nome": ["a", "b"], "valor": [1, 2]})
+    cache.salvar_dataframe("csv", df)
+
+    # Tipos mistos na mesma coluna não são representáveis em Parquet
+    cache.salvar_dataframe("csv", pd.DataFrame({"nome": ["a", 1]}))
+
+    pd.testing.assert_frame_equal(cache.obter_dataframe("csv"), df)
+    assert os.listdir(tmp_path) == ["csv.csv.parquet"]
@@ -0,0 +1,112 @@
+from agents_ia.embedding_batcher import EmbeddingBatcher
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import pytest
+
+from conftest import EmbeddingsFalsos, vetor_embedding
+
+
+def _em_paralelo(funcao, argumentos: list) -> list:
+    barreira = threading.Barrier(len(argumentos))
+
+    def chamar(argumento):
+        barreira.wait()
+        return funcao(argumento)
+
+    with ThreadPoolExecutor(max_workers=len(argumentos)) as executor:
+        return list(executor.map(chamar, argumentos))
+
+
+def test_agrupa_chamadas_simultaneas():
+    embeddings = EmbeddingsFalsos(atraso=0.02)
+    batcher = EmbeddingBatcher(embeddings, max_textos=32, espera_ms=50, concorrencia=1)
+    perguntas = [f"pergunta {i}" for i in range(16)]
+
+    vetores = _em_paralelo(batcher.embed_query, perguntas)
+
+    # Cada chamada recebe o próprio vetor, mas o modelo recebe poucas requisições
+    assert vetores == [vetor_embedding(p, embeddings.dimensao) for p in perguntas]
+    assert len(embeddings.chamadas) <= 3
+    assert sorted(embeddings.textos_enviados) == sorted(perguntas)
+    estatisticas = batcher.estatisticas()
+    assert estatisticas["pedidos"] == 16
+    assert estatisticas["lotes"] == len(embeddings.chamadas)
+
+
+def test_lote_respeita_max_textos():
+    embeddings = EmbeddingsFalsos()
+    batcher = EmbeddingBatcher(embeddings, max_textos=4, espera_ms=50, concorrencia=1)
+
+    _em_paralelo(batcher.embed_query, [f"pergunta {i}" for i in range(10)])
+
+    assert max(len(chamada) for chamada in embeddings.chamadas) <= 4
+
+
+def test_chamadas_grandes_vao_direto_ao_modelo():
+    embeddings = EmbeddingsFalsos()
+    batcher = EmbeddingBatcher(embeddings, max_textos=4)
+    textos = [f"chunk {i}" for i in range(4)]
+
+    assert batcher.embed_documents(textos) == embeddings.embed_documents(textos)
+    assert batcher.estatisticas()["diretas"] == 1
+    assert batcher.estatisticas()["lotes"] == 0
+    assert batcher.embed_documents([]) == []
+
+
+def test_textos_repetidos_sao_vetorizados_uma_vez():
+    embeddings = EmbeddingsFalsos(atraso=0.02)
+    batcher = EmbeddingBatcher(embeddings, max_textos=32, espera_ms=50, concorrencia=1)
+
+    vetores = _em_paralelo(batcher.embed_query, ["mesma pergunta"] * 8)
+
+    assert all(vetor == vetores[0] for vetor in vetores)
+    assert embeddings.textos_enviados.count("mesma pergunta") == len(
+        embeddings.chamadas
+    )
+    assert len(embeddings.chamadas) < 8
+
+
+def test_erro_do_modelo_chega_a_todas_as_chamadas_do_lote():
+    embeddings = EmbeddingsFalsos(erro=RuntimeError("modelo indisponível"))
+    batcher = EmbeddingBatcher(embeddings, max_textos=32, espera_ms=50, concorrencia=1)
+
+    def chamar(pergunta):
+        with pytest.raises(RuntimeError, match="modelo indisponível"):
+            batcher.embed_query(pergunta)
+        return True
+
+    assert all(_em_paralelo(chamar, [f"pergunta {i}" for i in range(4)]))
+
+    # O agrupador continua atendendo depois da falha
+    embeddings.erro = None
+    assert batcher.embed_query("outra") == vetor_embedding("outra", 32)
+
+
+class EmbeddingsIncompletos(EmbeddingsFalsos):
+    def embed_documents(self, texts):
+        return super().embed_documents(texts)[:-1]
+
+
+def test_resposta_incompleta_do_modelo_chega_a_todas_as_chamadas_do_lote():
+    embeddings = EmbeddingsIncompletos()
+    batcher = EmbeddingBatcher(embeddings, max_textos=32, espera_ms=50, concorrencia=1)
+    erros = []
+
+    def chamar(pergunta):
+        try:
+            batcher.embed_query(pergunta)
+        except ValueError as e:
+            erros.append(e)
+
+    # Threads daemon: sem o tratamento, parte das chamadas ficaria esperando para sempre
+    threads = [
+        threading.Thread(target=chamar, args=(f"p{i}",), daemon=True) for i in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert len(erros) == 4
+    assert "vetores para" in str(erros[0])
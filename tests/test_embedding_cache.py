@@ -0,0 +1,72 @@
+from agents_ia.embedding_cache import CachedEmbeddings, EmbeddingCache
+import asyncio
+import os
+
+from conftest import vetor_embedding
+
+
+def _cache(pasta, **parametros) -> EmbeddingCache:
+    return EmbeddingCache(
+        caminho=os.path.join(pasta, "embeddings.sqlite3"), **parametros
+    )
+
+
+def test_documentos_em_cache_nao_voltam_ao_modelo(tmp_path, embeddings):
+    cache = _cache(tmp_path)
+    cached = CachedEmbeddings(embeddings, modelo="m", cache=cache)
+
+    primeiros = cached.embed_documents(["a", "b", "a"])
+    segundos = cached.embed_documents(["b", "c"])
+
+    # Textos repetidos vão uma única vez ao modelo e só os ausentes do cache são enviados
+    assert embeddings.chamadas == [["a", "b"], ["c"]]
+    assert primeiros[0] == primeiros[2]
+    assert primeiros[1] == segundos[0]
+    assert segundos[1] == vetor_embedding("c", embeddings.dimensao)
+    assert cache.estatisticas()["itens"] == 3
+
+
+def test_vetores_persistem_entre_instancias(tmp_path, embeddings):
+    CachedEmbeddings(embeddings, modelo="m", cache=_cache(tmp_path)).embed_documents(
+        ["a"]
+    )
+
+    cache = _cache(tmp_path)
+    assert cache.obter("m", ["a"])[0] is not None
+    # A chave inclui o modelo
+    assert cache.obter("outro", ["a"]) == [None]
+
+
+def test_remove_os_vetores_acessados_ha_mais_tempo(tmp_path):
+    cache = _cache(tmp_path, max_itens=2)
+    cache.salvar("m", ["a"], [[1.0, 0.0]])
+    cache.salvar("m", ["b"], [[0.0, 1.0]])
+    cache.salvar("m", ["c"], [[1.0, 1.0]])
+
+    assert cache.obter("m", ["a", "b", "c"]) == [None, [0.0, 1.0], [1.0, 1.0]]
+
+
+def test_perguntas_ficam_so_no_lru_em_memoria(tmp_path, embeddings):
+    cache = _cache(tmp_path, max_consultas=2)
+    cached = CachedEmbeddings(embeddings, modelo="m", cache=cache)
+
+    for pergunta in ["p1", "p2", "p1", "p3"]:
+        cached.embed_query(pergunta)
+
+    estatisticas = cache.estatisticas()
+    assert estatisticas["itens"] == 0
+    assert estatisticas["consultas"] == 2
+    assert estatisticas["hits_consultas"] == 1
+    # "p2" foi a menos usada recentemente e saiu do LRU; "p1" continua
+    assert cache.obter_consulta("m", "p2") is None
+    assert cache.obter_consulta("m", "p1") is not None
+
+
+def test_aembed_query_usa_o_mesmo_cache(tmp_path, embeddings):
+    cached = CachedEmbeddings(embeddings, modelo="m", cache=_cache(tmp_path))
+
+    sincrono = cached.embed_query("pergunta")
+    assincrono = asyncio.run(cached.aembed_query("pergunta"))
+
+    assert sincrono == assincrono
+    assert embeddings.chamadas == [["pergunta"]]
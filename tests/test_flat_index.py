@@ -0,0 +1,162 @@
+from agents_ia.flat_index import FlatVectorStore, corresponde_filtro
+from langchain_core.documents import Document
+import os
+
+import pytest
+
+from conftest import vetor_embedding
+
+
+def _store(pasta, embeddings, quantidade: int = 6) -> FlatVectorStore:
+    store = FlatVectorStore(embeddings, str(pasta))
+    store.add_documents(
+        [
+            Document(
+                page_content=f"trecho {i}",
+                metadata={"Arquivo": f"arquivo_{i % 2}.pdf", "page": i},
+            )
+            for i in range(quantidade)
+        ]
+    )
+    return store
+
+
+def test_busca_exata(tmp_path, embeddings):
+    store = _store(tmp_path, embeddings)
+
+    doc, similaridade = store.similarity_search_with_score("trecho 3", k=1)[0]
+
+    assert doc.page_content == "trecho 3"
+    assert similaridade == pytest.approx(1.0, abs=1e-5)
+    pontuacoes = [s for _, s in store.similarity_search_with_score("trecho 3", k=6)]
+    assert pontuacoes == sorted(pontuacoes, reverse=True)
+
+
+def test_filtros_de_metadados():
+    metadata = {"Arquivo": "a.pdf", "page": 3}
+
+    assert corresponde_filtro(metadata, {"Arquivo": "a.pdf"})
+    assert corresponde_filtro(metadata, {"Arquivo": {"$in": ["a.pdf", "b.pdf"]}})
+    assert not corresponde_filtro(metadata, {"Arquivo": {"$nin": ["a.pdf"]}})
+    assert corresponde_filtro(metadata, {"page": {"$gte": 3, "$lt": 4}})
+    assert not corresponde_filtro({"Arquivo": "a.pdf"}, {"page": {"$gt": 0}})
+    assert corresponde_filtro(
+        metadata, {"$and": [{"Arquivo": "a.pdf"}, {"$or": [{"page": 1}, {"page": 3}]}]}
+    )
+    assert not corresponde_filtro(metadata, {"$or": [{"page": 1}, {"page": 2}]})
+    assert corresponde_filtro(metadata, lambda m: m["page"] % 2 == 1)
+
+
+def test_busca_com_filtro(tmp_path, embeddings):
+    store = _store(tmp_path, embeddings)
+
+    docs = store.similarity_search("trecho 3", k=6, filter={"Arquivo": "arquivo_0.pdf"})
+    assert sorted(doc.metadata["page"] for doc in docs) == [0, 2, 4]
+    assert store.similarity_search("trecho 3", filter={"Arquivo": "outro.pdf"}) == []
+
+
+def test_mmr_retorna_documentos_distintos(tmp_path, embeddings):
+    store = _store(tmp_path, embeddings)
+
+    docs = store.max_marginal_relevance_search("trecho 1", k=3, fetch_k=6)
+
+    assert len(docs) == 3
+    assert len({doc.id for doc in docs}) == 3
+    assert docs[0].page_content == "trecho 1"
+
+
+def test_remover_e_reabrir(tmp_path, embeddings):
+    store = _store(tmp_path, embeddings)
+
+    assert store.remover({"Arquivo": "arquivo_1.pdf"}) == 3
+    assert store.remover({"Arquivo": "arquivo_1.pdf"}) == 0
+    reaberto = FlatVectorStore(embeddings, str(tmp_path))
+
+    assert len(reaberto) == 3
+    doc, similaridade = reaberto.similarity_search_with_score("trecho 4", k=1)[0]
+    assert doc.page_content == "trecho 4"
+    assert similaridade == pytest.approx(1.0, abs=1e-5)
+    assert reaberto.similarity_search("trecho 1", k=6, filter={"page": 1}) == []
+
+
+def _consultar(pasta, embeddings, texto: str):
+    reaberto = FlatVectorStore(embeddings, str(pasta))
+    return reaberto.similarity_search_with_score(texto, k=1)[0]
+
+
+def test_documentos_sem_vetor_sao_descartados_ao_reabrir(tmp_path, embeddings):
+    store = _store(tmp_path, embeddings, quantidade=2)
+    # Simula uma gravação interrompida depois dos documentos e antes dos vetores
+    with open(store._caminho_documentos, "a", encoding="utf-8") as arquivo:
+        arquivo.write('{"id": "x", "page_content": "ORFAO", "metadata": {}}\n')
+    reaberto = FlatVectorStore(embeddings, str(tmp_path))
+    assert len(reaberto) == 2
+
+    # As gravações seguintes continuam alinhadas com as linhas da matriz
+    reaberto.add_texts(["b"])
+    doc, similaridade = _consultar(tmp_path, embeddings, "b")
+    assert doc.page_content == "b"
+    assert similaridade == pytest.approx(1.0, abs=1e-5)
+    assert len(FlatVectorStore(embeddings, str(tmp_path))) == 3
+
+
+def test_gravacao_nao_confirmada_e_descartada(tmp_path, embeddings):
+    store = _store(tmp_path, embeddings, quantidade=2)
+    # Documento e parte do vetor gravados, sem a confirmação no flat.json
+    with open(store._caminho_documentos, "a", encoding="utf-8") as arquivo:
+        arquivo.write('{"id": "x", "page_content": "ORFAO", "metadata": {}}\n')
+        arquivo.write('{"id": "y", "page_c')
+    with open(store._caminho_vetores, "ab") as arquivo:
+        arquivo.write(b"\x00" * 4 * (embeddings.dimensao + 3))
+
+    reaberto = FlatVectorStore(embeddings, str(tmp_path))
+    assert len(reaberto) == 2
+    reaberto.add_texts(["b"])
+
+    doc, similaridade = _consultar(tmp_path, embeddings, "b")
+    assert doc.page_content == "b"
+    assert similaridade == pytest.approx(1.0, abs=1e-5)
+    assert _consultar(tmp_path, embeddings, "trecho 1")[0].page_content == "trecho 1"
+
+
+def test_remocao_interrompida_mantem_a_geracao_anterior(tmp_path, embeddings):
+    store = _store(tmp_path, embeddings, quantidade=4)
+    confirmar = store._confirmar
+
+    def falhar(*args):
+        raise OSError("interrompido")
+
+    # A nova geração é gravada, mas a troca do flat.json não acontece
+    store._confirmar = falhar
+    with pytest.raises(OSError):
+        store.remover({"Arquivo": "arquivo_0.pdf"})
+    store._confirmar = confirmar
+
+    reaberto = FlatVectorStore(embeddings, str(tmp_path))
+    assert len(reaberto) == 4
+    assert sorted(os.listdir(tmp_path)) == [
+        "documentos.jsonl",
+        "flat.json",
+        "vetores.f32",
+    ]
+    for i in range(4):
+        doc, similaridade = _consultar(tmp_path, embeddings, f"trecho {i}")
+        assert doc.page_content == f"trecho {i}"
+
+    # Uma remoção concluída passa a valer e apaga a geração anterior
+    assert reaberto.remover({"Arquivo": "arquivo_0.pdf"}) == 2
+    assert sorted(os.listdir(tmp_path)) == [
+        "documentos.1.jsonl",
+        "flat.json",
+        "vetores.1.f32",
+    ]
+    assert _consultar(tmp_path, embeddings, "trecho 3")[0].page_content == "trecho 3"
+
+
+def test_dimensao_diferente_da_colecao(tmp_path, embeddings):
+    store = _store(tmp_path, embeddings, quantidade=1)
+
+    with pytest.raises(ValueError):
+        store.adicionar_vetores(
+            [Document(page_content="outro")], [vetor_embedding("outro", 8)]
+        )
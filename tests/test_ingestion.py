@@ -0,0 +1,112 @@
+from agents_ia import batch_ingestion
+from agents_ia.batch_ingestion import dividir_em_lote
+from agents_ia.embedding import EmbeddingProcessor
+from agents_ia.flat_index import FlatVectorStore
+from agents_ia.ingestion import PipelineIngestao, identificar_chunks
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.documents import Document
+import hashlib
+import uuid
+
+import pytest
+
+from conftest import EmbeddingsFalsos
+
+
+class EmbeddingsInstaveis(EmbeddingsFalsos):
+    def __init__(self, falhar_na_chamada: int):
+        """
+        Embeddings falsos que falham a partir da n-ésima chamada, simulando uma ingestão interrompida.
+
+        falhar_na_chamada: número da primeira chamada que falha.
+
+        return: None
+        """
+        super().__init__()
+        self.falhar_na_chamada = falhar_na_chamada
+
+    def embed_documents(self, texts):
+        if len(self.chamadas) + 1 >= self.falhar_na_chamada:
+            self.chamadas.append(list(texts))
+            raise RuntimeError("Ollama indisponível")
+        return super().embed_documents(texts)
+
+
+def _chunks(nome: str, quantidade: int) -> list:
+    return [
+        Document(
+            page_content=f"{nome} trecho {i}", metadata={"Arquivo": nome, "page": i}
+        )
+        for i in range(quantidade)
+    ]
+
+
+def _ids_gravados(processor: EmbeddingProcessor) -> list:
+    vectorstore = processor._abrir_vectorstore()
+    if isinstance(vectorstore, FlatVectorStore):
+        return list(vectorstore._ids)
+    return vectorstore.get(include=[])["ids"]
+
+
+def test_ids_deterministicos_por_posicao():
+    ids = [doc.id for doc in identificar_chunks(_chunks("a.pdf", 3), "hash")]
+
+    assert ids == ["hash:0", "hash:1", "hash:2"]
+
+
+@pytest.mark.parametrize("backend", ["flat", "chroma"])
+def test_nova_tentativa_nao_duplica_chunks(backend):
+    session_id = uuid.uuid4().hex[:12]
+
+    def ingerir(embeddings):
+        processor = EmbeddingProcessor(
+            data=_chunks("a.pdf", 7),
+            session_id=session_id,
+            tamanho_lote=2,
+            max_concorrencia=1,
+            backend=backend,
+        )
+        processor.embeddings = embeddings
+        processor.create_retriever(dividir=False, prefixo_ids="hash-a")
+        return processor
+
+    # A terceira requisição falha: dois lotes (4 chunks) já estão gravados
+    with pytest.raises(RuntimeError):
+        ingerir(EmbeddingsInstaveis(falhar_na_chamada=3))
+    processor = ingerir(EmbeddingsFalsos())
+
+    assert sorted(_ids_gravados(processor)) == [f"hash-a:{i}" for i in range(7)]
+    docs = processor._abrir_vectorstore().similarity_search("a.pdf trecho 5", k=7)
+    assert sorted(doc.page_content for doc in docs) == sorted(
+        doc.page_content for doc in _chunks("a.pdf", 7)
+    )
+
+
+def test_flat_substitui_ids_repetidos(tmp_path, embeddings):
+    store = FlatVectorStore(embeddings, str(tmp_path))
+    pipeline = PipelineIngestao(embeddings, store, tamanho_lote=2)
+
+    pipeline.executar(list(identificar_chunks(_chunks("a.pdf", 3), "h")))
+    pipeline.executar(list(identificar_chunks(_chunks("a.pdf", 5), "h")))
+
+    reaberto = FlatVectorStore(embeddings, str(tmp_path))
+    assert sorted(reaberto._ids) == [f"h:{i}" for i in range(5)]
+    doc, similaridade = reaberto.similarity_search_with_score("a.pdf trecho 1", k=1)[0]
+    assert (doc.id, doc.page_content) == ("h:1", "a.pdf trecho 1")
+    assert similaridade == pytest.approx(1.0, abs=1e-5)
+
+
+def test_lote_atribui_ids_pelo_conteudo_de_cada_arquivo(monkeypatch):
+    def processar_pdf(nome, dados, *args):
+        return _chunks(nome, 2), 0.0
+
+    monkeypatch.setattr(batch_ingestion, "processar_pdf", processar_pdf)
+    arquivos = [("a.pdf", b"conteudo a"), ("a.pdf", b"outro conteudo")]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        docs = list(dividir_em_lote(arquivos, executor=executor))
+
+    hashes = [hashlib.sha256(dados).hexdigest() for _, dados in arquivos]
+    assert sorted(doc.id for doc in docs) == sorted(
+        f"{hash_}:{i}" for hash_ in hashes for i in range(2)
+    )
@@ -0,0 +1,146 @@
+from agents_ia.jobs import FilaIngestao
+import threading
+import time
+
+
+def _aguardar(jobs, timeout: float = 10.0):
+    limite = time.time() + timeout
+    while not all(job.finalizado for job in jobs):
+        assert time.time() < limite, "job não terminou"
+        time.sleep(0.01)
+
+
+class _Tarefa:
+    def __init__(self, erro: Exception = None):
+        self.execucoes = []
+        self.erro = erro
+        self.liberar = threading.Event()
+        self.liberar.set()
+
+    def __call__(self, job, arquivo):
+        self.liberar.wait(5)
+        self.execucoes.append((job.arquivo, arquivo.read()))
+        if self.erro is not None:
+            raise self.erro
+        return len(self.execucoes)
+
+
+def test_mesmo_conteudo_devolve_o_mesmo_job():
+    fila = FilaIngestao(max_workers=2)
+    tarefa = _Tarefa()
+
+    job = fila.submeter("s1", "a.pdf", b"conteudo", tarefa)
+    # Outro nome com o mesmo conteúdo, antes e depois do fim do processamento
+    assert fila.submeter("s1", "copia.pdf", b"conteudo", tarefa) is job
+    _aguardar([job])
+    assert fila.submeter("s1", "a.pdf", b"conteudo", tarefa) is job
+
+    assert job.status == "concluido"
+    assert job.resultado == 1
+    assert tarefa.execucoes == [("a.pdf", b"conteudo")]
+    # Outra sessão tem o seu próprio job
+    outro = fila.submeter("s2", "a.pdf", b"conteudo", tarefa)
+    _aguardar([outro])
+    assert outro is not job
+    assert len(tarefa.execucoes) == 2
+
+
+def test_job_com_erro_e_reenviado():
+    fila = FilaIngestao()
+    tarefa = _Tarefa(erro=ValueError("PDF inválido"))
+
+    job = fila.submeter("s1", "a.pdf", b"conteudo", tarefa)
+    _aguardar([job])
+    assert job.status == "erro"
+    assert job.erro == "PDF inválido"
+
+    tarefa.erro = None
+    novo = fila.submeter("s1", "a.pdf", b"conteudo", tarefa)
+    _aguardar([novo])
+    assert novo is not job
+    assert novo.status == "concluido"
+    assert fila.jobs("s1") == [novo]
+
+
+def test_esquecer_permite_reprocessar():
+    fila = FilaIngestao()
+    tarefa = _Tarefa()
+    job = fila.submeter("s1", "a.pdf", b"a", tarefa)
+    outro = fila.submeter("s1", "b.pdf", b"b", tarefa)
+    _aguardar([job, outro])
+
+    assert fila.esquecer("s1", job.hash) == 1
+    assert fila.jobs("s1") == [outro]
+    novo = fila.submeter("s1", "a.pdf", b"a", tarefa)
+    _aguardar([novo])
+    assert novo is not job
+    assert len(tarefa.execucoes) == 3
+    assert fila.esquecer("s1") == 2
+
+
+def test_esquecer_mantem_jobs_em_andamento():
+    fila = FilaIngestao()
+    tarefa = _Tarefa()
+    tarefa.liberar.clear()
+    job = fila.submeter("s1", "a.pdf", b"a", tarefa)
+
+    assert fila.sessoes_ativas() == ["s1"]
+    assert fila.esquecer("s1") == 0
+    assert fila.submeter("s1", "a.pdf", b"a", tarefa) is job
+
+    tarefa.liberar.set()
+    _aguardar([job])
+    assert fila.sessoes_ativas() == []
+
+
+def test_submeter_lote_ignora_arquivos_ja_enviados():
+    fila = FilaIngestao()
+    lotes = []
+
+    def tarefa_lote(jobs, arquivos):
+        lotes.append([nome for nome, _ in arquivos])
+
+    anterior = fila.submeter("s1", "a.pdf", b"a", _Tarefa())
+    _aguardar([anterior])
+    jobs = fila.submeter_lote(
+        "s1",
+        [("a.pdf", b"a"), ("b.pdf", b"b"), ("b2.pdf", b"b"), ("c.pdf", b"c")],
+        tarefa_lote,
+    )
+    _aguardar(jobs)
+
+    assert jobs[0] is anterior
+    assert jobs[1] is jobs[2]
+    assert lotes == [["b.pdf", "c.pdf"]]
+    assert all(job.status == "concluido" for job in jobs)
+
+
+def test_jobs_da_mesma_sessao_rodam_um_por_vez():
+    fila = FilaIngestao(max_workers=4)
+    simultaneos = []
+    ativos = [0]
+    lock = threading.Lock()
+
+    def tarefa(job, arquivo):
+        with lock:
+            ativos[0] += 1
+            simultaneos.append(ativos[0])
+        time.sleep(0.02)
+        with lock:
+            ativos[0] -= 1
+
+    jobs = [fila.submeter("s1", f"{i}.pdf", bytes([i]), tarefa) for i in range(4)]
+    _aguardar(jobs)
+
+    assert max(simultaneos) == 1
+
+
+def test_lock_sessao_e_reentrante():
+    fila = FilaIngestao()
+    lock = fila.lock_sessao("s1")
+
+    assert fila.lock_sessao("s1") is lock
+    assert fila.lock_sessao("s2") is not lock
+    with lock:
+        assert lock.acquire(timeout=0.1)
+        lock.release()
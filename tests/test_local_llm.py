@@ -0,0 +1,91 @@
+from LLM.local_llm import LimiteModelo, _TransporteLimitado
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import threading
+import time
+
+import httpx
+
+
+def test_limita_requisicoes_simultaneas_entre_threads():
+    limite = LimiteModelo(2)
+    picos = []
+    lock = threading.Lock()
+
+    def requisicao(_):
+        with limite.reservar():
+            with lock:
+                picos.append(limite.em_uso)
+            time.sleep(0.01)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(requisicao, range(16)))
+
+    assert max(picos) == 2
+    assert limite.estatisticas() == {"limite": 2, "em_uso": 0, "aguardando": 0}
+
+
+def test_vagas_sao_entregues_na_ordem_de_chegada():
+    limite = LimiteModelo(1)
+    ordem = []
+    limite.adquirir()
+
+    def esperar(indice):
+        with limite.reservar():
+            ordem.append(indice)
+
+    threads = []
+    for indice in range(4):
+        thread = threading.Thread(target=esperar, args=(indice,))
+        thread.start()
+        threads.append(thread)
+        while limite.aguardando <= indice:
+            time.sleep(0.001)
+    limite.liberar()
+    for thread in threads:
+        thread.join(5)
+
+    assert ordem == [0, 1, 2, 3]
+    assert limite.em_uso == 0
+
+
+def test_espera_assincrona_cancelada_nao_perde_a_vaga():
+    limite = LimiteModelo(1)
+
+    async def cenario():
+        limite.adquirir()
+        tarefa = asyncio.create_task(limite.aadquirir())
+        await asyncio.sleep(0.01)
+        assert limite.aguardando == 1
+        tarefa.cancel()
+        await asyncio.gather(tarefa, return_exceptions=True)
+        limite.liberar()
+        # A vaga volta a ficar livre e atende as esperas seguintes
+        async with limite.areservar():
+            assert limite.em_uso == 1
+
+    asyncio.run(cenario())
+    assert limite.estatisticas() == {"limite": 1, "em_uso": 0, "aguardando": 0}
+
+
+def test_transporte_ocupa_a_vaga_ate_fechar_a_resposta():
+    limite = LimiteModelo(1)
+    transporte = _TransporteLimitado(limite, httpx.Limits())
+    url = f"{os.environ['OLLAMA_URL']}/api/tags"
+
+    with httpx.Client(transport=transporte) as cliente:
+        with cliente.stream("GET", url) as resposta:
+            assert limite.em_uso == 1
+            resposta.read()
+        assert limite.em_uso == 0
+        assert cliente.get(url).json() == {"models": []}
+    assert limite.em_uso == 0
+
+    async def assincrono():
+        async with httpx.AsyncClient(transport=transporte) as cliente:
+            respostas = await asyncio.gather(*(cliente.get(url) for _ in range(4)))
+        return [resposta.status_code for resposta in respostas]
+
+    assert asyncio.run(assincrono()) == [200] * 4
+    assert limite.em_uso == 0
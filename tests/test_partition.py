@@ -0,0 +1,138 @@
+from agents_ia.flat_index import FlatVectorStore
+from agents_ia.partition import (
+    CentroidesArquivos,
+    RoteadorArquivos,
+    arquivos_citados,
+)
+from langchain_core.documents import Document
+
+import pytest
+
+from conftest import vetor_embedding
+
+# Cada arquivo recebe um único chunk com o mesmo vetor da consulta associada a ele,
+# o que torna o centroide do arquivo idêntico ao embedding dessa consulta
+CONSULTAS = {
+    "attention.pdf": "pergunta sobre o modelo",
+    "Relatório 2023.pdf": "pergunta sobre o ano",
+    "vendas.csv": "o que é attention?",
+}
+
+
+def _docs() -> list:
+    return [
+        Document(page_content=f"conteúdo de {arquivo}", metadata={"Arquivo": arquivo})
+        for arquivo in CONSULTAS
+    ]
+
+
+def _centroides(dimensao: int) -> CentroidesArquivos:
+    centroides = CentroidesArquivos()
+    centroides.adicionar(
+        _docs(),
+        [vetor_embedding(consulta, dimensao) for consulta in CONSULTAS.values()],
+    )
+    return centroides
+
+
+def _roteador(pasta, embeddings, **parametros) -> RoteadorArquivos:
+    store = FlatVectorStore(embeddings, str(pasta))
+    store.add_documents(_docs())
+    embeddings.chamadas.clear()
+    return RoteadorArquivos(
+        retriever=store.as_retriever(search_kwargs={"k": 3}),
+        centroides=_centroides(embeddings.dimensao),
+        embeddings=embeddings,
+        **parametros,
+    )
+
+
+def test_citacoes_explicitas_e_mencoes():
+    arquivos = list(CONSULTAS)
+
+    # Nome com extensão, com acentos e pontuação diferentes dos do arquivo
+    assert arquivos_citados("o que diz o relatorio-2023.PDF?", arquivos) == (
+        ["Relatório 2023.pdf"],
+        [],
+    )
+    # Nome sem extensão entre aspas
+    assert arquivos_citados("resuma o 'relatório 2023'", arquivos) == (
+        ["Relatório 2023.pdf"],
+        [],
+    )
+    # Nome sem extensão solto no texto é só uma menção
+    assert arquivos_citados("o que é attention?", arquivos) == ([], ["attention.pdf"])
+    assert arquivos_citados("resuma os documentos", arquivos) == ([], [])
+
+
+def test_centroides_ranqueiam_e_persistem(tmp_path):
+    centroides = _centroides(32)
+    consulta = vetor_embedding(CONSULTAS["vendas.csv"], 32)
+
+    arquivo, similaridade = centroides.ranquear(consulta)[0]
+    assert arquivo == "vendas.csv"
+    assert similaridade == pytest.approx(1.0, abs=1e-5)
+
+    caminho = str(tmp_path / "centroides.json")
+    centroides.remover("attention.pdf")
+    centroides.salvar(caminho)
+    carregados = CentroidesArquivos.carregar(caminho)
+    assert carregados.arquivos == ["Relatório 2023.pdf", "vendas.csv"]
+    assert [item[0] for item in carregados.ranquear(consulta)] == [
+        item[0] for item in centroides.ranquear(consulta)
+    ]
+    assert CentroidesArquivos.carregar(str(tmp_path / "ausente.json")).arquivos == []
+
+
+def test_citacao_explicita_restringe_sem_consultar_os_centroides(tmp_path, embeddings):
+    roteador = _roteador(tmp_path, embeddings, max_arquivos=1)
+
+    assert roteador.rotear("compare o attention.pdf com o 'vendas'") == [
+        "attention.pdf",
+        "vendas.csv",
+    ]
+    assert embeddings.chamadas == []
+
+
+def test_sem_citacao_usa_o_centroide_mais_proximo(tmp_path, embeddings):
+    roteador = _roteador(tmp_path, embeddings, max_arquivos=1)
+
+    assert roteador.rotear(CONSULTAS["Relatório 2023.pdf"]) == ["Relatório 2023.pdf"]
+    assert embeddings.chamadas == [[CONSULTAS["Relatório 2023.pdf"]]]
+
+
+def test_mencao_nao_exclui_o_centroide_mais_proximo(tmp_path, embeddings):
+    roteador = _roteador(tmp_path, embeddings, max_arquivos=1)
+
+    # "attention" é só uma menção: o arquivo entra na busca junto com o de centroide mais próximo
+    assert roteador.rotear("o que é attention?") == ["attention.pdf", "vendas.csv"]
+
+
+def test_sem_citacao_explicita_nao_restringe_sem_embeddings_ou_com_poucos_arquivos(
+    tmp_path, embeddings
+):
+    lexical = _roteador(tmp_path / "lexical", embeddings, max_arquivos=1)
+    lexical.embeddings = None
+    assert lexical.rotear("o que é attention?") is None
+    assert lexical.rotear("resuma o attention.pdf") == ["attention.pdf"]
+
+    # Com até `max_arquivos` arquivos, a busca já percorre todos
+    roteador = _roteador(tmp_path / "todos", embeddings, max_arquivos=3)
+    assert roteador.rotear("o que é attention?") is None
+    assert embeddings.chamadas == []
+
+
+def test_filtro_chega_ao_retriever(tmp_path, embeddings):
+    roteador = _roteador(tmp_path, embeddings, max_arquivos=1)
+
+    docs = roteador.invoke("compare o attention.pdf e o vendas.csv")
+    assert sorted(doc.metadata["Arquivo"] for doc in docs) == [
+        "attention.pdf",
+        "vendas.csv",
+    ]
+    docs = roteador.invoke(CONSULTAS["Relatório 2023.pdf"])
+    assert [doc.metadata["Arquivo"] for doc in docs] == ["Relatório 2023.pdf"]
+
+    # Sem roteamento, a busca não recebe filtro
+    roteador.max_arquivos = 3
+    assert len(roteador.invoke("resuma os documentos")) == 3
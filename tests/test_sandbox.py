@@ -0,0 +1,107 @@
+from agents_ia.sandbox import ExecutorSandbox, preparar_sidecar, truncar_resultado
+import os
+
+import pandas as pd
+import pytest
+
+
+@pytest.fixture(scope="module")
+def sidecar(tmp_path_factory) -> str:
+    df = pd.DataFrame({"cidade": ["Recife", "Natal", "Belém"], "vendas": [10, 20, 30]})
+    return preparar_sidecar(df, "vendas", str(tmp_path_factory.mktemp("colunar")))
+
+
+@pytest.fixture(scope="module")
+def executor(sidecar):
+    executor = ExecutorSandbox(
+        sidecar, processos=1, tempo_cpu=1, timeout=30, max_caracteres=200
+    )
+    yield executor
+    executor.fechar()
+
+
+@pytest.fixture(scope="module")
+def executor_restrito(sidecar):
+    executor = ExecutorSandbox(
+        sidecar, processos=1, tempo_cpu=30, timeout=2, memoria_mb=100
+    )
+    yield executor
+    executor.fechar()
+
+
+def test_truncar_resultado_mantem_inicio_e_fim():
+    assert truncar_resultado("curto", 10) == "curto"
+
+    texto = "início " + "x" * 1000 + " fim"
+    truncado = truncar_resultado(texto, 100)
+
+    assert truncado.startswith("início ")
+    assert truncado.endswith(" fim")
+    assert f"[saída truncada: {len(texto)} caracteres no total]" in truncado
+    assert len(truncado) < 200
+
+
+def test_chamadas_nao_compartilham_estado(executor):
+    assert executor.executar("df['total'] = df['vendas'] * 2\ny = 5\ndf.shape") == (
+        "(3, 3)"
+    )
+
+    # Cada chamada parte do DataFrame original e de um namespace novo
+    assert executor.executar("df.shape") == "(3, 2)"
+    assert executor.executar("y") == "NameError: name 'y' is not defined"
+    assert executor.executar("int(df['vendas'].sum())") == "60"
+
+
+def test_resultado_e_truncado_no_worker(executor):
+    resultado = executor.executar("'a' * 5000")
+
+    assert "[saída truncada: 5000 caracteres no total]" in resultado
+    assert len(resultado) < 300
+
+
+def test_limite_de_tempo_de_cpu(executor):
+    pytest.importorskip("resource")
+    reinicios = executor.estatisticas()["reinicios"]
+
+    resultado = executor.executar("while True:\n    pass")
+
+    assert resultado.startswith("TempoCPUExcedido")
+    # O limite é aplicado dentro do worker, que continua atendendo
+    assert executor.estatisticas()["reinicios"] == reinicios
+    assert executor.executar("df.shape") == "(3, 2)"
+
+
+def test_tempo_maximo_recria_o_worker(executor_restrito):
+    reinicios = executor_restrito.estatisticas()["reinicios"]
+
+    resultado = executor_restrito.executar("import time\ntime.sleep(10)")
+
+    assert resultado == "TimeoutError: a execução excedeu 2s e foi interrompida."
+    assert executor_restrito.estatisticas()["reinicios"] == reinicios + 1
+    assert executor_restrito.executar("df.shape") == "(3, 2)"
+
+
+@pytest.mark.skipif(
+    not os.path.exists("/proc/self/statm"), reason="memória lida do /proc"
+)
+def test_limite_de_memoria_recria_o_worker(executor_restrito):
+    reinicios = executor_restrito.estatisticas()["reinicios"]
+
+    resultado = executor_restrito.executar(
+        "dados = b'x' * (300 * 2**20)\nimport time\ntime.sleep(10)"
+    )
+
+    assert resultado == "MemoryError: a execução excedeu 100 MB e foi interrompida."
+    assert executor_restrito.estatisticas()["reinicios"] == reinicios + 1
+    assert executor_restrito.executar("df.shape") == "(3, 2)"
+
+
+def test_executor_fechado_encerra_os_workers(sidecar):
+    executor = ExecutorSandbox(sidecar, processos=1)
+    processos = [worker.processo for worker in executor._workers]
+
+    executor.fechar()
+
+    assert not any(processo.is_alive() for processo in processos)
+    with pytest.raises(RuntimeError):
+        executor.executar("df.shape")
@@ -0,0 +1,180 @@
+from agents_ia.bm25 import IndiceBM25
+from agents_ia.embedding import EmbeddingProcessor
+from agents_ia.jobs import obter_fila_ingestao
+from agents_ia.partition import CentroidesArquivos
+from agents_ia.storage import ArmazenamentoSessoes, pasta_sessao
+from agents_ia.tracing import Trace, obter_registro_traces
+from langchain_core.documents import Document
+import os
+import time
+import uuid
+
+import pytest
+
+from test_jobs import _aguardar
+
+
+def _nova_sessao() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def _indexar(
+    armazenamento: ArmazenamentoSessoes,
+    session_id: str,
+    backend: str,
+    arquivos: dict,
+) -> EmbeddingProcessor:
+    docs = [
+        Document(
+            page_content=f"{nome} trecho {i} sobre {nome.split('.')[0]}",
+            metadata={"Arquivo": nome, "page": i},
+        )
+        for nome, quantidade in arquivos.items()
+        for i in range(quantidade)
+    ]
+    processor = EmbeddingProcessor(data=docs, session_id=session_id, backend=backend)
+    processor.create_retriever(dividir=False)
+    armazenamento.registrar_arquivos(
+        session_id,
+        [(nome, f"hash-{nome}", 100) for nome in arquivos],
+        backend,
+    )
+    return processor
+
+
+def _envelhecer(armazenamento: ArmazenamentoSessoes, session_id: str, segundos: float):
+    with armazenamento._lock:
+        armazenamento._sessoes[session_id]["ultimo_acesso"] -= segundos
+
+
+@pytest.mark.parametrize("backend", ["flat", "chroma"])
+def test_remover_arquivo_atualiza_colecao_e_manifesto(backend):
+    armazenamento = ArmazenamentoSessoes(fracao_compactacao=1.0)
+    session_id = _nova_sessao()
+    processor = _indexar(armazenamento, session_id, backend, {"a.pdf": 3, "b.pdf": 2})
+    assert armazenamento.sessao(session_id)["chunks"] == 5
+    assert armazenamento.arquivo_indexado(session_id, "hash-a.pdf") == "a.pdf"
+
+    assert armazenamento.remover_arquivo(session_id, "a.pdf") == 3
+
+    registro = armazenamento.sessao(session_id)
+    assert list(registro["arquivos"]) == ["b.pdf"]
+    assert registro["chunks"] == 2
+    assert armazenamento.arquivo_indexado(session_id, "hash-a.pdf") is None
+    indice = IndiceBM25.carregar(processor.bm25_path)
+    assert {doc["metadata"]["Arquivo"] for doc in indice.documentos} == {"b.pdf"}
+    assert CentroidesArquivos.carregar(processor.centroides_path).contagens == {
+        "b.pdf": 2
+    }
+    reaberto = EmbeddingProcessor(data=None, session_id=session_id, backend=backend)
+    docs = reaberto._abrir_vectorstore().similarity_search("a.pdf trecho 0", k=5)
+    assert {doc.metadata["Arquivo"] for doc in docs} == {"b.pdf"}
+
+    with pytest.raises(KeyError):
+        armazenamento.remover_arquivo(session_id, "a.pdf")
+    armazenamento.remover_sessao(session_id)
+
+
+def test_compactacao_do_chroma_mantem_os_chunks_atuais():
+    armazenamento = ArmazenamentoSessoes(fracao_compactacao=0.3)
+    session_id = _nova_sessao()
+    _indexar(armazenamento, session_id, "chroma", {"a.pdf": 20, "b.pdf": 10})
+
+    armazenamento.remover_arquivo(session_id, "a.pdf")
+
+    # 20 de 30 chunks removidos: a coleção é reconstruída e o contador zerado
+    registro = armazenamento.sessao(session_id)
+    assert registro["chunks_removidos"] == 0
+    assert registro["chunks"] == 10
+    reaberto = EmbeddingProcessor(data=None, session_id=session_id, backend="chroma")
+    vectorstore = reaberto._abrir_vectorstore()
+    assert len(vectorstore.get(include=[])["ids"]) == 10
+    doc = vectorstore.similarity_search("b.pdf trecho 3 sobre b", k=1)[0]
+    assert doc.page_content == "b.pdf trecho 3 sobre b"
+    armazenamento.remover_sessao(session_id)
+
+
+def test_remocao_descarta_jobs_concluidos():
+    armazenamento = ArmazenamentoSessoes(fracao_compactacao=1.0)
+    session_id = _nova_sessao()
+    _indexar(armazenamento, session_id, "flat", {"a.pdf": 2, "b.pdf": 2})
+    fila = obter_fila_ingestao()
+    jobs = [
+        fila.submeter(session_id, nome, nome.encode(), lambda job, arquivo: None)
+        for nome in ["a.pdf", "b.pdf"]
+    ]
+    _aguardar(jobs)
+    # O manifesto guarda o hash do conteúdo enviado, o mesmo do job
+    with armazenamento._lock:
+        for job in jobs:
+            armazenamento._sessoes[session_id]["arquivos"][job.arquivo][
+                "hash"
+            ] = job.hash
+
+    armazenamento.remover_arquivo(session_id, "a.pdf")
+    assert [job.arquivo for job in fila.jobs(session_id)] == ["b.pdf"]
+
+    trace = Trace("turno", session_id=session_id)
+    trace.finalizar()
+    obter_registro_traces().registrar(trace)
+
+    armazenamento.remover_sessao(session_id)
+    assert fila.jobs(session_id) == []
+    assert obter_registro_traces().ultimos(session_id) == []
+    assert not os.path.exists(pasta_sessao(session_id, armazenamento.pasta))
+    assert armazenamento.sessao(session_id) is None
+
+
+def _criar_pasta(pasta, session_id: str, tamanho: int, idade: float):
+    caminho = pasta_sessao(session_id, str(pasta))
+    os.makedirs(caminho)
+    with open(os.path.join(caminho, "dados.bin"), "wb") as arquivo:
+        arquivo.write(b"0" * tamanho)
+    instante = time.time() - idade
+    os.utime(caminho, (instante, instante))
+
+
+def test_coleta_de_lixo_por_ttl(tmp_path):
+    _criar_pasta(tmp_path, "antiga", 1000, idade=3 * 86400)
+    _criar_pasta(tmp_path, "protegida", 1000, idade=3 * 86400)
+    _criar_pasta(tmp_path, "recente", 1000, idade=60)
+    armazenamento = ArmazenamentoSessoes(pasta=str(tmp_path), ttl_dias=1, max_mb=0)
+
+    resultado = armazenamento.coletar_lixo(protegidas=["protegida"])
+
+    assert resultado["removidas"] == ["antiga"]
+    assert resultado["bytes_liberados"] == 1000
+    assert not os.path.exists(pasta_sessao("antiga", str(tmp_path)))
+    # Sessões protegidas não são adotadas pelo manifesto, mas a pasta é mantida
+    assert os.path.exists(pasta_sessao("protegida", str(tmp_path)))
+    assert set(armazenamento.sessoes()) == {"recente"}
+    # O manifesto gravado é relido por uma nova instância
+    assert set(ArmazenamentoSessoes(pasta=str(tmp_path)).sessoes()) == {"recente"}
+
+
+def test_coleta_de_lixo_por_cota(tmp_path):
+    for indice, session_id in enumerate(["s1", "s2", "s3"]):
+        _criar_pasta(tmp_path, session_id, 400 * 1024, idade=300 - indice * 100)
+    armazenamento = ArmazenamentoSessoes(pasta=str(tmp_path), ttl_dias=0, max_mb=1)
+
+    resultado = armazenamento.coletar_lixo()
+
+    # 1,2 MB para uma cota de 1 MB: só a sessão acessada há mais tempo sai
+    assert resultado["removidas"] == ["s1"]
+    assert set(armazenamento.sessoes()) == {"s2", "s3"}
+
+
+def test_coleta_de_lixo_preserva_sessoes_com_ingestao_pendente(tmp_path):
+    _criar_pasta(tmp_path, "ocupada", 1000, idade=3 * 86400)
+    armazenamento = ArmazenamentoSessoes(pasta=str(tmp_path), ttl_dias=1, max_mb=0)
+    fila = obter_fila_ingestao()
+    liberar = fila.lock_sessao("ocupada")
+    liberar.acquire()
+    try:
+        job = fila.submeter("ocupada", "a.pdf", b"a", lambda job, arquivo: None)
+        assert armazenamento.coletar_lixo()["removidas"] == []
+    finally:
+        liberar.release()
+    _aguardar([job])
+
+    assert armazenamento.coletar_lixo()["removidas"] == ["ocupada"]
@@ -0,0 +1,45 @@
+from agents_ia.tracing import RegistroTraces, Trace
+
+
+def _registrar(registro: RegistroTraces, session_id: str, segundos: float = 1.0):
+    trace = Trace("turno", session_id=session_id)
+    trace.registrar("chat.geracao", segundos)
+    trace.finalizar()
+    registro.registrar(trace)
+
+
+def test_mantem_os_traces_recentes_e_os_totais_por_sessao():
+    registro = RegistroTraces(caminho_log="", max_traces=2)
+    for _ in range(3):
+        _registrar(registro, "s1")
+
+    assert len(registro.ultimos("s1", quantidade=5)) == 2
+    totais = registro.totais("s1")
+    assert totais["execucoes"] == 3
+    assert totais["etapas"]["chat.geracao"]["chamadas"] == 3
+
+
+def test_descarta_as_sessoes_usadas_ha_mais_tempo():
+    registro = RegistroTraces(caminho_log="", max_sessoes=2)
+    _registrar(registro, "s1")
+    _registrar(registro, "s2")
+    _registrar(registro, "s1")
+    _registrar(registro, "s3")
+
+    # "s2" é a sessão com o trace mais antigo
+    assert registro.ultimos("s2") == []
+    assert registro.totais("s2") == {}
+    assert registro.totais("s1")["execucoes"] == 2
+    assert len(registro.ultimos("s3")) == 1
+
+
+def test_remover_sessao():
+    registro = RegistroTraces(caminho_log="")
+    _registrar(registro, "s1")
+    _registrar(registro, "s2")
+
+    registro.remover("s1")
+
+    assert registro.ultimos("s1") == []
+    assert registro.totais("s1") == {}
+    assert registro.totais("s2")["execucoes"] == 1